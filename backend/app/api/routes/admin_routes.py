@@ -0,0 +1,21 @@
+from typing import Any, Dict
+from fastapi import APIRouter, Depends, HTTPException
+from app.core.profiler import profiler
+from app.core.security import require_admin
+from app.models.admin_models import ProfilerUpdate
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+@router.get("/profiler")
+async def get_profiler() -> Dict[str, Any]:
+    """Current profiler settings and counters."""
+    return profiler.stats()
+
+@router.put("/profiler")
+async def update_profiler(update: ProfilerUpdate) -> Dict[str, Any]:
+    """Change profiler settings at runtime; omitted fields are unchanged."""
+    try:
+        profiler.configure(**update.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return profiler.stats()
@@ -1,58 +1,229 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Optional
+import json
+import logging
+from fastapi import APIRouter, HTTPException, Depends, Header, Response
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Optional
+from app.core.security import generate_conversation_id, require_conversation_id, require_token
 from app.models.cart_models import (
+    AddItemOperation,
     Cart,
+    CartBatchRequest,
     CartItem,
     CartResponse,
     ErrorResponse,
-    Modifier
+    InstructionStatus,
+    ItemConflict,
+    OrderResponse,
+    UpdateItemOperation
 )
-from app.services.cart_service import CartService
-from app.services.ai_service import AIService
+from app.services.cart_service import cart_service
+from app.services.cart_store import CartVersionConflict
+from app.services.ai_service import AIServiceUnavailable, ai_service
+from app.services.instruction_worker import instruction_workers
 
-router = APIRouter(prefix="/cart")
-cart_service = CartService()
-ai_service = AIService()
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/cart",
+    dependencies=[Depends(require_token), Depends(require_conversation_id)]
+)
+
+def _reset_instruction_analysis(item: CartItem) -> None:
+    """Mark an incoming item's instructions as awaiting analysis."""
+    item.instructions_analysis = None
+    item.instructions_status = (
+        InstructionStatus.PENDING if item.special_instructions else None
+    )
+
+def _cart_response(cart: Cart, status_code: int = 200) -> Response:
+    """Return the cart as pre-serialized JSON with its ETag.
+
+    Bypasses response_model validation; the body matches CartResponse.
+    """
+    return Response(
+        content=cart_service.render_cart_response(cart),
+        status_code=status_code,
+        media_type="application/json",
+        headers={"ETag": cart.etag}
+    )
+
+def _etags(header: str) -> List[str]:
+    return [tag.strip() for tag in header.split(",")]
+
+def _not_modified(if_none_match: Optional[str], cart: Cart) -> Optional[Response]:
+    """Return a 304 response if the client already has this cart version.
+
+    If-None-Match uses weak comparison, so W/ prefixes added by proxies
+    are ignored.
+    """
+    if if_none_match is None:
+        return None
+    tags = [tag[2:] if tag.startswith("W/") else tag for tag in _etags(if_none_match)]
+    if "*" in tags or cart.etag in tags:
+        return Response(status_code=304, headers={"ETag": cart.etag})
+    return None
+
+def _check_if_match(if_match: Optional[str], cart: Optional[Cart]) -> None:
+    """Reject a write with 412 unless the client's ETag is still current."""
+    if if_match is None:
+        return
+    tags = _etags(if_match)
+    if cart is None or ("*" not in tags and cart.etag not in tags):
+        raise HTTPException(status_code=412, detail="Cart has been modified")
+
+def _sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format a Server-Sent Events message with a JSON payload."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def _summary_events(cart: Cart) -> AsyncIterator[str]:
+    try:
+        async for token in ai_service.stream_order_summary(cart):
+            yield _sse_event({"token": token})
+    except Exception as e:
+        yield _sse_event({"error": str(e)}, event="error")
+        return
+    yield _sse_event({}, event="done")
+
+async def _queue_instruction_analysis(conversation_id: str, item: Optional[CartItem]) -> bool:
+    """Queue a pending item for analysis.
+
+    Returns False if the job was refused, in which case the stored item
+    has been marked failed and callers holding the cart must re-read it.
+    """
+    if item is not None and item.instructions_status == InstructionStatus.PENDING:
+        return await instruction_workers.submit(
+            conversation_id,
+            item.item_id,
+            item.special_instructions
+        )
+    return True
+
+@router.post(
+    "",
+    response_model=CartResponse,
+    status_code=201,
+    responses={500: {"model": ErrorResponse}}
+)
+async def create_cart():
+    """Start a conversation with an empty cart under a new ID.
+
+    IDs are time-ordered ULIDs; clients may still use their own IDs with
+    the other endpoints.
+    """
+    try:
+        cart = await cart_service.run(cart_service.create_cart, generate_conversation_id())
+        return _cart_response(cart, status_code=201)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.get(
     "/{conversation_id}",
     response_model=CartResponse,
-    responses={404: {"model": ErrorResponse}}
+    responses={304: {"description": "Cart unchanged"}, 404: {"model": ErrorResponse}}
 )
-async def get_cart(conversation_id: str):
-    """Get all items in a cart."""
+async def get_cart(
+    conversation_id: str,
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get all items in a cart.
+
+    Responds 304 without a body when If-None-Match holds the current ETag.
+    """
     try:
-        cart = cart_service.get_cart(conversation_id)
+        cart = await cart_service.run(cart_service.get_cart, conversation_id)
         if not cart:
             raise HTTPException(
                 status_code=404,
                 detail=f"Cart not found for conversation ID: {conversation_id}"
             )
-        return cart_service.get_cart_response(cart)
+        not_modified = _not_modified(if_none_match, cart)
+        if not_modified is not None:
+            return not_modified
+        return _cart_response(cart)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post(
     "/{conversation_id}/items",
     response_model=CartResponse,
-    responses={400: {"model": ErrorResponse}}
+    responses={400: {"model": ErrorResponse}, 409: {"model": ErrorResponse}, 412: {"model": ErrorResponse}}
 )
 async def add_item(
     conversation_id: str,
-    item: CartItem
+    item: CartItem,
+    if_match: Optional[str] = Header(None)
 ):
-    """Add an item to the cart."""
+    """Add an item to the cart.
+
+    Special instructions are analyzed in the background; the stored item
+    reports progress through its instructions_status field.
+    """
     try:
-        # Process special instructions with AI if present
-        if item.special_instructions:
-            processed_instructions = await ai_service.process_cart_instructions(
-                item.special_instructions
-            )
-            # You might want to update the item with processed instructions
-            # or store them separately
-        
-        cart = cart_service.add_item(conversation_id, item)
-        return cart_service.get_cart_response(cart)
+        _reset_instruction_analysis(item)
+        async with cart_service.lock(conversation_id):
+            current = await cart_service.run(cart_service.get_cart, conversation_id)
+            _check_if_match(if_match, current)
+            # An item already in the cart only has its quantity bumped; its
+            # instructions match, so it keeps its analysis or queued job.
+            merged = current is not None and current.get_item(item.item_id) is not None
+            cart = await cart_service.run(cart_service.add_item, conversation_id, item)
+        if not merged and not await _queue_instruction_analysis(conversation_id, cart.get_item(item.item_id)):
+            cart = await cart_service.run(cart_service.get_cart, conversation_id) or cart
+        return _cart_response(cart)
+    except HTTPException:
+        raise
+    except (CartVersionConflict, ItemConflict) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post(
+    "/{conversation_id}/batch",
+    response_model=CartResponse,
+    responses={400: {"model": ErrorResponse}, 409: {"model": ErrorResponse}, 412: {"model": ErrorResponse}}
+)
+async def apply_batch(
+    conversation_id: str,
+    batch: CartBatchRequest,
+    if_match: Optional[str] = Header(None)
+):
+    """Apply an ordered list of add/update/remove/clear operations.
+
+    The operations are applied atomically: if one fails, none of them
+    take effect. Instructions on all new or updated items are queued for
+    analysis as a single job.
+    """
+    try:
+        incoming = [
+            operation.item
+            for operation in batch.operations
+            if isinstance(operation, (AddItemOperation, UpdateItemOperation))
+        ]
+        for item in incoming:
+            _reset_instruction_analysis(item)
+
+        async with cart_service.lock(conversation_id):
+            _check_if_match(if_match, await cart_service.run(cart_service.get_cart, conversation_id))
+            cart = await cart_service.run(cart_service.apply_operations, conversation_id, batch.operations)
+
+        pending = {}
+        for item in incoming:
+            stored = cart.get_item(item.item_id)
+            if stored is not None and stored.instructions_status == InstructionStatus.PENDING:
+                pending[stored.item_id] = stored.special_instructions
+        if not await instruction_workers.submit_many(conversation_id, list(pending.items())):
+            cart = await cart_service.run(cart_service.get_cart, conversation_id) or cart
+
+        return _cart_response(cart)
+    except HTTPException:
+        raise
+    except (CartVersionConflict, ItemConflict) as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -61,43 +232,61 @@ async def add_item(
 @router.get(
     "/{conversation_id}/items/{item_id}",
     response_model=CartResponse,
-    responses={404: {"model": ErrorResponse}}
+    responses={304: {"description": "Cart unchanged"}, 404: {"model": ErrorResponse}}
 )
-async def get_item(conversation_id: str, item_id: str):
+async def get_item(
+    conversation_id: str,
+    item_id: str,
+    if_none_match: Optional[str] = Header(None)
+):
     """Get a specific item from the cart."""
     try:
-        cart = cart_service.get_cart(conversation_id)
+        cart = await cart_service.run(cart_service.get_cart, conversation_id)
         if not cart:
             raise HTTPException(
                 status_code=404,
                 detail=f"Cart not found for conversation ID: {conversation_id}"
             )
         
-        item = next((i for i in cart.items if i.item_id == item_id), None)
-        if not item:
+        if not cart.get_item(item_id):
             raise HTTPException(
                 status_code=404,
                 detail=f"Item not found in cart: {item_id}"
             )
         
-        return cart_service.get_cart_response(cart)
+        not_modified = _not_modified(if_none_match, cart)
+        if not_modified is not None:
+            return not_modified
+        return _cart_response(cart)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put(
     "/{conversation_id}/items/{item_id}",
     response_model=CartResponse,
-    responses={404: {"model": ErrorResponse}}
+    responses={404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}, 412: {"model": ErrorResponse}}
 )
 async def update_item(
     conversation_id: str,
     item_id: str,
-    item: CartItem
+    item: CartItem,
+    if_match: Optional[str] = Header(None)
 ):
     """Update a specific item in the cart."""
     try:
-        cart = cart_service.update_item(conversation_id, item_id, item)
-        return cart_service.get_cart_response(cart)
+        _reset_instruction_analysis(item)
+        async with cart_service.lock(conversation_id):
+            _check_if_match(if_match, await cart_service.run(cart_service.get_cart, conversation_id))
+            cart = await cart_service.run(cart_service.update_item, conversation_id, item_id, item)
+        if not await _queue_instruction_analysis(conversation_id, item):
+            cart = await cart_service.run(cart_service.get_cart, conversation_id) or cart
+        return _cart_response(cart)
+    except HTTPException:
+        raise
+    except (CartVersionConflict, ItemConflict) as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -106,13 +295,23 @@ async def update_item(
 @router.delete(
     "/{conversation_id}/items/{item_id}",
     response_model=CartResponse,
-    responses={404: {"model": ErrorResponse}}
+    responses={404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}, 412: {"model": ErrorResponse}}
 )
-async def delete_item(conversation_id: str, item_id: str):
+async def delete_item(
+    conversation_id: str,
+    item_id: str,
+    if_match: Optional[str] = Header(None)
+):
     """Delete a specific item from the cart."""
     try:
-        cart = cart_service.remove_item(conversation_id, item_id)
-        return cart_service.get_cart_response(cart)
+        async with cart_service.lock(conversation_id):
+            _check_if_match(if_match, await cart_service.run(cart_service.get_cart, conversation_id))
+            cart = await cart_service.run(cart_service.remove_item, conversation_id, item_id)
+        return _cart_response(cart)
+    except HTTPException:
+        raise
+    except (CartVersionConflict, ItemConflict) as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -120,13 +319,17 @@ async def delete_item(conversation_id: str, item_id: str):
 
 @router.post(
     "/{conversation_id}/order",
-    response_model=CartResponse,
+    response_model=OrderResponse,
     responses={404: {"model": ErrorResponse}}
 )
 async def place_order(conversation_id: str):
-    """Place an order from the cart."""
+    """Place an order from the cart.
+
+    If the AI service is unavailable the order is still placed and
+    returned without a summary.
+    """
     try:
-        cart = cart_service.get_cart(conversation_id)
+        cart = await cart_service.run(cart_service.get_cart, conversation_id)
         if not cart:
             raise HTTPException(
                 status_code=404,
@@ -134,10 +337,44 @@ async def place_order(conversation_id: str):
             )
         
         # Generate order summary using AI
-        order_summary = await ai_service.summarize_order(cart)
+        try:
+            order_summary = await ai_service.summarize_order(cart)
+        except AIServiceUnavailable as e:
+            logger.warning("Placing order %s without summary: %s", conversation_id, e)
+            order_summary = None
         
         # You might want to store the order in a database here
         
-        return cart_service.get_cart_response(cart)
+        return OrderResponse(
+            **cart_service.get_cart_response(cart).model_dump(),
+            summary=order_summary
+        )
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e)) 
+
+@router.get(
+    "/{conversation_id}/order/summary",
+    response_class=StreamingResponse,
+    responses={404: {"model": ErrorResponse}}
+)
+async def stream_order_summary(conversation_id: str):
+    """Stream an AI summary of the order as Server-Sent Events.
+
+    Each token arrives as a ``data`` message, followed by a ``done`` event,
+    or an ``error`` event if generation fails. Disconnecting stops the
+    upstream generation.
+    """
+    cart = await cart_service.run(cart_service.get_cart, conversation_id)
+    if not cart:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Cart not found for conversation ID: {conversation_id}"
+        )
+
+    return StreamingResponse(
+        _summary_events(cart),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
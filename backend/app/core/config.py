@@ -21,12 +21,77 @@ class Settings(BaseSettings):
     OLLAMA_TEMPERATURE: float = 0.7
     OLLAMA_MAX_TOKENS: int = 1000
     OLLAMA_TIMEOUT: int = 30
+    OLLAMA_POOL_SIZE: int = 100  # total connections in the shared pool
+    OLLAMA_POOL_SIZE_PER_HOST: int = 20
+    OLLAMA_KEEPALIVE_TIMEOUT: int = 30  # seconds an idle connection is kept open
+    OLLAMA_NUM_CTX: int = 4096  # context window requested per generation
+    OLLAMA_KEEP_ALIVE: str = "30m"  # how long Ollama keeps the model loaded after a request
+    
+    # Ollama protection settings
+    AI_MAX_CONCURRENCY: int = 16  # Ollama calls in flight at once
+    AI_CONCURRENCY_WAIT: float = 0.5  # seconds to wait for a free slot
+    AI_TIMEOUT_PERCENTILE: float = 0.99  # observed latency the timeout is based on
+    AI_TIMEOUT_MULTIPLIER: float = 2.0
+    AI_TIMEOUT_MIN: float = 1.0  # seconds; OLLAMA_TIMEOUT is the ceiling
+    AI_TIMEOUT_WINDOW: int = 200  # latency samples kept per task
+    AI_TIMEOUT_MIN_SAMPLES: int = 20  # samples needed before adapting
+    AI_TIMEOUT_FALLBACK_AFTER: int = 3  # timeouts in a row before using OLLAMA_TIMEOUT again
+    AI_BREAKER_FAILURE_THRESHOLD: int = 5  # consecutive failures that open the breaker
+    AI_BREAKER_RESET_TIMEOUT: float = 30.0  # seconds before a probe is let through
+    
+    # Model warm-up settings
+    WARMUP_ENABLED: bool = True
+    WARMUP_LOAD_TIMEOUT: float = 300.0  # seconds allowed for Ollama to load the model
+    WARMUP_ATTEMPTS: int = 3  # tries before serving traffic without a warm model
+    WARMUP_RETRY_DELAY: float = 5.0  # seconds between tries
+    
+    # Prompt budget settings (tokens)
+    AI_PROMPT_CART_TOKENS: int = 1500  # cart data embedded in a prompt
+    AI_PROMPT_TEMPLATE_TOKENS: int = 100  # reserved for prompt wording
+    AI_PROMPT_INSTRUCTION_OUTPUT_TOKENS: int = 128  # per instruction
+    AI_PROMPT_SUGGEST_OUTPUT_TOKENS: int = 128
+    AI_PROMPT_SUMMARY_OUTPUT_TOKENS: int = 300
+    
+    # AI result cache settings
+    AI_CACHE_TTL: int = 3600  # seconds
+    AI_CACHE_MAX_ENTRIES: int = 10000
+    
+    # Rule-based instruction parsing settings
+    AI_RULES_ENABLED: bool = True
+    AI_RULES_FILE: str = "instruction_rules.yaml"
+    AI_RULES_MIN_CONFIDENCE: float = 0.8  # share of words a rule must explain
+    
+    # Instruction micro-batching settings
+    AI_BATCH_MAX_SIZE: int = 8  # instructions per prompt
+    AI_BATCH_WINDOW_MS: int = 20  # how long the first instruction waits for others
+    
+    # Background instruction analysis settings
+    AI_WORKER_COUNT: int = 4
+    AI_WORKER_QUEUE_SIZE: int = 1000
+    AI_WORKER_QUEUE_POLICY: str = "reject"  # reject, drop_oldest or block
+    AI_WORKER_QUEUE_TIMEOUT: float = 1.0  # seconds to wait for space with "block"
     
     # Storage settings
-    STORAGE_TYPE: str = "memory"
+    STORAGE_TYPE: str = "memory"  # memory or sqlite
+    STORAGE_SQLITE_PATH: str = "data/carts.db"
+    STORAGE_SQLITE_POOL_SIZE: int = 4
+    STORAGE_SHARDS: int = 16  # in-memory store shards
+    STORAGE_HOT_CARTS: int = 1000  # memory store: recently used carts kept as live models (~80KB each at 50 items)
     STORAGE_CLEANUP_INTERVAL: int = 3600  # 1 hour
+    STORAGE_CLEANUP_BATCH_SIZE: int = 500  # carts evicted per slice
     MAX_CART_ITEMS: int = 50
     MAX_CONVERSATION_AGE: int = 86400  # 24 hours
+    STORAGE_MAX_LIFETIME: int = 0  # seconds since a generated ID was issued; 0 keeps carts while active
+    STORAGE_LIFETIME_BUCKET: int = 3600  # creation-time partition width for lifetime eviction
+    STORAGE_JOURNAL_ENABLED: bool = False  # memory store: journal changes to disk, recover on startup
+    STORAGE_JOURNAL_DIR: str = "data/journal"  # one process per directory
+    STORAGE_JOURNAL_FSYNC: bool = True  # fsync each batch; off trusts the OS page cache
+    STORAGE_SNAPSHOT_EVERY: int = 100000  # journal entries between snapshots
+    STORAGE_JOURNAL_QUEUE_SIZE: int = 100000  # entries awaiting the writer; more are dropped until the next snapshot
+    
+    # Serialized cart response cache settings
+    RESPONSE_CACHE_TTL: int = 300  # seconds
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
     
     # Security settings
     JWT_SECRET: str
@@ -34,9 +99,40 @@ class Settings(BaseSettings):
     JWT_EXPIRY: int = 3600  # 1 hour
     PASSWORD_SALT: str
     
+    # Conversation ID settings
+    CONVERSATION_ID_MAC_LENGTH: int = Field(0, ge=0, le=12)  # base32 characters of HMAC appended to generated IDs
+    
+    # Authentication settings
+    AUTH_ENABLED: bool = False  # require a bearer token on the cart API
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = 10000  # verified tokens kept in memory
+    AUTH_TOKEN_CACHE_TTL: int = 300  # seconds; never past the token's own expiry
+    AUTH_BCRYPT_WORKERS: int = 4  # threads hashing and checking passwords
+    
+    # Admin API settings
+    ADMIN_TOKEN: str = ""  # static bearer token for /admin; without it /admin needs AUTH_ENABLED
+    
+    # Metrics settings
+    METRICS_ENABLED: bool = True  # serve /metrics and time every request
+    
+    # Sampling profiler settings
+    PROFILER_ENABLED: bool = False  # can be switched on at runtime via /admin/profiler
+    PROFILER_SAMPLE_RATE: float = 0.01  # share of requests stack-sampled
+    PROFILER_THRESHOLD_MS: float = 500  # sampled requests slower than this are saved
+    PROFILER_INTERVAL_MS: float = 5  # time between stack samples
+    PROFILER_DIR: str = "logs/profiles"
+    PROFILER_MAX_FILES: int = 100  # newest profiles kept on disk
+    
     # Logging settings
     LOG_LEVEL: str = "INFO"
     LOG_FILE: str = "logs/app.log"
+    LOG_FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"  # used when LOG_JSON is off
+    LOG_JSON: bool = True  # one JSON object per line
+    LOG_MAX_BYTES: int = 10000000  # 10MB per file before rotating
+    LOG_BACKUP_COUNT: int = 5
+    LOG_QUEUE_SIZE: int = 10000  # records buffered for the writer thread; more are dropped
+    LOG_ACCESS_SAMPLE_INFO: float = 0.05  # share of successful requests logged
+    LOG_ACCESS_SAMPLE_WARNING: float = 1.0  # 4xx
+    LOG_ACCESS_SAMPLE_ERROR: float = 1.0  # 5xx
     
     # CORS settings
     CORS_ORIGINS: List[str] = ["*"]
@@ -47,10 +143,15 @@ class Settings(BaseSettings):
         "extra": "allow"  # Allow extra fields from environment variables
     }
 
-def load_config() -> Settings:
-    """Load configuration from config.yaml and environment variables."""
-    config_path = Path(__file__).parent.parent.parent / "config.yaml"
-    
+CONFIG_PATH = Path(__file__).parent.parent.parent / "config.yaml"
+
+def load_config(config_path: Path = CONFIG_PATH) -> Settings:
+    """Load configuration from config.yaml and environment variables.
+
+    Each ``section: {key: value}`` entry becomes the SECTION_KEY setting.
+    Variables already set in the environment take precedence over
+    config.yaml, so a deployment (or a benchmark) can override any value.
+    """
     if config_path.exists():
         with open(config_path) as f:
             config_data = yaml.safe_load(f)
@@ -60,9 +161,9 @@ def load_config() -> Settings:
                 if isinstance(values, dict):
                     for key, value in values.items():
                         env_key = f"{section.upper()}_{key.upper()}"
-                        os.environ[env_key] = str(value)
+                        os.environ.setdefault(env_key, str(value))
                 else:
-                    os.environ[section.upper()] = str(values)
+                    os.environ.setdefault(section.upper(), str(values))
     
     return Settings()
 
@@ -0,0 +1,194 @@
+import atexit
+import copy
+import logging
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, Optional
+import orjson
+from app.core.config import settings
+
+# Attributes every LogRecord has; anything else was passed via extra=.
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with extra= fields as top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+    def formatTime(self, record: logging.LogRecord, datefmt: Optional[str] = None) -> str:
+        return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z"
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue records for the writer thread, dropping them when it falls behind.
+
+    The calling thread never blocks on I/O: it only formats the message
+    text and puts the record on a bounded queue. If the queue is full the
+    record is counted and discarded.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve args and tracebacks now, while they are still valid,
+        # but leave structured formatting to the writer thread. Handlers
+        # on parent loggers still get the caller's record, so it is
+        # copied, as QueueHandler.prepare does.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class LevelSampler(logging.Filter):
+    """Keep only a fraction of records at each level.
+
+    Levels without a rate are always kept.
+    """
+
+    def __init__(self, rates: Dict[int, float]):
+        super().__init__()
+        self.rates = rates
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno, 1.0)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+class LogPipeline:
+    """Route the ``app`` loggers through a queue to a file-writing thread."""
+
+    def __init__(
+        self,
+        path: str = settings.LOG_FILE,
+        level: str = settings.LOG_LEVEL,
+        max_queue: int = settings.LOG_QUEUE_SIZE,
+        json: bool = settings.LOG_JSON
+    ):
+        self.path = Path(path)
+        self.level = level
+        self.json = json
+        self.queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=max_queue)
+        self.handler = DroppingQueueHandler(self.queue)
+        self.access_sampler = LevelSampler({
+            logging.INFO: settings.LOG_ACCESS_SAMPLE_INFO,
+            logging.WARNING: settings.LOG_ACCESS_SAMPLE_WARNING,
+            logging.ERROR: settings.LOG_ACCESS_SAMPLE_ERROR
+        })
+        self._listener: Optional[QueueListener] = None
+        self._atexit_registered = False
+
+    def _file_handler(self) -> logging.Handler:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(
+            self.path,
+            maxBytes=settings.LOG_MAX_BYTES,
+            backupCount=settings.LOG_BACKUP_COUNT
+        )
+        handler.setFormatter(JsonFormatter() if self.json else logging.Formatter(settings.LOG_FORMAT))
+        return handler
+
+    def start(self) -> None:
+        """Attach the queue handler and start the writer thread."""
+        if self._listener is not None:
+            return
+        app_logger = logging.getLogger("app")
+        app_logger.setLevel(self.level)
+        if self.handler not in app_logger.handlers:
+            app_logger.addHandler(self.handler)
+        access_logger = logging.getLogger("app.access")
+        if self.access_sampler not in access_logger.filters:
+            access_logger.addFilter(self.access_sampler)
+
+        self._listener = QueueListener(self.queue, self._file_handler(), respect_handler_level=True)
+        self._listener.start()
+        if not self._atexit_registered:
+            atexit.register(self.stop)
+            self._atexit_registered = True
+
+    def stop(self) -> None:
+        """Detach from the loggers, flush queued records and stop the writer."""
+        if self._listener is None:
+            return
+        logging.getLogger("app").removeHandler(self.handler)
+        logging.getLogger("app.access").removeFilter(self.access_sampler)
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._listener = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queue.qsize(),
+            "dropped": self.handler.dropped,
+            "access_sampled_out": self.access_sampler.sampled_out
+        }
+
+class AccessLogMiddleware:
+    """ASGI middleware logging one structured record per request.
+
+    Records go to ``app.access`` at INFO, WARNING for 4xx and ERROR for
+    5xx, so each level can be sampled at its own rate.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.logger = logging.getLogger("app.access")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            level = logging.ERROR if status >= 500 else logging.WARNING if status >= 400 else logging.INFO
+            if self.logger.isEnabledFor(level):
+                self.logger.log(level, "%s %s %d", scope["method"], scope["path"], status, extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 3)
+                })
+
+log_pipeline = LogPipeline()
@@ -0,0 +1,92 @@
+import time
+from typing import Any, Callable, Dict, Iterator, Mapping
+from prometheus_client import CollectorRegistry, Histogram, ProcessCollector
+from prometheus_client.core import GaugeMetricFamily
+
+registry = CollectorRegistry(auto_describe=True)
+ProcessCollector(registry=registry)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    registry=registry
+)
+AI_REQUEST_DURATION = Histogram(
+    "ai_request_duration_seconds",
+    "Ollama call latency by task and outcome",
+    ["task", "outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
+    registry=registry
+)
+CART_ITEMS = Histogram(
+    "cart_items",
+    "Items in a cart after each change",
+    buckets=(0, 1, 2, 3, 5, 10, 20, 30, 50),
+    registry=registry
+)
+CART_CLEANUP_DURATION = Histogram(
+    "cart_cleanup_duration_seconds",
+    "Duration of a full expired-cart cleanup run",
+    registry=registry
+)
+
+def _numeric_leaves(prefix: str, stats: Mapping[str, Any]) -> Iterator[tuple]:
+    for key, value in stats.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, Mapping):
+            yield from _numeric_leaves(name, value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+class StatsCollector:
+    """Expose the numeric values of components' stats() dicts as gauges.
+
+    Values are read at scrape time, so counters the services already keep
+    cost nothing extra between scrapes. Nested keys are joined with
+    underscores, e.g. ``app_ai_breaker_rejected``. Scrapes run on the
+    event loop, so sources must only read counters, never query a store.
+    """
+
+    def __init__(self, sources: Dict[str, Callable[[], Mapping[str, Any]]]):
+        self.sources = sources
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        for section, stats in self.sources.items():
+            for name, value in _numeric_leaves(f"app_{section}", stats()):
+                yield GaugeMetricFamily(name, f"{section} stats value", value=value)
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template.
+
+    The route template (e.g. ``/api/v1/cart/{conversation_id}``) rather
+    than the raw path is used as the label, so label cardinality stays
+    bounded. Requests that match no API route are labelled ``other``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"],
+                getattr(route, "path", "other"),
+                str(status)
+            ).observe(time.perf_counter() - started)
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_.-]+")
+
+def collapse_stack(frame) -> str:
+    """Render a frame's call stack in collapsed (flamegraph) form, root first."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class Recording:
+    """Stack samples collected for one request."""
+
+    def __init__(self, thread_id: int):
+        self.thread_id = thread_id
+        self.started = time.perf_counter()
+        self.stacks: Counter = Counter()
+
+class StackSampler:
+    """Background thread sampling the stacks of threads being recorded.
+
+    The thread only wakes while at least one recording is active. Async
+    requests share the event loop thread, so a recording also sees any
+    other coroutine that ran on the loop while the request was in flight.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._recordings: Set[Recording] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.samples = 0
+
+    def begin(self, thread_id: int) -> Recording:
+        recording = Recording(thread_id)
+        with self._lock:
+            self._recordings.add(recording)
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(
+                    target=self._run, name="stack-sampler", daemon=True
+                )
+                self._thread.start()
+        self._wake.set()
+        return recording
+
+    def end(self, recording: Recording) -> Counter:
+        """Stop sampling a recording and return a copy of its stacks."""
+        with self._lock:
+            self._recordings.discard(recording)
+            return Counter(recording.stacks)
+
+    def stop(self) -> None:
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wake.wait()
+            with self._lock:
+                recordings = list(self._recordings)
+                if not recordings:
+                    self._wake.clear()
+                    continue
+            frames = sys._current_frames()
+            samples = []
+            for recording in recordings:
+                frame = frames.get(recording.thread_id)
+                if frame is not None:
+                    samples.append((recording, collapse_stack(frame)))
+            del frames
+            # Counted under the lock, so end() copies a settled Counter.
+            with self._lock:
+                for recording, stack in samples:
+                    recording.stacks[stack] += 1
+                self.samples += len(samples)
+            time.sleep(self.interval)
+
+class RequestProfiler:
+    """Profile a sample of requests and keep the slow ones on disk.
+
+    A fraction (sample_rate) of requests is stack-sampled. If a sampled
+    request takes at least threshold_ms, its collapsed stacks are written
+    to directory, keeping only the newest max_files profiles. The files
+    load directly into flamegraph.pl or speedscope.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.PROFILER_ENABLED,
+        sample_rate: float = settings.PROFILER_SAMPLE_RATE,
+        threshold_ms: float = settings.PROFILER_THRESHOLD_MS,
+        interval_ms: float = settings.PROFILER_INTERVAL_MS,
+        directory: str = settings.PROFILER_DIR,
+        max_files: int = settings.PROFILER_MAX_FILES
+    ):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.threshold_ms = threshold_ms
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self.sampler = StackSampler(interval_ms / 1000)
+        self.sampled = 0
+        self.written = 0
+
+    def configure(
+        self,
+        enabled: Optional[bool] = None,
+        sample_rate: Optional[float] = None,
+        threshold_ms: Optional[float] = None
+    ) -> None:
+        """Change settings at runtime; None leaves a setting unchanged."""
+        if sample_rate is not None and not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        if threshold_ms is not None and threshold_ms < 0:
+            raise ValueError("threshold_ms must not be negative")
+        if enabled is not None:
+            self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if threshold_ms is not None:
+            self.threshold_ms = threshold_ms
+
+    def maybe_begin(self) -> Optional[Recording]:
+        """Start recording the current request if it is sampled."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        self.sampled += 1
+        return self.sampler.begin(threading.get_ident())
+
+    async def finish(self, recording: Recording, label: str) -> Optional[Path]:
+        """Stop recording and save the profile if the request was slow."""
+        stacks = self.sampler.end(recording)
+        elapsed_ms = (time.perf_counter() - recording.started) * 1000
+        if elapsed_ms < self.threshold_ms or not stacks:
+            return None
+        name = f"{time.time_ns() // 1_000_000}-{_UNSAFE_CHARS.sub('_', label).strip('_')}-{elapsed_ms:.0f}ms.collapsed"
+        try:
+            path = await asyncio.get_running_loop().run_in_executor(None, self._write, name, stacks)
+        except OSError as e:
+            logger.warning("Could not write profile %s: %s", name, e)
+            return None
+        self.written += 1
+        return path
+
+    def _write(self, name: str, stacks: Counter) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / name
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in stacks.most_common()))
+        # Names start with a millisecond timestamp, so they sort oldest first.
+        profiles = sorted(self.directory.glob("*.collapsed"))
+        for old in profiles[:max(len(profiles) - self.max_files, 0)]:
+            old.unlink(missing_ok=True)
+        return path
+
+    def close(self) -> None:
+        self.sampler.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "threshold_ms": self.threshold_ms,
+            "sampled": self.sampled,
+            "written": self.written,
+            "samples": self.sampler.samples,
+            "directory": str(self.directory)
+        }
+
+class ProfilerMiddleware:
+    """ASGI middleware handing sampled requests to the profiler."""
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        recording = self.profiler.maybe_begin() if scope["type"] == "http" else None
+        if recording is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await self.profiler.finish(recording, f"{scope['method']} {scope['path']}")
+
+profiler = RequestProfiler()
@@ -1,11 +1,28 @@
+import asyncio
+import hashlib
+import hmac
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Dict, Optional
+from fastapi import Depends, HTTPException, Request
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from app.utils.cache import TTLCache
+from app.utils.ulid import ULID_LENGTH, encode_base32, new_ulid, ulid_timestamp_ms
 from .config import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt is deliberately slow (~100ms+ per call) and holds a thread the
+# whole time, so it gets its own small pool rather than the loop's
+# default executor.
+_bcrypt_pool = ThreadPoolExecutor(
+    max_workers=settings.AUTH_BCRYPT_WORKERS,
+    thread_name_prefix="bcrypt"
+)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -42,10 +59,176 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
 
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the bcrypt pool, off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(
+        _bcrypt_pool, get_password_hash, password
+    )
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the bcrypt pool, off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(
+        _bcrypt_pool, verify_password, plain_password, hashed_password
+    )
+
+class TokenVerifier:
+    """Verify JWTs, caching the claims of tokens already seen.
+
+    A cached token skips signature verification and claim decoding. An
+    entry never outlives the token: it expires after cache_ttl or at the
+    token's ``exp``, whichever comes first. Rejected tokens are not
+    cached.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.AUTH_TOKEN_CACHE_MAX_ENTRIES,
+        cache_ttl: float = settings.AUTH_TOKEN_CACHE_TTL,
+        verify: Callable[[str], Optional[dict]] = verify_token,
+        clock: Callable[[], float] = time.time
+    ):
+        self.cache_ttl = cache_ttl
+        self._verify = verify
+        self._clock = clock
+        self._claims = TTLCache(max_entries=max_entries, ttl=cache_ttl, clock=clock)
+        self.rejected = 0
+
+    def verify(self, token: str) -> Optional[dict]:
+        """Return the token's claims, or None if it is invalid or expired."""
+        claims = self._claims.get(token)
+        if claims is not None:
+            return claims
+
+        claims = self._verify(token)
+        if claims is None:
+            self.rejected += 1
+            return None
+        ttl = self.cache_ttl
+        expires = claims.get("exp")
+        if isinstance(expires, (int, float)):
+            ttl = min(ttl, expires - self._clock())
+        if ttl > 0:
+            self._claims.set(token, claims, ttl=ttl)
+        return claims
+
+    def clear(self) -> None:
+        self._claims.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cache": self._claims.stats(), "rejected": self.rejected}
+
+token_verifier = TokenVerifier()
+
+_bearer = HTTPBearer(auto_error=False)
+
+async def require_token(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)
+) -> Optional[dict]:
+    """FastAPI dependency returning the caller's verified token claims.
+
+    Returns None without checking anything when AUTH_ENABLED is off. It
+    is a coroutine so FastAPI runs it on the loop; a cache hit is cheaper
+    than the thread pool hop a sync dependency would cost.
+    """
+    if not settings.AUTH_ENABLED:
+        return None
+    if credentials is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    claims = token_verifier.verify(credentials.credentials)
+    if claims is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid or expired token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return claims
+
+async def require_admin(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)
+) -> None:
+    """FastAPI dependency guarding the admin API.
+
+    Accepts ADMIN_TOKEN as a bearer token when it is set, and otherwise a
+    valid JWT when AUTH_ENABLED is on. With neither configured the admin
+    API is refused outright, rather than left open like the cart API.
+    """
+    if settings.ADMIN_TOKEN and credentials is not None and hmac.compare_digest(
+        credentials.credentials.encode(), settings.ADMIN_TOKEN.encode()
+    ):
+        return
+    if settings.AUTH_ENABLED:
+        await require_token(credentials)
+        return
+    if settings.ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid admin token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    raise HTTPException(
+        status_code=403,
+        detail="Admin API disabled; set ADMIN_TOKEN or AUTH_ENABLED"
+    )
+
+def _conversation_mac(ulid: str, length: int) -> str:
+    digest = hmac.new(
+        settings.JWT_SECRET.encode(),
+        b"conversation-id:" + ulid.encode(),
+        hashlib.sha256
+    ).digest()
+    return encode_base32(int.from_bytes(digest[:8], "big") >> (64 - 5 * length), length)
+
 def generate_conversation_id() -> str:
-    """Generate a unique conversation ID."""
-    return jwt.encode(
-        {"timestamp": datetime.utcnow().timestamp()},
-        settings.JWT_SECRET,
-        algorithm=settings.JWT_ALGORITHM
-    ) 
\ No newline at end of file
+    """Generate a unique, time-ordered conversation ID.
+
+    The ID is a 26-character ULID (creation time first, so IDs sort by
+    age), followed by CONVERSATION_ID_MAC_LENGTH characters of HMAC when
+    that is set.
+    """
+    conversation_id = new_ulid()
+    if settings.CONVERSATION_ID_MAC_LENGTH:
+        conversation_id += _conversation_mac(conversation_id, settings.CONVERSATION_ID_MAC_LENGTH)
+    return conversation_id
+
+def verify_conversation_id(conversation_id: str) -> bool:
+    """Check an ID issued by generate_conversation_id has not been altered.
+
+    Only the canonical upper-case form verifies: carts are keyed by the
+    exact ID string, so a re-cased copy must not pass as the same
+    conversation. Always true when CONVERSATION_ID_MAC_LENGTH is 0.
+    """
+    length = settings.CONVERSATION_ID_MAC_LENGTH
+    if not length:
+        return True
+    if len(conversation_id) != ULID_LENGTH + length or ulid_timestamp_ms(conversation_id[:ULID_LENGTH]) is None:
+        return False
+    expected = _conversation_mac(conversation_id[:ULID_LENGTH], length)
+    return hmac.compare_digest(conversation_id[ULID_LENGTH:].encode(), expected.encode())
+
+def conversation_created_ms(conversation_id: str) -> Optional[int]:
+    """Return the creation time of an ID issued by generate_conversation_id.
+
+    The ID must be a canonical ULID followed by a MAC that verifies, when
+    CONVERSATION_ID_MAC_LENGTH is set; client-chosen IDs get None.
+    """
+    if len(conversation_id) != ULID_LENGTH + settings.CONVERSATION_ID_MAC_LENGTH:
+        return None
+    if not verify_conversation_id(conversation_id):
+        return None
+    return ulid_timestamp_ms(conversation_id[:ULID_LENGTH])
+
+async def require_conversation_id(request: Request) -> None:
+    """FastAPI dependency rejecting conversation IDs with a bad MAC.
+
+    Responds 404 rather than 400, so a forged ID looks like an unknown one.
+    """
+    conversation_id = request.path_params.get("conversation_id")
+    if conversation_id is not None and not verify_conversation_id(conversation_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Cart not found for conversation ID: {conversation_id}"
+        )
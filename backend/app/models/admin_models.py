@@ -0,0 +1,7 @@
+from typing import Optional
+from pydantic import BaseModel, Field
+
+class ProfilerUpdate(BaseModel):
+    enabled: Optional[bool] = Field(None, description="Turn request sampling on or off")
+    sample_rate: Optional[float] = Field(None, ge=0, le=1, description="Share of requests to sample")
+    threshold_ms: Optional[float] = Field(None, ge=0, description="Save profiles of sampled requests slower than this")
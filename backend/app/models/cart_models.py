@@ -1,16 +1,35 @@
-from datetime import datetime
-from typing import List, Optional
-from pydantic import BaseModel, Field, validator
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Dict, List, Literal, Optional, Union
+from pydantic import BaseModel, Field, PrivateAttr, computed_field, validator
+from typing_extensions import Annotated
+from ..core.config import settings
+
+MAX_ITEM_QUANTITY = 12
+MAX_BATCH_OPERATIONS = 100
 
 class Modifier(BaseModel):
     id: str = Field(..., description="Unique identifier for the modifier")
     quantity: int = Field(..., ge=1, le=10, description="Quantity of the modifier")
 
+class InstructionStatus(str, Enum):
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+class InstructionAnalysis(BaseModel):
+    spice_level: Optional[str] = Field(None, description="Requested spice level")
+    allergies: List[str] = Field(default=[], description="Allergies mentioned in the instructions")
+    preferences: List[str] = Field(default=[], description="Preparation preferences")
+    special_requests: List[str] = Field(default=[], description="Other special requests")
+
 class CartItem(BaseModel):
     item_id: str = Field(..., description="Unique identifier for the menu item")
-    quantity: int = Field(..., ge=1, le=12, description="Quantity of the item")
-    instructions: Optional[str] = Field(None, max_length=500, description="Special instructions for the item")
+    quantity: int = Field(..., ge=1, le=MAX_ITEM_QUANTITY, description="Quantity of the item")
+    special_instructions: Optional[str] = Field(None, max_length=500, description="Special instructions for the item")
     modifiers: Optional[List[Modifier]] = Field(default=[], description="List of item modifiers")
+    instructions_status: Optional[InstructionStatus] = Field(None, description="State of the AI analysis of the special instructions")
+    instructions_analysis: Optional[InstructionAnalysis] = Field(None, description="Structured result of the AI analysis")
 
     @validator('modifiers')
     def validate_modifiers(cls, v):
@@ -20,26 +39,152 @@ class CartItem(BaseModel):
             raise ValueError("Maximum 10 modifiers allowed per item")
         return v
 
+def _modifier_key(item: CartItem) -> List[tuple]:
+    return sorted((modifier.id, modifier.quantity) for modifier in item.modifiers or [])
+
+def _same_line(a: CartItem, b: CartItem) -> bool:
+    """Whether two items differ only in quantity, so they can share a line."""
+    return a.special_instructions == b.special_instructions and _modifier_key(a) == _modifier_key(b)
+
+class ItemConflict(ValueError):
+    """A change would give two lines the same item_id."""
+
 class Cart(BaseModel):
+    """A conversation's cart.
+
+    Items are held in an insertion-ordered index keyed by item_id, so
+    lookups and mutations are O(1) while ``items`` keeps a stable order.
+    Each item_id has exactly one line, which the item endpoints address.
+    ``version`` increases on every stored change and, with the creation
+    time, forms the cart's ETag.
+    """
     conversation_id: str = Field(..., description="Unique identifier for the conversation")
-    items: List[CartItem] = Field(default=[], description="List of items in the cart")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    version: int = Field(0, ge=0, description="Incremented on every change to the cart")
+    _items: Dict[str, CartItem] = PrivateAttr(default_factory=dict)
 
-    @validator('items')
-    def validate_items(cls, v):
-        if len(v) > 50:  # Maximum 50 items per cart
-            raise ValueError("Maximum 50 items allowed in cart")
-        return v
+    def __init__(self, items: Optional[List[CartItem]] = None, **data):
+        super().__init__(**data)
+        for item in items or []:
+            self.add_item(CartItem.model_validate(item))
+
+    @computed_field(description="List of items in the cart")
+    @property
+    def items(self) -> List[CartItem]:
+        return list(self._items.values())
+
+    @property
+    def item_count(self) -> int:
+        return len(self._items)
+
+    @property
+    def etag(self) -> str:
+        """Strong ETag for the cart's current state.
+
+        The creation time keeps a recreated cart from reusing the tags of
+        an earlier one with the same conversation id.
+        """
+        created_ms = int(self.created_at.replace(tzinfo=timezone.utc).timestamp() * 1000)
+        return f'"{created_ms:x}-{self.version}"'
+
+    def get_item(self, item_id: str) -> Optional[CartItem]:
+        """Return the item with the given id, if present."""
+        return self._items.get(item_id)
+
+    def add_item(self, item: CartItem) -> CartItem:
+        """Add an item, merging its quantity into an existing row with the same id.
+
+        The existing row must have the same modifiers and instructions;
+        otherwise ItemConflict is raised rather than dropping either the
+        new or the stored ones. Returns the stored line.
+        """
+        existing = self._items.get(item.item_id)
+        if existing is None:
+            if len(self._items) >= settings.MAX_CART_ITEMS:
+                raise ValueError(f"Maximum {settings.MAX_CART_ITEMS} items allowed in cart")
+            self._items[item.item_id] = item
+            return item
+
+        if not _same_line(existing, item):
+            raise ItemConflict(
+                f"Item already in cart with other modifiers or instructions: {item.item_id}"
+            )
+        quantity = existing.quantity + item.quantity
+        if quantity > MAX_ITEM_QUANTITY:
+            raise ValueError(
+                f"Maximum quantity of {MAX_ITEM_QUANTITY} exceeded for item: {item.item_id}"
+            )
+        existing.quantity = quantity
+        return existing
+
+    def replace_item(self, item_id: str, item: CartItem) -> None:
+        """Replace an item in place, keeping its position in the cart."""
+        if item_id not in self._items:
+            raise ValueError("Item not found in cart")
+
+        if item.item_id == item_id:
+            self._items[item_id] = item
+            return
+
+        if item.item_id in self._items:
+            raise ItemConflict(f"Item already in cart: {item.item_id}")
+        # Renaming an item is rare; rebuild the index to keep its position.
+        self._items = {
+            (item.item_id if key == item_id else key): (item if key == item_id else value)
+            for key, value in self._items.items()
+        }
+
+    def remove_item(self, item_id: str) -> None:
+        """Remove an item by id."""
+        if self._items.pop(item_id, None) is None:
+            raise ValueError("Item not found in cart")
+
+    def clear_items(self) -> None:
+        """Remove all items."""
+        self._items.clear()
+
+class AddItemOperation(BaseModel):
+    op: Literal["add"]
+    item: CartItem
+
+class UpdateItemOperation(BaseModel):
+    op: Literal["update"]
+    item_id: str = Field(..., description="Item to replace")
+    item: CartItem
+
+class RemoveItemOperation(BaseModel):
+    op: Literal["remove"]
+    item_id: str = Field(..., description="Item to remove")
+
+class ClearCartOperation(BaseModel):
+    op: Literal["clear"]
+
+CartOperation = Annotated[
+    Union[AddItemOperation, UpdateItemOperation, RemoveItemOperation, ClearCartOperation],
+    Field(discriminator="op")
+]
+
+class CartBatchRequest(BaseModel):
+    operations: List[CartOperation] = Field(
+        ...,
+        min_length=1,
+        max_length=MAX_BATCH_OPERATIONS,
+        description="Operations applied in order, all or nothing"
+    )
 
 class CartResponse(BaseModel):
     success: bool = True
     conversation_id: str
     items: List[CartItem]
     total_items: int
+    version: int
     created_at: datetime
     updated_at: datetime
 
+class OrderResponse(CartResponse):
+    summary: Optional[str] = Field(None, description="AI order summary; null when the AI service is unavailable")
+
 class ErrorResponse(BaseModel):
     success: bool = False
     error: str
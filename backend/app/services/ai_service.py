@@ -1,8 +1,37 @@
 import aiohttp
+import asyncio
+import copy
 import json
-from typing import List, Dict, Any
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 from app.core.config import settings
+from app.core.metrics import AI_REQUEST_DURATION
 from app.models.cart_models import Cart
+from app.services.instruction_rules import InstructionRuleMatcher, load_instruction_rules
+from app.services.prompts import (
+    Prompt,
+    instruction_batch_prompt,
+    instructions_prompt,
+    suggest_prompt,
+    summary_prompt
+)
+from app.utils.cache import TTLCache
+from app.utils.circuit_breaker import CircuitBreaker
+from app.utils.concurrency import ConcurrencyLimiter
+from app.utils.latency import LatencyTracker
+from app.utils.micro_batcher import MicroBatcher
+from app.utils.singleflight import SingleFlight
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_instructions(instructions: str) -> str:
+    """Normalize instruction text so trivially different repeats compare equal."""
+    return _WHITESPACE.sub(" ", instructions).strip(" .,!;").lower()
+
+class AIServiceUnavailable(Exception):
+    """Ollama is unreachable, too slow, overloaded or behind an open breaker."""
 
 class AIService:
     def __init__(self):
@@ -11,73 +40,359 @@ class AIService:
         self.temperature = settings.OLLAMA_TEMPERATURE
         self.max_tokens = settings.OLLAMA_MAX_TOKENS
         self.timeout = settings.OLLAMA_TIMEOUT
+        self.num_ctx = settings.OLLAMA_NUM_CTX
+        self.keep_alive = settings.OLLAMA_KEEP_ALIVE
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.instructions_cache = TTLCache(
+            max_entries=settings.AI_CACHE_MAX_ENTRIES,
+            ttl=settings.AI_CACHE_TTL
+        )
+        self._in_flight = SingleFlight()
+        self.rules: Optional[InstructionRuleMatcher] = (
+            load_instruction_rules() if settings.AI_RULES_ENABLED else None
+        )
+        self._instruction_batcher = MicroBatcher(
+            self._analyze_instruction_batch,
+            max_batch_size=settings.AI_BATCH_MAX_SIZE,
+            max_wait=settings.AI_BATCH_WINDOW_MS / 1000
+        )
+        self.limiter = ConcurrencyLimiter(
+            limit=settings.AI_MAX_CONCURRENCY,
+            max_wait=settings.AI_CONCURRENCY_WAIT
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.AI_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.AI_BREAKER_RESET_TIMEOUT
+        )
+        self._latency: Dict[str, LatencyTracker] = {}
+
+    async def start(self) -> None:
+        """Open the shared HTTP session used for all Ollama requests."""
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=settings.OLLAMA_POOL_SIZE,
+            limit_per_host=settings.OLLAMA_POOL_SIZE_PER_HOST,
+            keepalive_timeout=settings.OLLAMA_KEEPALIVE_TIMEOUT
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+        self._session_loop = asyncio.get_running_loop()
+
+    async def close(self) -> None:
+        """Close the shared HTTP session and release pooled connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, opening it if the app lifespan did not."""
+        if (
+            self._session is None
+            or self._session.closed
+            or self._session_loop is not asyncio.get_running_loop()
+        ):
+            # A session is bound to the loop it was created on, so one left
+            # over from a previous loop cannot be reused.
+            self._session = None
+            await self.start()
+        return self._session
+
+    def _latency_for(self, task: str) -> LatencyTracker:
+        tracker = self._latency.get(task)
+        if tracker is None:
+            tracker = self._latency[task] = LatencyTracker(
+                window=settings.AI_TIMEOUT_WINDOW,
+                percentile=settings.AI_TIMEOUT_PERCENTILE,
+                multiplier=settings.AI_TIMEOUT_MULTIPLIER,
+                min_timeout=settings.AI_TIMEOUT_MIN,
+                max_timeout=self.timeout,
+                min_samples=settings.AI_TIMEOUT_MIN_SAMPLES,
+                fallback_after=settings.AI_TIMEOUT_FALLBACK_AFTER
+            )
+        return tracker
+
+    @asynccontextmanager
+    async def _guard(self, task: str, adaptive: bool = True) -> AsyncIterator[None]:
+        """Admit one Ollama call through the breaker and concurrency gate.
+
+        Rejected calls fail fast with AIServiceUnavailable instead of
+        queueing behind a slow model server. AIServiceUnavailable raised
+        by the call counts against the breaker; a clean exit closes it
+        and, if adaptive, feeds the call's latency into task's timeout.
+        Every call's latency and outcome is recorded in the metrics.
+        """
+        if not self.breaker.allow():
+            AI_REQUEST_DURATION.labels(task, "rejected").observe(0)
+            raise AIServiceUnavailable("Ollama circuit breaker is open")
+        if not await self.limiter.acquire():
+            AI_REQUEST_DURATION.labels(task, "rejected").observe(0)
+            raise AIServiceUnavailable("Too many concurrent Ollama requests")
+
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            yield
+        except AIServiceUnavailable:
+            outcome = "unavailable"
+            self.breaker.record_failure()
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        else:
+            outcome = "success"
+            self.breaker.record_success()
+        finally:
+            self.limiter.release()
+            elapsed = time.perf_counter() - started
+            AI_REQUEST_DURATION.labels(task, outcome).observe(elapsed)
+            if outcome == "success" and adaptive:
+                self._latency_for(task).record(elapsed)
 
-    async def _make_request(self, prompt: str) -> Dict[str, Any]:
-        """Make a request to the Ollama API."""
-        async with aiohttp.ClientSession() as session:
+    def _generate_payload(self, prompt: Prompt, stream: bool) -> Dict[str, Any]:
+        """Build an /api/generate body for prompt.
+
+        Generation limits must go in ``options``; Ollama ignores them as
+        top-level fields.
+        """
+        payload = {
+            "model": self.model,
+            "prompt": prompt.text,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": {
+                "temperature": self.temperature,
+                "num_predict": prompt.num_predict,
+                "num_ctx": self.num_ctx
+            }
+        }
+        if prompt.json_mode:
+            payload["format"] = "json"
+        return payload
+
+    async def load_model(self, timeout: float) -> None:
+        """Ask Ollama to load the model into memory and keep it there.
+
+        A generate request without a prompt only loads the model. It
+        bypasses the breaker and concurrency gate: loading can take far
+        longer than any generation and is not a sign of an unhealthy
+        server.
+        """
+        session = await self._get_session()
+        started = time.perf_counter()
+        outcome = "unavailable"
+        try:
+            async with session.post(
+                f"{self.base_url}/api/generate",
+                json={"model": self.model, "keep_alive": self.keep_alive},
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as response:
+                if response.status != 200:
+                    raise AIServiceUnavailable(f"Ollama API error: {response.status}")
+                await response.read()
+            outcome = "success"
+        except aiohttp.ClientError as e:
+            raise AIServiceUnavailable(f"Error connecting to Ollama API: {str(e)}")
+        except asyncio.TimeoutError:
+            raise AIServiceUnavailable(f"Ollama did not load {self.model} within {timeout:.0f}s")
+        finally:
+            AI_REQUEST_DURATION.labels("load", outcome).observe(time.perf_counter() - started)
+
+    async def _make_request(self, prompt: Prompt) -> Any:
+        """Make a request to the Ollama API.
+
+        JSON-mode prompts return the parsed reply, others the raw text.
+        Identical prompts already in flight share one upstream call; each
+        caller gets its own copy of the result.
+        """
+        result = await self._in_flight.do(
+            (prompt, self.model, self.temperature),
+            lambda: self._post_generate(prompt)
+        )
+        return copy.deepcopy(result)
+
+    async def _post_generate(self, prompt: Prompt) -> Any:
+        """Send a single generate request to Ollama and parse the reply.
+
+        The request times out after a multiple of the task's observed
+        latency rather than the full OLLAMA_TIMEOUT once enough calls have
+        been seen. A timed-out call is fed back to the tracker, so the
+        timeout follows a model that has become slower.
+        """
+        async with self._guard(prompt.task):
+            session = await self._get_session()
+            tracker = self._latency_for(prompt.task)
+            timeout = tracker.timeout()
             try:
                 async with session.post(
                     f"{self.base_url}/api/generate",
-                    json={
-                        "model": self.model,
-                        "prompt": prompt,
-                        "temperature": self.temperature,
-                        "max_tokens": self.max_tokens
-                    },
-                    timeout=self.timeout
+                    json=self._generate_payload(prompt, stream=False),
+                    timeout=aiohttp.ClientTimeout(total=timeout)
                 ) as response:
                     if response.status != 200:
-                        raise Exception(f"Ollama API error: {response.status}")
+                        raise AIServiceUnavailable(f"Ollama API error: {response.status}")
                     
                     result = await response.json()
-                    return json.loads(result.get("response", "{}"))
             except aiohttp.ClientError as e:
-                raise Exception(f"Error connecting to Ollama API: {str(e)}")
-            except json.JSONDecodeError as e:
-                raise Exception(f"Error parsing Ollama API response: {str(e)}")
+                raise AIServiceUnavailable(f"Error connecting to Ollama API: {str(e)}")
+            except asyncio.TimeoutError:
+                tracker.record_timeout(timeout)
+                raise AIServiceUnavailable(f"Ollama API timed out after {timeout:.1f}s")
+
+        if not prompt.json_mode:
+            return result.get("response", "")
+        try:
+            return json.loads(result.get("response", "{}"))
+        except json.JSONDecodeError as e:
+            raise Exception(f"Error parsing Ollama API response: {str(e)}")
+
+    def _instructions_cache_key(self, instructions: str) -> Tuple[str, str, float]:
+        return (instructions, self.model, self.temperature)
 
     async def process_cart_instructions(self, instructions: str) -> Dict[str, Any]:
-        """Process food order instructions to extract key information."""
-        prompt = f"""
-        Analyze the following food order instructions and extract key information:
-        {instructions}
-        
-        Return a JSON object with the following structure:
-        {{
-            "spice_level": "mild/medium/hot",
-            "allergies": ["list", "of", "allergies"],
-            "preferences": ["list", "of", "preferences"],
-            "special_requests": ["list", "of", "special", "requests"]
-        }}
+        """Process food order instructions to extract key information.
+
+        Common phrasings are parsed by the rule matcher without a model
+        call; everything else goes to Ollama. Model results are cached by
+        normalized instruction text, model and temperature, so repeated
+        instructions skip the Ollama round trip. Concurrent calls for the
+        same text share one analysis, and distinct texts arriving together
+        are micro-batched into a single prompt.
         """
-        return await self._make_request(prompt)
+        normalized = normalize_instructions(instructions)
+        if self.rules is not None:
+            parsed = self.rules.match(normalized)
+            if parsed is not None:
+                return parsed
+
+        key = self._instructions_cache_key(normalized)
+        cached = self.instructions_cache.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
+        result = await self._in_flight.do(
+            ("instructions",) + key,
+            lambda: self._analyze_and_cache(normalized, key)
+        )
+        return copy.deepcopy(result)
+
+    async def _analyze_and_cache(self, instructions: str, key: Tuple[str, str, float]) -> Dict[str, Any]:
+        result = await self._instruction_batcher.submit(instructions)
+        self.instructions_cache.set(key, copy.deepcopy(result))
+        return result
+
+    async def _analyze_instruction_batch(self, batch: List[str]) -> List[Any]:
+        """Analyze a micro-batch of instructions with as few prompts as possible."""
+        if len(batch) == 1:
+            return [await self.analyze_instructions(batch[0])]
+
+        response = await self._make_request(instruction_batch_prompt(batch))
+        return self._demultiplex(response, len(batch))
+
+    def _demultiplex(self, response: Any, size: int) -> List[Any]:
+        """Split a batched reply back into one result (or error) per instruction."""
+        entries = response.get("results") if isinstance(response, dict) else response
+        if not isinstance(entries, list):
+            raise Exception("Error parsing Ollama API response: expected a results array")
+
+        results: List[Any] = [None] * size
+        for position, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                continue
+            index = entry.pop("index", position)
+            if isinstance(index, int) and 0 <= index < size and results[index] is None:
+                results[index] = entry
+
+        return [
+            result if result is not None
+            else Exception(f"Ollama API response has no result for instruction {index}")
+            for index, result in enumerate(results)
+        ]
+
+    async def analyze_instructions(self, instructions: str) -> Dict[str, Any]:
+        """Ask Ollama to extract key information from instructions.
+
+        Always calls the model: the rule matcher and the instruction cache
+        are left to process_cart_instructions.
+        """
+        return await self._make_request(instructions_prompt(instructions))
 
     async def suggest_items(self, cart_items: List[Dict[str, Any]], preferences: List[str]) -> List[str]:
         """Suggest additional items based on current cart items and preferences."""
-        prompt = f"""
-        Based on the current cart items:
-        {json.dumps(cart_items, indent=2)}
-        
-        And user preferences:
-        {json.dumps(preferences, indent=2)}
-        
-        Suggest additional items that would complement the order.
-        Return a JSON array of item IDs.
-        """
-        return await self._make_request(prompt)
+        response = await self._make_request(suggest_prompt(cart_items, preferences))
+        # JSON mode always yields an object, but accept a bare array too.
+        items = response.get("items", []) if isinstance(response, dict) else response
+        return [str(item) for item in items] if isinstance(items, list) else []
 
     async def summarize_order(self, cart: Cart) -> str:
         """Generate a natural language summary of the order."""
-        prompt = f"""
-        Create a natural language summary of the following food order:
-        {json.dumps(cart.dict(), indent=2)}
-        
-        Focus on:
-        1. Total number of items
-        2. Special instructions
-        3. Notable combinations
-        4. Any dietary considerations
+        return await self._make_request(summary_prompt(cart))
+
+    async def stream_order_summary(self, cart: Cart) -> AsyncIterator[str]:
+        """Stream a natural language summary of the order token by token.
+
+        If the consumer stops early or is cancelled, the upstream response
+        is closed so Ollama stops generating. The stream holds a
+        concurrency slot and is subject to the circuit breaker.
         """
-        return await self._make_request(prompt)
+        async with self._guard("summary_stream", adaptive=False):
+            tokens = self._stream_generate(summary_prompt(cart))
+            try:
+                async for token in tokens:
+                    yield token
+            finally:
+                await tokens.aclose()
+
+    async def _stream_generate(self, prompt: Prompt) -> AsyncIterator[str]:
+        session = await self._get_session()
+        try:
+            async with session.post(
+                f"{self.base_url}/api/generate",
+                json=self._generate_payload(prompt, stream=True),
+                # Bound the wait between chunks, not the whole generation.
+                timeout=aiohttp.ClientTimeout(total=None, sock_read=self.timeout)
+            ) as response:
+                if response.status != 200:
+                    raise AIServiceUnavailable(f"Ollama API error: {response.status}")
+
+                finished = False
+                try:
+                    async for line in response.content:
+                        if not line.strip():
+                            continue
+                        chunk = json.loads(line)
+                        if "error" in chunk:
+                            raise Exception(f"Ollama API error: {chunk['error']}")
+                        if chunk.get("response"):
+                            yield chunk["response"]
+                        if chunk.get("done"):
+                            break
+                    finished = True
+                finally:
+                    if not finished:
+                        response.close()
+        except aiohttp.ClientError as e:
+            raise AIServiceUnavailable(f"Error connecting to Ollama API: {str(e)}")
+        except asyncio.TimeoutError:
+            raise AIServiceUnavailable(f"Ollama API sent nothing for {self.timeout}s")
+        except json.JSONDecodeError as e:
+            raise Exception(f"Error parsing Ollama API response: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for the AI service's caches and Ollama protection."""
+        return {
+            "breaker": self.breaker.stats(),
+            "concurrency": self.limiter.stats(),
+            "latency": {task: tracker.stats() for task, tracker in self._latency.items()},
+            "instructions_cache": self.instructions_cache.stats(),
+            "in_flight": self._in_flight.stats(),
+            "instruction_batches": self._instruction_batcher.stats(),
+            "instruction_rules": self.rules.stats() if self.rules is not None else None
+        }
 
 ai_service = AIService() 
\ No newline at end of file
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+from app.core.config import settings
+from app.core.metrics import CART_CLEANUP_DURATION
+from app.services.cart_service import CartService, cart_service
+
+logger = logging.getLogger(__name__)
+
+class CartCleanupTask:
+    """Periodically evict expired carts without stalling the event loop.
+
+    Each run removes due carts in slices of batch_size and yields to the
+    event loop between slices.
+    """
+
+    def __init__(
+        self,
+        carts: CartService,
+        interval: float = settings.STORAGE_CLEANUP_INTERVAL,
+        batch_size: int = settings.STORAGE_CLEANUP_BATCH_SIZE
+    ):
+        self.carts = carts
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.runs = 0
+        self.last_run_seconds = 0.0
+        self.last_run_evicted = 0
+
+    async def start(self) -> None:
+        """Start the periodic cleanup loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="cart-cleanup")
+
+    async def stop(self) -> None:
+        """Stop the cleanup loop."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Cart cleanup failed")
+
+    async def run_once(self) -> int:
+        """Evict every cart that is currently due, one slice at a time."""
+        started = time.perf_counter()
+        evicted = 0
+        while True:
+            removed = await self.carts.run(self.carts.cleanup_old_carts, self.batch_size)
+            evicted += removed
+            if removed < self.batch_size:
+                break
+            await asyncio.sleep(0)
+
+        self.runs += 1
+        self.last_run_seconds = time.perf_counter() - started
+        CART_CLEANUP_DURATION.observe(self.last_run_seconds)
+        self.last_run_evicted = evicted
+        if evicted:
+            logger.info(
+                "Evicted %d expired carts in %.3fs", evicted, self.last_run_seconds
+            )
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for the most recent cleanup runs."""
+        return {
+            "runs": self.runs,
+            "last_run_seconds": self.last_run_seconds,
+            "last_run_evicted": self.last_run_evicted
+        }
+
+cart_cleanup = CartCleanupTask(cart_service)
@@ -0,0 +1,387 @@
+import logging
+import os
+import pickle
+import queue
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from ..core.config import settings
+from .cart_records import CartRecord
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, one process per directory is on the operator
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Each frame is a little-endian (payload length, CRC-32) header and a
+# pickled list of entries. A torn or corrupt frame ends replay of its
+# segment.
+_HEADER = struct.Struct("<II")
+_SNAPSHOT = "snapshot.pkl"
+_SEGMENT_PREFIX = "journal-"
+_SEGMENT_SUFFIX = ".log"
+
+PUT = "put"
+DELETE = "del"
+CLEAR = "clear"
+
+Entry = Tuple[Any, ...]
+
+class _Snapshot:
+    def __init__(self, shards: Sequence[Dict[str, CartRecord]]):
+        self.shards = shards
+
+_STOP = object()
+
+def _frame(payload: bytes) -> bytes:
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+def _read_frames(data: bytes) -> Tuple[List[bytes], bool]:
+    """Split data into frame payloads; the flag is False if a bad frame was hit."""
+    payloads = []
+    offset = 0
+    while offset < len(data):
+        if offset + _HEADER.size > len(data):
+            return payloads, False
+        length, checksum = _HEADER.unpack_from(data, offset)
+        start = offset + _HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            return payloads, False
+        payloads.append(payload)
+        offset = start + length
+    return payloads, True
+
+def _fsync_directory(directory: Path) -> None:
+    if os.name == "nt":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class CartJournal:
+    """Append-only log of cart mutations plus periodic snapshots.
+
+    append() only queues the entry; a writer thread drains the queue,
+    writes everything pending as one frame and fsyncs it, so concurrent
+    mutations share a single fsync (group commit) and the event loop
+    never waits on the disk. A crash can lose the entries still queued,
+    normally the last few milliseconds of changes.
+
+    The queue holds at most max_queued entries. If the disk stalls for
+    long enough to fill it, further entries are dropped and counted
+    rather than buffered without bound, and snapshot_due turns true: the
+    next snapshot records the full state and so replaces them. A batch
+    lost to a write error is handled the same way.
+
+    snapshot() is queued in order with the mutations. The writer closes
+    the current journal segment, opens the next one and hands the store's
+    dicts to a snapshot thread, so journaling carries on while the
+    snapshot is written. The snapshot goes to a temporary file that is
+    renamed into place before the segments it covers are deleted, so at
+    every point on disk the snapshot plus the remaining segments hold the
+    full state. If the next segment cannot be opened, the snapshot is
+    skipped and the writer carries on in the current segment.
+
+    Should the writer thread die of an unexpected error, the journal is
+    marked failed, reported in stats(), and further entries are dropped.
+
+    Records are pickled. The directory must only be writable by the app.
+    """
+
+    def __init__(
+        self,
+        directory: str = settings.STORAGE_JOURNAL_DIR,
+        fsync: bool = settings.STORAGE_JOURNAL_FSYNC,
+        snapshot_every: int = settings.STORAGE_SNAPSHOT_EVERY,
+        max_queued: int = settings.STORAGE_JOURNAL_QUEUE_SIZE
+    ):
+        self.directory = Path(directory)
+        self.fsync = fsync
+        self.snapshot_every = snapshot_every
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queued)
+        self._thread: Optional[threading.Thread] = None
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self._lock_file = None
+        self._segment = 0
+        self._file = None
+        self.entries_since_snapshot = 0
+        self.dropped = 0
+        self._overflowed = False
+        self.recovered = 0
+        self.replayed = 0
+        self.recovery_seconds = 0.0
+        self.batches = 0
+        self.entries_written = 0
+        self.bytes_written = 0
+        self.snapshots = 0
+        self.last_snapshot_seconds = 0.0
+        self.fsync_latencies: "deque[float]" = deque(maxlen=1024)
+        self.errors = 0
+        self.failed = False
+
+    def _segments(self) -> List[Tuple[int, Path]]:
+        segments = []
+        for path in self.directory.glob(f"{_SEGMENT_PREFIX}*{_SEGMENT_SUFFIX}"):
+            number = path.name[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)]
+            if number.isdigit():
+                segments.append((int(number), path))
+        return sorted(segments)
+
+    def _segment_path(self, number: int) -> Path:
+        return self.directory / f"{_SEGMENT_PREFIX}{number:08d}{_SEGMENT_SUFFIX}"
+
+    def _lock(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if fcntl is None or self._lock_file is not None:
+            return
+        self._lock_file = open(self.directory / "LOCK", "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise RuntimeError(f"Cart journal {self.directory} is in use by another process")
+
+    def recover(self) -> Dict[str, CartRecord]:
+        """Rebuild the stored carts from the snapshot and the journal tail."""
+        self._lock()
+        started = time.perf_counter()
+        records: Dict[str, CartRecord] = {}
+        first_segment = 0
+        snapshot = self.directory / _SNAPSHOT
+        if snapshot.exists():
+            with open(snapshot, "rb") as f:
+                first_segment, snapshot_records = pickle.load(f)
+            records = {record.conversation_id: record for record in snapshot_records}
+            del snapshot_records
+
+        segments = self._segments()
+        for number, path in segments:
+            if number < first_segment:
+                # Already covered by the snapshot; left over from a crash
+                # between the rename and the cleanup.
+                path.unlink(missing_ok=True)
+                continue
+            payloads, complete = _read_frames(path.read_bytes())
+            for payload in payloads:
+                for entry in pickle.loads(payload):
+                    self._apply(records, entry)
+                    self.replayed += 1
+            if not complete:
+                logger.warning("Cart journal %s ends in a torn or corrupt frame; replayed up to it", path.name)
+
+        self._segment = max([first_segment] + [number + 1 for number, _ in segments])
+        self.recovered = len(records)
+        self.recovery_seconds = time.perf_counter() - started
+        logger.info(
+            "Recovered %d carts (%d journal entries) in %.2fs",
+            self.recovered, self.replayed, self.recovery_seconds
+        )
+        return records
+
+    @staticmethod
+    def _apply(records: Dict[str, CartRecord], entry: Entry) -> None:
+        kind = entry[0]
+        if kind == PUT:
+            records[entry[1].conversation_id] = entry[1]
+        elif kind == DELETE:
+            records.pop(entry[1], None)
+        elif kind == CLEAR:
+            records.clear()
+
+    def start(self) -> None:
+        """Open a new journal segment and start the writer thread."""
+        if self._thread is not None:
+            return
+        self._lock()
+        self._file = open(self._segment_path(self._segment), "ab")
+        self._thread = threading.Thread(target=self._run, name="cart-journal", daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def append(self, entry: Entry) -> None:
+        """Queue a mutation for the writer thread, or drop it if the queue is full."""
+        if self.failed:
+            self.dropped += 1
+            return
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            if not self._overflowed:
+                logger.warning("Cart journal queue is full; dropping entries until the next snapshot")
+            self._overflowed = True
+            self.dropped += 1
+            return
+        self.entries_since_snapshot += 1
+
+    @property
+    def snapshot_due(self) -> bool:
+        """Whether a snapshot should be queued now (never while the queue is full)."""
+        if self._queue.full():
+            return False
+        return self._overflowed or self.entries_since_snapshot >= self.snapshot_every
+
+    def snapshot(self, shards: Sequence[Dict[str, CartRecord]], wait: bool = False) -> None:
+        """Queue a snapshot of every stored cart, taken after all queued mutations.
+
+        shards are the store's live dicts, not copies: the snapshot
+        thread copies them, so the caller does no per-cart work. Without
+        wait, a full queue leaves the snapshot due so it is retried on a
+        later change.
+        """
+        try:
+            self._queue.put(_Snapshot(shards), block=wait)
+        except queue.Full:
+            return
+        self.entries_since_snapshot = 0
+        self._overflowed = False
+
+    def close(self) -> None:
+        """Write everything queued and stop the writer thread."""
+        if self._thread is not None:
+            if self._thread.is_alive():
+                self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        self._wait_for_snapshot()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _run(self) -> None:
+        try:
+            self._drain()
+        except Exception:
+            self.failed = True
+            logger.exception("Cart journal writer stopped; further changes are not journaled")
+
+    def _drain(self) -> None:
+        while True:
+            pending: List[Entry] = []
+            item = self._queue.get()
+            while True:
+                if isinstance(item, _Snapshot) or item is _STOP:
+                    self._write(pending)
+                    pending = []
+                    if item is _STOP:
+                        self._file.close()
+                        return
+                    self._start_snapshot(item.shards)
+                else:
+                    pending.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._write(pending)
+
+    def _write(self, entries: List[Entry]) -> None:
+        if not entries:
+            return
+        try:
+            data = _frame(pickle.dumps(entries, protocol=pickle.HIGHEST_PROTOCOL))
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                started = time.perf_counter()
+                os.fsync(self._file.fileno())
+                self.fsync_latencies.append(time.perf_counter() - started)
+        except OSError:
+            self.errors += 1
+            logger.exception("Could not write %d cart journal entries", len(entries))
+            # Replaying without them would revive deleted carts or restore
+            # stale ones, so the next change queues a snapshot to replace them.
+            self._overflowed = True
+            return
+        self.batches += 1
+        self.entries_written += len(entries)
+        self.bytes_written += len(data)
+
+    def _wait_for_snapshot(self) -> None:
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+
+    def _start_snapshot(self, shards: Sequence[Dict[str, CartRecord]]) -> None:
+        # One snapshot at a time: a newer one must not be overwritten by
+        # an older one finishing late.
+        self._wait_for_snapshot()
+        covered = self._segment
+        try:
+            next_file = open(self._segment_path(covered + 1), "ab")
+        except OSError:
+            # Nothing is lost: the current segment still takes every
+            # entry, and a later snapshot tries again.
+            self.errors += 1
+            logger.exception("Could not open a new cart journal segment; snapshot skipped")
+            return
+        self._file.close()
+        self._segment += 1
+        self._file = next_file
+        self._snapshot_thread = threading.Thread(
+            target=self._write_snapshot,
+            args=(shards, covered, self._segment),
+            name="cart-snapshot",
+            daemon=True
+        )
+        self._snapshot_thread.start()
+
+    def _write_snapshot(self, shards: Sequence[Dict[str, CartRecord]], covered: int, first_segment: int) -> None:
+        started = time.perf_counter()
+        # dict.copy() runs under the GIL, so each copy is a consistent
+        # view even while the event loop keeps changing the dict. A copy
+        # may include changes made after the snapshot was queued; those
+        # are also in the new segment, and replaying them over the
+        # snapshot yields the same carts, since every entry sets a cart
+        # outright.
+        records = [record for shard in shards for record in shard.copy().values()]
+        try:
+            temporary = self.directory / (_SNAPSHOT + ".tmp")
+            with open(temporary, "wb") as f:
+                pickle.dump((first_segment, records), f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self.directory / _SNAPSHOT)
+            _fsync_directory(self.directory)
+        except OSError:
+            # The old snapshot and every segment are still in place.
+            self.errors += 1
+            logger.exception("Could not write cart snapshot")
+            return
+        for number, path in self._segments():
+            if number <= covered:
+                path.unlink(missing_ok=True)
+        self.snapshots += 1
+        self.last_snapshot_seconds = time.perf_counter() - started
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.fsync_latencies)
+        return {
+            "directory": str(self.directory),
+            "recovered": self.recovered,
+            "replayed": self.replayed,
+            "recovery_seconds": self.recovery_seconds,
+            "queued": self._queue.qsize(),
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "entries_written": self.entries_written,
+            "bytes_written": self.bytes_written,
+            "snapshots": self.snapshots,
+            "last_snapshot_seconds": self.last_snapshot_seconds,
+            "fsync_p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+            "fsync_max_ms": latencies[-1] * 1000 if latencies else 0.0,
+            "errors": self.errors,
+            "failed": self.failed
+        }
@@ -0,0 +1,124 @@
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Optional, Tuple
+from ..models.cart_models import Cart, CartItem, InstructionAnalysis, InstructionStatus, Modifier
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+class AnalysisRecord(NamedTuple):
+    spice_level: Optional[str]
+    allergies: Tuple[str, ...]
+    preferences: Tuple[str, ...]
+    special_requests: Tuple[str, ...]
+
+class ItemRecord(NamedTuple):
+    item_id: str
+    quantity: int
+    special_instructions: Optional[str]
+    # Flattened (id, quantity, id, quantity, ...) pairs.
+    modifiers: Tuple[object, ...]
+    instructions_status: Optional[InstructionStatus]
+    instructions_analysis: Optional[AnalysisRecord]
+
+class CartRecord(NamedTuple):
+    """Immutable, compact stand-in for a stored Cart.
+
+    Timestamps are integer microseconds since the epoch, ids and analysis
+    labels are interned so repeats across carts share one string, and
+    empty collections are the shared empty tuple.
+    """
+    conversation_id: str
+    created_at: int
+    updated_at: int
+    version: int
+    items: Tuple[ItemRecord, ...]
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return None if value is None else sys.intern(value)
+
+def _interned(values) -> Tuple[str, ...]:
+    return tuple(sys.intern(value) for value in values)
+
+def _micros(value: datetime) -> int:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _MICROSECOND
+
+def _datetime(micros: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=micros)
+
+def record_updated_at(record: CartRecord) -> datetime:
+    """Return when the stored cart last changed."""
+    return _datetime(record.updated_at)
+
+def _item_record(item: CartItem) -> ItemRecord:
+    modifiers: Tuple[object, ...] = ()
+    if item.modifiers:
+        modifiers = tuple(
+            value
+            for modifier in item.modifiers
+            for value in (sys.intern(modifier.id), modifier.quantity)
+        )
+
+    analysis = item.instructions_analysis
+    return ItemRecord(
+        sys.intern(item.item_id),
+        item.quantity,
+        _intern(item.special_instructions),
+        modifiers,
+        item.instructions_status,
+        None if analysis is None else AnalysisRecord(
+            _intern(analysis.spice_level),
+            _interned(analysis.allergies),
+            _interned(analysis.preferences),
+            _interned(analysis.special_requests)
+        )
+    )
+
+def to_record(cart: Cart) -> CartRecord:
+    """Pack a cart into its compact stored form."""
+    return CartRecord(
+        cart.conversation_id,
+        _micros(cart.created_at),
+        _micros(cart.updated_at),
+        cart.version,
+        tuple(_item_record(item) for item in cart.items)
+    )
+
+def _item(record: ItemRecord) -> CartItem:
+    modifiers = record.modifiers
+    analysis = record.instructions_analysis
+    return CartItem.model_construct(
+        item_id=record.item_id,
+        quantity=record.quantity,
+        special_instructions=record.special_instructions,
+        modifiers=[
+            Modifier.model_construct(id=modifiers[index], quantity=modifiers[index + 1])
+            for index in range(0, len(modifiers), 2)
+        ],
+        instructions_status=record.instructions_status,
+        instructions_analysis=None if analysis is None else InstructionAnalysis.model_construct(
+            spice_level=analysis.spice_level,
+            allergies=list(analysis.allergies),
+            preferences=list(analysis.preferences),
+            special_requests=list(analysis.special_requests)
+        )
+    )
+
+def from_record(record: CartRecord) -> Cart:
+    """Rebuild a Cart from its stored form.
+
+    The record was made from a validated cart, so the models are built
+    with model_construct and skip validation. The caller gets a fresh
+    Cart and must save it back after changing it.
+    """
+    cart = Cart.model_construct(
+        conversation_id=record.conversation_id,
+        created_at=_datetime(record.created_at),
+        updated_at=_datetime(record.updated_at),
+        version=record.version
+    )
+    for item in record.items:
+        cart._items[item.item_id] = _item(item)
+    return cart
@@ -1,23 +1,94 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional
-from ..models.cart_models import Cart, CartItem, CartResponse, ErrorResponse
+import orjson
+from typing import Any, AsyncContextManager, Callable, Dict, List, Optional, TypeVar
+from pydantic import TypeAdapter
+from ..models.cart_models import (
+    AddItemOperation,
+    Cart,
+    CartItem,
+    CartOperation,
+    CartResponse,
+    ClearCartOperation,
+    InstructionAnalysis,
+    InstructionStatus,
+    ItemConflict,
+    RemoveItemOperation,
+    UpdateItemOperation
+)
 from ..core.config import settings
+from ..core.metrics import CART_ITEMS
+from ..utils.cache import TTLCache
+from ..utils.keyed_lock import KeyedLock
+from .cart_store import CartStore, CartVersionConflict, create_cart_store
+
+# Serializes already-validated items straight to JSON without revalidating.
+_ITEMS_JSON = TypeAdapter(List[CartItem])
+
+# Background writes re-read and retry this often when another process
+# changed the cart in between.
+_CONFLICT_RETRIES = 3
+
+T = TypeVar("T")
 
 class CartService:
-    def __init__(self):
-        self._carts: Dict[str, Cart] = {}
+    def __init__(self, store: Optional[CartStore] = None):
+        self._store = store if store is not None else create_cart_store()
+        self._locks = KeyedLock()
+        self._responses = TTLCache(
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl=settings.RESPONSE_CACHE_TTL
+        )
+        self.evicted = 0
+        # Stores that block on I/O get their own threads, so a slow disk
+        # or a held database lock never stalls the event loop.
+        self._executor = (
+            ThreadPoolExecutor(max_workers=self._store.threads, thread_name_prefix="cart-store")
+            if self._store.threads else None
+        )
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Call a method that reads or writes carts from async code.
+
+        It runs on the store's threads if the store blocks, otherwise
+        directly on the loop.
+        """
+        if self._executor is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def lock(self, conversation_id: str) -> AsyncContextManager[None]:
+        """Serialize a read-modify-write sequence on one conversation's cart.
+
+        Callers that await between reading a cart and writing it back must
+        hold this lock; operations on other conversations are unaffected.
+        """
+        return self._locks.acquire(conversation_id)
+
+    def _touch(self, cart: Cart) -> None:
+        """Record a mutation and persist the cart.
+
+        Raises CartVersionConflict if the stored cart changed since it
+        was read.
+        """
+        expected_version = cart.version
+        cart.updated_at = datetime.utcnow()
+        cart.version += 1
+        self._store.save(cart, expected_version=expected_version)
+        CART_ITEMS.observe(cart.item_count)
 
     def get_cart(self, conversation_id: str) -> Optional[Cart]:
         """Get a cart by conversation ID."""
-        return self._carts.get(conversation_id)
+        return self._store.get(conversation_id)
 
     def create_cart(self, conversation_id: str) -> Cart:
         """Create a new cart."""
-        if conversation_id in self._carts:
+        if self._store.get(conversation_id) is not None:
             raise ValueError("Cart already exists for this conversation")
         
         cart = Cart(conversation_id=conversation_id)
-        self._carts[conversation_id] = cart
+        self._store.save(cart, expected_version=0)
         return cart
 
     def add_item(self, conversation_id: str, item: CartItem) -> Cart:
@@ -26,8 +97,8 @@ class CartService:
         if not cart:
             cart = self.create_cart(conversation_id)
         
-        cart.items.append(item)
-        cart.updated_at = datetime.utcnow()
+        cart.add_item(item)
+        self._touch(cart)
         return cart
 
     def update_item(self, conversation_id: str, item_id: str, item: CartItem) -> Cart:
@@ -36,13 +107,9 @@ class CartService:
         if not cart:
             raise ValueError("Cart not found")
 
-        for i, existing_item in enumerate(cart.items):
-            if existing_item.item_id == item_id:
-                cart.items[i] = item
-                cart.updated_at = datetime.utcnow()
-                return cart
-        
-        raise ValueError("Item not found in cart")
+        cart.replace_item(item_id, item)
+        self._touch(cart)
+        return cart
 
     def remove_item(self, conversation_id: str, item_id: str) -> Cart:
         """Remove an item from the cart."""
@@ -50,8 +117,8 @@ class CartService:
         if not cart:
             raise ValueError("Cart not found")
 
-        cart.items = [item for item in cart.items if item.item_id != item_id]
-        cart.updated_at = datetime.utcnow()
+        cart.remove_item(item_id)
+        self._touch(cart)
         return cart
 
     def clear_cart(self, conversation_id: str) -> Cart:
@@ -60,28 +127,146 @@ class CartService:
         if not cart:
             raise ValueError("Cart not found")
 
-        cart.items = []
-        cart.updated_at = datetime.utcnow()
+        cart.clear_items()
+        self._touch(cart)
         return cart
 
+    def apply_operations(self, conversation_id: str, operations: List[CartOperation]) -> Cart:
+        """Apply a list of operations to a cart as one atomic change.
+
+        Operations run in order against a working copy, and the cart is
+        saved once at the end. If any operation fails, a ValueError naming
+        it is raised (an ItemConflict for an id clash) and the stored cart
+        is left untouched. A missing cart is created.
+        """
+        cart = self.get_cart(conversation_id)
+        if cart is None:
+            working = Cart(conversation_id=conversation_id)
+        else:
+            working = cart.model_copy(deep=True)
+
+        for index, operation in enumerate(operations):
+            try:
+                if isinstance(operation, AddItemOperation):
+                    working.add_item(operation.item)
+                elif isinstance(operation, UpdateItemOperation):
+                    working.replace_item(operation.item_id, operation.item)
+                elif isinstance(operation, RemoveItemOperation):
+                    working.remove_item(operation.item_id)
+                elif isinstance(operation, ClearCartOperation):
+                    working.clear_items()
+            except ItemConflict as e:
+                raise ItemConflict(f"Operation {index} ({operation.op}) failed: {e}")
+            except ValueError as e:
+                raise ValueError(f"Operation {index} ({operation.op}) failed: {e}")
+
+        self._touch(working)
+        return working
+
+    def apply_instruction_analysis(
+        self,
+        conversation_id: str,
+        item_id: str,
+        instructions: str,
+        status: InstructionStatus,
+        analysis: Optional[InstructionAnalysis] = None
+    ) -> Optional[CartItem]:
+        """Attach the outcome of an instruction analysis to a stored item.
+
+        The item is matched on its id and its current instructions, so a
+        result for instructions that have since been edited is discarded.
+        Returns the updated item, or None if nothing matched. If another
+        process changes the cart meanwhile, it is read again.
+        """
+        for attempt in range(_CONFLICT_RETRIES):
+            cart = self.get_cart(conversation_id)
+            if not cart:
+                return None
+
+            item = cart.get_item(item_id)
+            if item is None or item.special_instructions != instructions:
+                return None
+
+            item.instructions_status = status
+            item.instructions_analysis = analysis
+            # The response body changes, so cached ETags must not match, but
+            # background analysis does not count as activity for expiry.
+            cart.version += 1
+            try:
+                self._store.save(cart, expected_version=cart.version - 1)
+            except CartVersionConflict:
+                if attempt == _CONFLICT_RETRIES - 1:
+                    raise
+                continue
+            return item
+
     def get_cart_response(self, cart: Cart) -> CartResponse:
         """Convert a Cart to a CartResponse."""
         return CartResponse(
             success=True,
             conversation_id=cart.conversation_id,
             items=cart.items,
-            total_items=len(cart.items),
+            total_items=cart.item_count,
+            version=cart.version,
             created_at=cart.created_at,
             updated_at=cart.updated_at
         )
 
-    def cleanup_old_carts(self) -> None:
-        """Remove carts older than MAX_CONVERSATION_AGE."""
-        current_time = datetime.utcnow()
-        self._carts = {
-            conv_id: cart
-            for conv_id, cart in self._carts.items()
-            if (current_time - cart.updated_at).total_seconds() < settings.MAX_CONVERSATION_AGE
+    def render_cart_response(self, cart: Cart) -> bytes:
+        """Serialize a cart's CartResponse body as JSON bytes.
+
+        Carts and items are validated on their way into the service, so
+        the body is built straight from them rather than through a new
+        CartResponse. The bytes are cached per cart ETag, so polling an
+        unchanged cart does not serialize it again.
+        """
+        key = (cart.conversation_id, cart.etag)
+        body = self._responses.get(key)
+        if body is None:
+            body = orjson.dumps({
+                "success": True,
+                "conversation_id": cart.conversation_id,
+                "items": orjson.Fragment(_ITEMS_JSON.dump_json(cart.items)),
+                "total_items": cart.item_count,
+                "version": cart.version,
+                "created_at": cart.created_at,
+                "updated_at": cart.updated_at
+            })
+            self._responses.set(key, body)
+        return body
+
+    def cleanup_old_carts(self, limit: Optional[int] = None) -> int:
+        """Remove carts not updated within MAX_CONVERSATION_AGE.
+
+        Only carts whose deadline has passed are touched, at most limit of
+        them per call (STORAGE_CLEANUP_BATCH_SIZE by default). Returns the
+        number of carts removed.
+        """
+        if limit is None:
+            limit = settings.STORAGE_CLEANUP_BATCH_SIZE
+        evicted = self._store.evict_expired(datetime.utcnow(), limit)
+        self.evicted += evicted
+        return evicted
+
+    def recover(self) -> int:
+        """Load carts persisted by an earlier run; returns how many."""
+        return self._store.recover()
+
+    def close(self) -> None:
+        """Release the underlying store."""
+        if self._executor is not None:
+            self._executor.shutdown()
+        self._store.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cart storage and expiry counters."""
+        return {
+            "storage_type": type(self._store).__name__,
+            "carts": self._store.cached_count(),
+            "evicted": self.evicted,
+            "locked_conversations": len(self._locks.locked_keys()),
+            "response_cache": self._responses.stats(),
+            **self._store.stats()
         }
 
 cart_service = CartService() 
\ No newline at end of file
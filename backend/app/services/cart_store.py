@@ -0,0 +1,341 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set
+from ..core.config import settings
+from ..core.security import conversation_created_ms
+from ..models.cart_models import Cart
+from ..utils.expiry_queue import ExpiryQueue
+from .cart_journal import CLEAR, DELETE, PUT, CartJournal
+from .cart_records import CartRecord, from_record, record_updated_at, to_record
+
+_EPOCH = datetime(1970, 1, 1)
+_MILLISECOND = timedelta(milliseconds=1)
+
+def conversation_bucket(conversation_id: str, bucket_seconds: float) -> Optional[int]:
+    """Return the creation-time bucket of a generated conversation ID.
+
+    IDs that do not embed a creation time (client-chosen IDs) have no
+    bucket and get None.
+    """
+    created_ms = conversation_created_ms(conversation_id)
+    if created_ms is None:
+        return None
+    return int(created_ms // (bucket_seconds * 1000))
+
+class CartVersionConflict(Exception):
+    """A conditional save found the stored cart at another version."""
+
+class CartStore(ABC):
+    """Persistence backend for carts.
+
+    Carts returned by get() may be copies, so callers must save() a cart
+    after changing it.
+    """
+
+    # Stores whose calls block on I/O set this to the number of threads
+    # CartService should run them on; 0 means call them directly.
+    threads = 0
+
+    def __init__(self, max_age: float = settings.MAX_CONVERSATION_AGE):
+        self.max_age = timedelta(seconds=max_age)
+
+    def expires_at(self, cart: Cart) -> datetime:
+        return cart.updated_at + self.max_age
+
+    @abstractmethod
+    def get(self, conversation_id: str) -> Optional[Cart]:
+        """Return the stored cart, or None."""
+
+    @abstractmethod
+    def save(self, cart: Cart, expected_version: Optional[int] = None) -> None:
+        """Insert or replace a cart.
+
+        With expected_version, the cart is only written if the stored one
+        is still at that version (a missing cart counts as version 0);
+        otherwise CartVersionConflict is raised.
+        """
+
+    def save_many(self, carts: Iterable[Cart]) -> None:
+        """Insert or replace several carts."""
+        for cart in carts:
+            self.save(cart)
+
+    @abstractmethod
+    def delete(self, conversation_id: str) -> bool:
+        """Delete a cart; returns whether it existed."""
+
+    @abstractmethod
+    def evict_expired(self, now: datetime, limit: int) -> int:
+        """Delete up to limit carts whose expiry is at or before now."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Return the number of stored carts."""
+
+    def cached_count(self) -> int:
+        """Return the number of stored carts without blocking.
+
+        Stores whose count() has to scan may return a recent value instead.
+        """
+        return self.count()
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Delete every cart."""
+
+    def stats(self) -> Dict[str, Any]:
+        """Return backend-specific counters."""
+        return {}
+
+    def recover(self) -> int:
+        """Load carts persisted by an earlier run; returns how many."""
+        return 0
+
+    def close(self) -> None:
+        """Release any resources held by the backend."""
+
+class MemoryCartStore(CartStore):
+    """Per-process store of carts split across shards.
+
+    Idle carts are held as compact CartRecords, so they cost a few small
+    tuples rather than a tree of pydantic models. The hot_carts most
+    recently used carts are kept as live Cart models, which get()
+    returns as-is; a cart is compacted when it leaves that set, and
+    rebuilt from its record when it is used again. Each shard has its own dict and expiry heap, so no
+    single structure grows with the total number of carts, and eviction
+    walks the shards in turn.
+
+    With max_lifetime set, carts with generated IDs are also grouped by
+    the creation time embedded in the ID, in buckets lifetime_bucket
+    seconds wide. Once a whole bucket is older than max_lifetime its
+    carts are evicted however recently they changed, without a heap
+    entry per cart; the lifetime is therefore enforced to within one
+    bucket.
+
+    With a journal, every change is also queued to the CartJournal and
+    recover() rebuilds the store from disk, so carts survive restarts.
+    Journal entries are records, so with a journal every save() compacts
+    the cart straight away.
+    """
+
+    def __init__(
+        self,
+        shards: int = settings.STORAGE_SHARDS,
+        max_age: float = settings.MAX_CONVERSATION_AGE,
+        max_lifetime: float = settings.STORAGE_MAX_LIFETIME,
+        lifetime_bucket: float = settings.STORAGE_LIFETIME_BUCKET,
+        journal: Optional[CartJournal] = None,
+        hot_carts: int = settings.STORAGE_HOT_CARTS
+    ):
+        super().__init__(max_age)
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        if lifetime_bucket <= 0:
+            raise ValueError("lifetime_bucket must be positive")
+        # None stands for "the live model in the hot set is current".
+        self._shards: List[Dict[str, Optional[CartRecord]]] = [{} for _ in range(shards)]
+        self._expiry: List[ExpiryQueue] = [ExpiryQueue() for _ in range(shards)]
+        self._next_evict_shard = 0
+        self.max_lifetime = max_lifetime
+        self.lifetime_bucket = lifetime_bucket
+        self._buckets: Dict[int, Set[str]] = {}
+        self.lifetime_evicted = 0
+        self.journal = journal
+        self.hot_carts = hot_carts
+        self._hot: "OrderedDict[str, Cart]" = OrderedDict()
+        self.hot_hits = 0
+        self.hot_misses = 0
+
+    def _shard(self, conversation_id: str) -> int:
+        return hash(conversation_id) % len(self._shards)
+
+    def get(self, conversation_id: str) -> Optional[Cart]:
+        cart = self._hot.get(conversation_id)
+        if cart is not None:
+            self._hot.move_to_end(conversation_id)
+            self.hot_hits += 1
+            return cart
+        record = self._shards[self._shard(conversation_id)].get(conversation_id)
+        if record is None:
+            return None
+        self.hot_misses += 1
+        cart = from_record(record)
+        self._keep_hot(cart)
+        return cart
+
+    def _keep_hot(self, cart: Cart) -> None:
+        """Make cart the most recently used live model, demoting the oldest."""
+        if self.hot_carts <= 0:
+            return
+        self._hot[cart.conversation_id] = cart
+        self._hot.move_to_end(cart.conversation_id)
+        if len(self._hot) > self.hot_carts:
+            conversation_id, idle = self._hot.popitem(last=False)
+            carts = self._shards[self._shard(conversation_id)]
+            if conversation_id in carts and carts[conversation_id] is None:
+                carts[conversation_id] = to_record(idle)
+
+    def _bucket(self, conversation_id: str) -> Optional[int]:
+        if not self.max_lifetime:
+            return None
+        return conversation_bucket(conversation_id, self.lifetime_bucket)
+
+    def save(self, cart: Cart, expected_version: Optional[int] = None) -> None:
+        # expected_version is not checked: changes all run on the event
+        # loop, and a hot cart is changed in place before it is saved.
+        shard = self._shard(cart.conversation_id)
+        carts = self._shards[shard]
+        if cart.conversation_id not in carts:
+            bucket = self._bucket(cart.conversation_id)
+            if bucket is not None:
+                self._buckets.setdefault(bucket, set()).add(cart.conversation_id)
+        if self.journal is not None or self.hot_carts <= 0:
+            record = carts[cart.conversation_id] = to_record(cart)
+            self._log(PUT, record)
+        else:
+            carts[cart.conversation_id] = None
+        self._keep_hot(cart)
+        self._expiry[shard].schedule(cart.conversation_id, self.expires_at(cart))
+
+    def _log(self, *entry) -> None:
+        if self.journal is not None:
+            self.journal.append(entry)
+            if self.journal.snapshot_due:
+                self.snapshot()
+
+    def _remove(self, conversation_id: str) -> bool:
+        shard = self._shard(conversation_id)
+        self._expiry[shard].discard(conversation_id)
+        self._hot.pop(conversation_id, None)
+        carts = self._shards[shard]
+        removed = conversation_id in carts
+        if removed:
+            del carts[conversation_id]
+            self._log(DELETE, conversation_id)
+        return removed
+
+    def _forget_bucket(self, conversation_id: str) -> None:
+        bucket = self._bucket(conversation_id)
+        if bucket is not None and bucket in self._buckets:
+            self._buckets[bucket].discard(conversation_id)
+
+    def delete(self, conversation_id: str) -> bool:
+        self._forget_bucket(conversation_id)
+        return self._remove(conversation_id)
+
+    def _evict_past_lifetime(self, now: datetime, limit: int) -> int:
+        """Drop carts from buckets that ended more than max_lifetime ago."""
+        bucket_ms = self.lifetime_bucket * 1000
+        cutoff_ms = (now - _EPOCH) / _MILLISECOND - self.max_lifetime * 1000
+        evicted = 0
+        while self._buckets and evicted < limit:
+            oldest = min(self._buckets)
+            if (oldest + 1) * bucket_ms > cutoff_ms:
+                break
+            conversation_ids = self._buckets[oldest]
+            while conversation_ids and evicted < limit:
+                if self._remove(conversation_ids.pop()):
+                    evicted += 1
+            if not conversation_ids:
+                del self._buckets[oldest]
+        self.lifetime_evicted += evicted
+        return evicted
+
+    def evict_expired(self, now: datetime, limit: int) -> int:
+        evicted = self._evict_past_lifetime(now, limit) if self.max_lifetime else 0
+        for _ in range(len(self._shards)):
+            if evicted >= limit:
+                break
+            shard = self._next_evict_shard
+            self._next_evict_shard = (shard + 1) % len(self._shards)
+            for conversation_id in self._expiry[shard].pop_due(now, limit - evicted):
+                self._shards[shard].pop(conversation_id, None)
+                self._hot.pop(conversation_id, None)
+                self._forget_bucket(conversation_id)
+                self._log(DELETE, conversation_id)
+                evicted += 1
+        return evicted
+
+    def count(self) -> int:
+        return sum(len(carts) for carts in self._shards)
+
+    def clear(self) -> None:
+        for carts in self._shards:
+            carts.clear()
+        self._expiry = [ExpiryQueue() for _ in self._shards]
+        self._buckets.clear()
+        self._hot.clear()
+        self._log(CLEAR)
+
+    def snapshot(self, wait: bool = False) -> None:
+        """Queue a snapshot of every cart so the journal can be truncated.
+
+        Only the shard dicts are handed over. Copying them, pickling and
+        writing all happen on the journal's snapshot thread.
+        """
+        if self.journal is not None:
+            self.journal.snapshot(self._shards, wait)
+
+    def recover(self) -> int:
+        """Load the journal's carts and start journaling; returns the cart count.
+
+        Expiry heaps are built in one pass rather than cart by cart. If
+        any journal entries were replayed, a snapshot is queued straight
+        away so the next start only reads the snapshot. Once journaling
+        has started, the store is already loaded and this does nothing.
+        """
+        if self.journal is None:
+            return 0
+        if self.journal.running:
+            return self.count()
+        records = self.journal.recover()
+        deadlines: List[list] = [[] for _ in self._shards]
+        for conversation_id, record in records.items():
+            shard = self._shard(conversation_id)
+            self._shards[shard][conversation_id] = record
+            deadlines[shard].append((conversation_id, record_updated_at(record) + self.max_age))
+            bucket = self._bucket(conversation_id)
+            if bucket is not None:
+                self._buckets.setdefault(bucket, set()).add(conversation_id)
+        for queue, shard_deadlines in zip(self._expiry, deadlines):
+            queue.schedule_many(shard_deadlines)
+        count = len(records)
+        self.journal.start()
+        if self.journal.replayed:
+            self.snapshot()
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "shards": len(self._shards),
+            "expiry_scheduled": sum(len(queue) for queue in self._expiry),
+            "expiry_stale_skipped": sum(queue.stale_skipped for queue in self._expiry),
+            "lifetime_buckets": len(self._buckets),
+            "lifetime_evicted": self.lifetime_evicted,
+            "hot_carts": len(self._hot),
+            "hot_hits": self.hot_hits,
+            "hot_misses": self.hot_misses,
+            "journal": self.journal.stats() if self.journal is not None else None
+        }
+
+    def close(self) -> None:
+        """Snapshot and flush the journal so the next start replays nothing."""
+        if self.journal is not None and self.journal.running:
+            self.snapshot(wait=True)
+            self.journal.close()
+
+def create_cart_store(storage_type: str = settings.STORAGE_TYPE) -> CartStore:
+    """Build the cart store selected by STORAGE_TYPE."""
+    if storage_type == "memory":
+        if not settings.STORAGE_JOURNAL_ENABLED:
+            return MemoryCartStore()
+        # Recovered by the app's startup, not here at import time.
+        return MemoryCartStore(journal=CartJournal())
+    if storage_type == "sqlite":
+        from .sqlite_cart_store import SQLiteCartStore
+        return SQLiteCartStore(
+            settings.STORAGE_SQLITE_PATH,
+            pool_size=settings.STORAGE_SQLITE_POOL_SIZE
+        )
+    raise ValueError(f"Unknown storage type: {storage_type}")
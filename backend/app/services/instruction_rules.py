@@ -0,0 +1,164 @@
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Match, Optional, Pattern, Tuple
+import yaml
+from app.core.config import settings
+
+_PROJECT_ROOT = Path(__file__).parent.parent.parent
+_WORD = re.compile(r"[a-z0-9'’-]+")
+_CLAUSE_BREAK = re.compile(r"[,;:.!?()]")
+
+def _blank(match: Match[str]) -> str:
+    """Consume a match while keeping later match positions unchanged."""
+    return " " * len(match.group(0))
+
+def _alternation(phrases) -> str:
+    """Regex alternation of phrases, longest first so longer ones win."""
+    return "|".join(re.escape(p) for p in sorted(set(phrases), key=len, reverse=True))
+
+class InstructionRuleMatcher:
+    """Parse common instructions with precompiled phrase tables.
+
+    Produces the same spice_level/allergies/preferences/special_requests
+    structure as the LLM prompt. Confidence is the share of meaningful
+    words covered by a rule; below min_confidence the caller should fall
+    back to the model.
+
+    Allergy and spice matches are only trusted in plain statements: one
+    preceded by a negation in the same clause ("not allergic to nuts",
+    "don't make it spicy"), or a spice word inside a compound such as
+    "hot sauce", gives confidence 0 so the model decides. So does text
+    naming two different spice levels ("spicy but not too spicy").
+    """
+
+    def __init__(self, rules: Dict[str, Any], min_confidence: float = settings.AI_RULES_MIN_CONFIDENCE):
+        self.min_confidence = min_confidence
+        self.hits = 0
+        self.misses = 0
+
+        spice = {
+            phrase: level
+            for level, phrases in (rules.get("spice_levels") or {}).items()
+            for phrase in phrases
+        }
+        self._spice_levels = spice
+        self._spice = re.compile(rf"\b({_alternation(spice)})\b") if spice else None
+
+        allergens = {
+            word: name
+            for name, words in (rules.get("allergens") or {}).items()
+            for word in words
+        }
+        self._allergens = allergens
+        allergen_group = f"(?P<allergen>{_alternation(allergens)})"
+        self._allergy: List[Pattern[str]] = [
+            re.compile(r"\b" + re.escape(p).replace(r"\{allergen\}", allergen_group) + r"\b")
+            for p in rules.get("allergy_patterns") or []
+        ] if allergens else []
+
+        self._preferences: List[Tuple[Pattern[str], str]] = [
+            (
+                re.compile(r"\b" + re.escape(p).replace(r"\{item\}", r"(?P<item>[a-z]+)") + r"\b"),
+                template
+            )
+            for p, template in (rules.get("preference_patterns") or {}).items()
+        ]
+
+        requests = rules.get("special_requests") or []
+        self._requests = re.compile(rf"\b({_alternation(requests)})\b") if requests else None
+        self._fillers = frozenset(rules.get("filler_words") or [])
+        self._negations = frozenset(rules.get("negation_words") or [])
+        compounds = rules.get("spice_compounds") or []
+        self._compounds = re.compile(rf"\b({_alternation(compounds)})\b") if compounds else None
+
+    def match(self, instructions: str) -> Optional[Dict[str, Any]]:
+        """Return a parsed result for normalized text, or None if not confident."""
+        result, confidence = self.parse(instructions)
+        if confidence >= self.min_confidence:
+            self.hits += 1
+            return result
+        self.misses += 1
+        return None
+
+    def parse(self, text: str) -> Tuple[Dict[str, Any], float]:
+        """Parse text and return the result with its confidence in [0, 1]."""
+        result: Dict[str, Any] = {
+            "spice_level": None,
+            "allergies": [],
+            "preferences": [],
+            "special_requests": []
+        }
+        remaining = text
+        # Start offsets of allergy and spice matches, checked for negation
+        # once everything else has been consumed.
+        guarded: List[int] = []
+
+        def allergy(m: Match[str]) -> str:
+            guarded.append(m.start())
+            return self._collect(result["allergies"], self._allergens[m.group("allergen")], m)
+
+        for pattern in self._allergy:
+            remaining = pattern.sub(allergy, remaining)
+        if self._requests is not None:
+            remaining = self._requests.sub(
+                lambda m: self._collect(result["special_requests"], m.group(1), m),
+                remaining
+            )
+        if self._spice is not None:
+            compounds = [m.span() for m in self._compounds.finditer(text)] if self._compounds else []
+            for m in self._spice.finditer(remaining):
+                if any(start < m.end() and m.start() < end for start, end in compounds):
+                    return result, 0.0
+                level = self._spice_levels[m.group(1)]
+                if result["spice_level"] not in (None, level):
+                    return result, 0.0
+                guarded.append(m.start())
+                result["spice_level"] = level
+            remaining = self._spice.sub(_blank, remaining)
+        found = []
+        for pattern, template in self._preferences:
+            found.extend(
+                (m.start(), template.format(item=m.group("item")))
+                for m in pattern.finditer(remaining)
+            )
+            remaining = pattern.sub(_blank, remaining)
+        for _, preference in sorted(found):
+            self._collect(result["preferences"], preference)
+
+        for start in guarded:
+            clause = _CLAUSE_BREAK.split(remaining[:start])[-1]
+            if any(self._is_negation(w) for w in _WORD.findall(clause)):
+                return result, 0.0
+
+        words = [w for w in _WORD.findall(text) if w not in self._fillers]
+        if not words:
+            return result, 0.0
+        unmatched = [w for w in _WORD.findall(remaining) if w not in self._fillers]
+        return result, 1 - len(unmatched) / len(words)
+
+    def _is_negation(self, word: str) -> bool:
+        # Contractions ("don't", "isn't", "wouldn't") are caught by suffix.
+        return word in self._negations or word.endswith(("n't", "n’t"))
+
+    @staticmethod
+    def _collect(values: List[str], value: str, match: Optional[Match[str]] = None) -> str:
+        if value not in values:
+            values.append(value)
+        return _blank(match) if match is not None else ""
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the hit rate."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+def load_instruction_rules(path: str = settings.AI_RULES_FILE) -> InstructionRuleMatcher:
+    """Load the phrase tables from a YAML file, relative to the project root."""
+    rules_path = Path(path)
+    if not rules_path.is_absolute():
+        rules_path = _PROJECT_ROOT / rules_path
+    with open(rules_path) as f:
+        return InstructionRuleMatcher(yaml.safe_load(f) or {})
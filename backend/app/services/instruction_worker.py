@@ -0,0 +1,228 @@
+import asyncio
+import logging
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from app.core.config import settings
+from app.models.cart_models import InstructionAnalysis, InstructionStatus
+from app.services.ai_service import AIService, ai_service
+from app.services.cart_service import CartService, cart_service
+
+logger = logging.getLogger(__name__)
+
+QUEUE_POLICIES = ("reject", "drop_oldest", "block")
+
+class InstructionJob(NamedTuple):
+    conversation_id: str
+    items: Tuple[Tuple[str, str], ...]  # (item_id, instructions) pairs
+
+class InstructionWorkerPool:
+    """Analyze item instructions in the background with a fixed set of workers.
+
+    A job covers one or more items of a single cart and goes through a
+    bounded queue. When it is full, the configured
+    policy decides what happens: "reject" fails the new job,
+    "drop_oldest" fails the oldest queued job to make room, and "block"
+    waits up to block_timeout seconds for space before failing the new job.
+    """
+
+    def __init__(
+        self,
+        ai: AIService,
+        carts: CartService,
+        workers: int = settings.AI_WORKER_COUNT,
+        max_queue: int = settings.AI_WORKER_QUEUE_SIZE,
+        policy: str = settings.AI_WORKER_QUEUE_POLICY,
+        block_timeout: float = settings.AI_WORKER_QUEUE_TIMEOUT
+    ):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.ai = ai
+        self.carts = carts
+        self.workers = workers
+        self.max_queue = max_queue
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self._queue: Optional["asyncio.Queue[InstructionJob]"] = None
+        self._tasks: List["asyncio.Task[None]"] = []
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """Create the job queue and spawn the workers."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"instruction-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        """Stop the workers and fail any jobs still waiting in the queue."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        while self._queue is not None and not self._queue.empty():
+            await self._fail(self._take_queued())
+        self._queue = None
+
+    async def submit(self, conversation_id: str, item_id: str, instructions: str) -> bool:
+        """Queue an item's instructions for analysis.
+
+        Returns False if the job could not be queued, in which case the
+        item has already been marked as failed.
+        """
+        return await self.submit_many(conversation_id, [(item_id, instructions)])
+
+    async def submit_many(
+        self,
+        conversation_id: str,
+        items: Sequence[Tuple[str, str]]
+    ) -> bool:
+        """Queue several items of one cart as a single job.
+
+        The items' instructions are analyzed together when the job runs.
+        """
+        if not items:
+            return True
+        job = InstructionJob(conversation_id, tuple(items))
+        if not self.running:
+            self.rejected += len(job.items)
+            await self._fail(job)
+            return False
+
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            if not await self._handle_full_queue(job):
+                self.rejected += len(job.items)
+                await self._fail(job)
+                return False
+
+        self.submitted += len(job.items)
+        return True
+
+    async def _handle_full_queue(self, job: InstructionJob) -> bool:
+        if self.policy == "drop_oldest":
+            oldest = self._take_queued()
+            self.dropped += len(oldest.items)
+            await self._fail(oldest)
+            self._queue.put_nowait(job)
+            return True
+
+        if self.policy == "block":
+            try:
+                await asyncio.wait_for(self._queue.put(job), self.block_timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+        return False
+
+    def _take_queued(self) -> InstructionJob:
+        """Remove the oldest queued job without handing it to a worker."""
+        job = self._queue.get_nowait()
+        self._queue.task_done()
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            except Exception:
+                logger.exception("Instruction job for cart %s failed", job.conversation_id)
+            finally:
+                self._queue.task_done()
+
+    async def _analyze(self, instructions: str) -> InstructionAnalysis:
+        result = await self.ai.process_cart_instructions(instructions)
+        return InstructionAnalysis.model_validate(result)
+
+    async def _process(self, job: InstructionJob) -> None:
+        try:
+            results = await asyncio.gather(
+                *(self._analyze(instructions) for _, instructions in job.items),
+                return_exceptions=True
+            )
+        except asyncio.CancelledError:
+            await self._fail(job)
+            raise
+
+        async with self.carts.lock(job.conversation_id):
+            for (item_id, instructions), result in zip(job.items, results):
+                if isinstance(result, BaseException):
+                    logger.warning(
+                        "Instruction analysis failed for item %s: %s", item_id, result
+                    )
+                    self.failed += 1
+                    await self._store(
+                        job.conversation_id, item_id, instructions, InstructionStatus.FAILED
+                    )
+                    continue
+
+                if await self._store(
+                    job.conversation_id, item_id, instructions, InstructionStatus.DONE, result
+                ):
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    async def _store(
+        self,
+        conversation_id: str,
+        item_id: str,
+        instructions: str,
+        status: InstructionStatus,
+        analysis: Optional[InstructionAnalysis] = None
+    ) -> bool:
+        """Write an item's analysis outcome to its cart off the event loop.
+
+        Returns False if the store could not save it (a persistent version
+        conflict or a database error), which is logged rather than raised
+        so neither a worker nor the request that queued the job fails.
+        """
+        try:
+            await self.carts.run(
+                self.carts.apply_instruction_analysis,
+                conversation_id,
+                item_id,
+                instructions,
+                status,
+                analysis
+            )
+        except Exception:
+            logger.exception("Could not store instruction analysis for item %s", item_id)
+            return False
+        return True
+
+    async def _fail(self, job: InstructionJob) -> None:
+        for item_id, instructions in job.items:
+            await self._fail_item(job.conversation_id, item_id, instructions)
+
+    async def _fail_item(self, conversation_id: str, item_id: str, instructions: str) -> None:
+        self.failed += 1
+        await self._store(conversation_id, item_id, instructions, InstructionStatus.FAILED)
+
+    def stats(self) -> Dict[str, int]:
+        """Return queue and job counters."""
+        return {
+            "workers": len(self._tasks),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.max_queue,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "dropped": self.dropped
+        }
+
+instruction_workers = InstructionWorkerPool(ai_service, cart_service)
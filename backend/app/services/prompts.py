@@ -0,0 +1,126 @@
+import json
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple, Union
+from app.core.config import settings
+from app.models.cart_models import Cart, CartItem
+
+# Rough characters per token for English text and compact JSON; close
+# enough to keep prompts inside their budgets without a tokenizer.
+CHARS_PER_TOKEN = 4
+
+INSTRUCTION_FIELDS = (
+    '"spice_level":"mild|medium|hot"|null,"allergies":[string],'
+    '"preferences":[string],"special_requests":[string]'
+)
+
+class Prompt(NamedTuple):
+    """A rendered prompt and the generation limits for its task."""
+    task: str
+    text: str
+    num_predict: int
+    json_mode: bool
+
+def estimate_tokens(text: str) -> int:
+    """Estimate how many tokens the model will see for text."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def compact_json(value: Any) -> str:
+    """Serialize without indentation or spaces after separators."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, marking the cut with an ellipsis."""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return text[:max(limit - 1, 0)] + "…"
+
+def compact_item(item: Union[CartItem, Dict[str, Any]]) -> Dict[str, Any]:
+    """Keep only the item fields the model needs.
+
+    Timestamps, analysis status and previous analysis results are left
+    out; empty fields are omitted entirely.
+    """
+    if isinstance(item, CartItem):
+        item = item.model_dump(include={"item_id", "quantity", "special_instructions", "modifiers"})
+
+    entry: Dict[str, Any] = {"id": item["item_id"], "qty": item["quantity"]}
+    if item.get("special_instructions"):
+        entry["note"] = item["special_instructions"]
+    if item.get("modifiers"):
+        entry["mods"] = {m["id"]: m["quantity"] for m in item["modifiers"]}
+    return entry
+
+def fit_items(items: Sequence[Dict[str, Any]], budget: int) -> Tuple[List[Dict[str, Any]], int]:
+    """Take items in order until the next one would exceed budget tokens.
+
+    Returns the items that fit and how many were left out.
+    """
+    kept: List[Dict[str, Any]] = []
+    used = 0
+    for item in items:
+        cost = estimate_tokens(compact_json(item)) + 1
+        if used + cost > budget:
+            break
+        kept.append(item)
+        used += cost
+    return kept, len(items) - len(kept)
+
+def _output_limit(task_limit: int) -> int:
+    return min(task_limit, settings.OLLAMA_MAX_TOKENS)
+
+def _input_budget(num_predict: int) -> int:
+    """Tokens left for cart data once the template and output are reserved."""
+    reserve = num_predict + settings.AI_PROMPT_TEMPLATE_TOKENS
+    return max(min(settings.AI_PROMPT_CART_TOKENS, settings.OLLAMA_NUM_CTX - reserve), 0)
+
+def _cart_json(items: Sequence[Dict[str, Any]], budget: int) -> str:
+    kept, omitted = fit_items(items, budget)
+    payload: Dict[str, Any] = {"items": kept}
+    if omitted:
+        payload["more_items"] = omitted
+    return compact_json(payload)
+
+def instructions_prompt(instructions: str) -> Prompt:
+    num_predict = _output_limit(settings.AI_PROMPT_INSTRUCTION_OUTPUT_TOKENS)
+    text = (
+        "Extract key information from this food order instruction.\n"
+        f"Instruction: {truncate_text(instructions, _input_budget(num_predict))}\n"
+        f"Reply with JSON only: {{{INSTRUCTION_FIELDS}}}"
+    )
+    return Prompt("instructions", text, num_predict, True)
+
+def instruction_batch_prompt(batch: Sequence[str]) -> Prompt:
+    num_predict = _output_limit(settings.AI_PROMPT_INSTRUCTION_OUTPUT_TOKENS * len(batch))
+    per_instruction = _input_budget(num_predict) // max(len(batch), 1)
+    numbered = "\n".join(
+        f"{index}: {truncate_text(text, per_instruction)}" for index, text in enumerate(batch)
+    )
+    text = (
+        "Extract key information from each numbered food order instruction.\n"
+        f"{numbered}\n"
+        f'Reply with JSON only: {{"results":[{{"index":int,{INSTRUCTION_FIELDS}}}]}}'
+    )
+    return Prompt("instruction_batch", text, num_predict, True)
+
+def suggest_prompt(cart_items: Sequence[Dict[str, Any]], preferences: Sequence[str]) -> Prompt:
+    num_predict = _output_limit(settings.AI_PROMPT_SUGGEST_OUTPUT_TOKENS)
+    budget = _input_budget(num_predict)
+    prefs = truncate_text(compact_json(list(preferences)), budget // 4)
+    cart = _cart_json([compact_item(item) for item in cart_items], budget - estimate_tokens(prefs))
+    text = (
+        "Suggest menu items that complement this food order.\n"
+        f"Cart: {cart}\n"
+        f"Preferences: {prefs}\n"
+        'Reply with JSON only: {"items":[item_id]}'
+    )
+    return Prompt("suggest", text, num_predict, True)
+
+def summary_prompt(cart: Cart) -> Prompt:
+    num_predict = _output_limit(settings.AI_PROMPT_SUMMARY_OUTPUT_TOKENS)
+    cart_json = _cart_json([compact_item(item) for item in cart.items], _input_budget(num_predict))
+    text = (
+        "Summarize this food order in a few plain sentences: total items, "
+        "special instructions, notable combinations and dietary considerations.\n"
+        f"Order: {cart_json}"
+    )
+    return Prompt("summary", text, num_predict, False)
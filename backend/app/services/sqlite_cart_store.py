@@ -0,0 +1,295 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from ..core.config import settings
+from ..models.cart_models import Cart
+from .cart_store import CartStore, CartVersionConflict
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS carts (
+    conversation_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS carts_expires_at ON carts (expires_at);
+"""
+# Databases created before the version column existed.
+_ADD_VERSION = """
+ALTER TABLE carts ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+UPDATE carts SET version = json_extract(data, '$.version');
+"""
+
+# Statements are kept as constants so each connection's statement cache
+# reuses the compiled form.
+_SELECT = "SELECT data FROM carts WHERE conversation_id = ?"
+_UPSERT = (
+    "INSERT INTO carts (conversation_id, data, expires_at, version) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (conversation_id) DO UPDATE SET "
+    "data = excluded.data, expires_at = excluded.expires_at, version = excluded.version"
+)
+_UPDATE_IF_VERSION = (
+    "UPDATE carts SET data = ?, expires_at = ?, version = ? "
+    "WHERE conversation_id = ? AND version = ?"
+)
+_INSERT_IF_MISSING = (
+    "INSERT INTO carts (conversation_id, data, expires_at, version) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (conversation_id) DO NOTHING"
+)
+_DELETE = "DELETE FROM carts WHERE conversation_id = ?"
+_EVICT = (
+    "DELETE FROM carts WHERE conversation_id IN ("
+    "SELECT conversation_id FROM carts WHERE expires_at <= ? "
+    "ORDER BY expires_at LIMIT ?)"
+)
+_COUNT = "SELECT COUNT(*) FROM carts"
+_CLEAR = "DELETE FROM carts"
+
+# Most writes a single transaction commits.
+_MAX_BATCH = 256
+
+# Seconds between refreshes of the cart count reported by stats.
+_COUNT_INTERVAL = 5.0
+
+Write = Callable[[sqlite3.Connection], Any]
+
+_STOP = object()
+
+def _timestamp(value: datetime) -> float:
+    return (value - _EPOCH).total_seconds()
+
+class SQLiteCartStore(CartStore):
+    """Cart store in a SQLite database in WAL mode.
+
+    The database file can be shared by several uvicorn workers on one
+    host. WAL lets readers proceed while another process writes, and
+    synchronous=NORMAL avoids an fsync on every commit.
+
+    Reads use a pool of connections on the calling thread. Writes are
+    queued to a writer thread with its own connection, which commits
+    everything pending in one transaction, so concurrent requests share
+    a commit and this process never contends with itself for the write
+    lock. Every call blocks, so CartService runs them on pool_size
+    threads rather than on the event loop.
+
+    Saves with an expected_version only update the row if its version
+    column still matches, so two workers cannot both write the same
+    version of a cart.
+
+    COUNT(*) scans the table, so the writer thread also recounts the
+    carts every few seconds and cached_count() returns that figure.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        pool_size: int = settings.STORAGE_SQLITE_POOL_SIZE,
+        max_age: float = settings.MAX_CONVERSATION_AGE
+    ):
+        super().__init__(max_age)
+        self.path = path
+        self.threads = pool_size
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(carts)")}
+            if "version" not in columns:
+                conn.executescript(_ADD_VERSION)
+            self._count = conn.execute(_COUNT).fetchone()[0]
+        self._counted_at = time.monotonic()
+
+        self.batches = 0
+        self.writes = 0
+        self.conflicts = 0
+        self._writes: "queue.Queue[Any]" = queue.Queue()
+        self._writer = threading.Thread(
+            target=self._run,
+            args=(self._connect(),),
+            name="sqlite-cart-writer",
+            daemon=True
+        )
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=5.0,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=64
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def _write(self, write: Write) -> Any:
+        """Queue a write for the writer thread and wait for its result."""
+        future: "Future[Any]" = Future()
+        self._writes.put((write, future))
+        return future.result()
+
+    def _run(self, conn: sqlite3.Connection) -> None:
+        try:
+            while True:
+                pending: List[Tuple[Write, Future]] = []
+                try:
+                    item = self._writes.get(timeout=_COUNT_INTERVAL)
+                except queue.Empty:
+                    self._recount(conn)
+                    continue
+                while item is not _STOP:
+                    pending.append(item)
+                    if len(pending) >= _MAX_BATCH:
+                        break
+                    try:
+                        item = self._writes.get_nowait()
+                    except queue.Empty:
+                        break
+                self._commit(conn, pending)
+                if item is _STOP:
+                    return
+                if time.monotonic() - self._counted_at >= _COUNT_INTERVAL:
+                    self._recount(conn)
+        finally:
+            conn.close()
+
+    def _recount(self, conn: sqlite3.Connection) -> None:
+        try:
+            self._count = conn.execute(_COUNT).fetchone()[0]
+        except sqlite3.Error:
+            logger.exception("Could not count carts")
+        self._counted_at = time.monotonic()
+
+    def _commit(self, conn: sqlite3.Connection, pending: List[Tuple[Write, Future]]) -> None:
+        if not pending:
+            return
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for write, future in pending:
+                # A failed write (a version conflict) changes nothing, so
+                # the rest of the batch still commits.
+                try:
+                    outcomes.append((future, write(conn), None))
+                except (CartVersionConflict, sqlite3.IntegrityError) as e:
+                    outcomes.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            # Anything else a write raises fails the whole batch, but the
+            # writer must survive it: callers are blocked on these futures.
+            try:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                logger.exception("Could not roll back cart writes")
+            logger.exception("Could not commit %d cart writes", len(pending))
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.writes += len(pending)
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def _row(self, cart: Cart):
+        return (
+            cart.conversation_id,
+            cart.model_dump_json(),
+            _timestamp(self.expires_at(cart)),
+            cart.version
+        )
+
+    def get(self, conversation_id: str) -> Optional[Cart]:
+        with self._connection() as conn:
+            row = conn.execute(_SELECT, (conversation_id,)).fetchone()
+        if row is None:
+            return None
+        return Cart(**json.loads(row[0]))
+
+    def save(self, cart: Cart, expected_version: Optional[int] = None) -> None:
+        row = self._row(cart)
+        if expected_version is None:
+            self._write(lambda conn: conn.execute(_UPSERT, row))
+            return
+
+        def save_if_version(conn: sqlite3.Connection) -> None:
+            conversation_id, data, expires_at, version = row
+            if conn.execute(
+                _UPDATE_IF_VERSION,
+                (data, expires_at, version, conversation_id, expected_version)
+            ).rowcount:
+                return
+            if expected_version == 0 and conn.execute(_INSERT_IF_MISSING, row).rowcount:
+                return
+            self.conflicts += 1
+            raise CartVersionConflict(
+                f"Cart {conversation_id} was changed by another request"
+            )
+
+        self._write(save_if_version)
+
+    def save_many(self, carts: Iterable[Cart]) -> None:
+        """Write several carts in a single transaction."""
+        rows = [self._row(cart) for cart in carts]
+        self._write(lambda conn: conn.executemany(_UPSERT, rows))
+
+    def delete(self, conversation_id: str) -> bool:
+        return self._write(lambda conn: conn.execute(_DELETE, (conversation_id,)).rowcount > 0)
+
+    def evict_expired(self, now: datetime, limit: int) -> int:
+        return self._write(lambda conn: conn.execute(_EVICT, (_timestamp(now), limit)).rowcount)
+
+    def count(self) -> int:
+        with self._connection() as conn:
+            return conn.execute(_COUNT).fetchone()[0]
+
+    def cached_count(self) -> int:
+        return self._count
+
+    def clear(self) -> None:
+        self._write(lambda conn: conn.execute(_CLEAR))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "queued_writes": self._writes.qsize(),
+            "write_batches": self.batches,
+            "writes": self.writes,
+            "version_conflicts": self.conflicts
+        }
+
+    def close(self) -> None:
+        if self._writer.is_alive():
+            self._writes.put(_STOP)
+            self._writer.join()
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
@@ -0,0 +1,126 @@
+import asyncio
+import copy
+import logging
+import time
+from typing import Any, Dict, Optional
+from app.core.config import settings
+from app.models.cart_models import Cart, CartItem
+from app.services.ai_service import AIService, ai_service, normalize_instructions
+from app.services.cart_service import CartService, cart_service
+
+logger = logging.getLogger(__name__)
+
+# Sent straight to the model at startup. The rule matcher would answer
+# these phrasings without a model call, so they are not sent through
+# process_cart_instructions.
+WARMUP_INSTRUCTIONS = (
+    "extra spicy",
+    "no onions",
+    "gluten free please",
+    "sauce on the side"
+)
+
+def _sample_cart() -> Cart:
+    return Cart(
+        conversation_id="warmup",
+        items=[
+            CartItem(item_id="warmup-1", quantity=2, special_instructions=WARMUP_INSTRUCTIONS[0]),
+            CartItem(item_id="warmup-2", quantity=1, modifiers=[{"id": "warmup-mod", "quantity": 1}])
+        ]
+    )
+
+class ModelWarmup:
+    """Load the model and exercise the hot paths before taking traffic.
+
+    Warm-up runs in the background after startup: it asks Ollama to load
+    the model with the configured keep-alive, sends a summary and a few
+    instruction prompts to the model (bypassing the rule matcher, and
+    priming the instruction cache and the per-task latency trackers), and
+    serializes a sample cart once. ``ready`` turns true when warm-up finishes. If
+    Ollama is still unavailable after ``attempts`` tries the instance
+    becomes ready anyway, since carts work without AI, and ``warm`` stays
+    false.
+    """
+
+    def __init__(
+        self,
+        ai: AIService,
+        carts: CartService,
+        enabled: bool = settings.WARMUP_ENABLED,
+        load_timeout: float = settings.WARMUP_LOAD_TIMEOUT,
+        attempts: int = settings.WARMUP_ATTEMPTS,
+        retry_delay: float = settings.WARMUP_RETRY_DELAY
+    ):
+        self.ai = ai
+        self.carts = carts
+        self.enabled = enabled
+        self.load_timeout = load_timeout
+        self.attempts = max(attempts, 1)
+        self.retry_delay = retry_delay
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.ready = False
+        self.warm = False
+        self.tries = 0
+        self.seconds = 0.0
+
+    async def start(self) -> None:
+        """Start warming up in the background."""
+        if self._task is not None:
+            return
+        if not self.enabled:
+            self.ready = True
+            return
+        self.ready = False
+        self._task = asyncio.create_task(self._run(), name="model-warmup")
+
+    async def stop(self) -> None:
+        """Stop any warm-up still running and stop reporting ready."""
+        self.ready = False
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        started = time.perf_counter()
+        for attempt in range(1, self.attempts + 1):
+            self.tries = attempt
+            try:
+                await self.warm_up()
+            except Exception as e:
+                logger.warning("Model warm-up attempt %d/%d failed: %s", attempt, self.attempts, e)
+                if attempt < self.attempts:
+                    await asyncio.sleep(self.retry_delay)
+            else:
+                self.warm = True
+                break
+        self.seconds = time.perf_counter() - started
+        if self.warm:
+            logger.info("Model %s warmed up in %.1fs", self.ai.model, self.seconds)
+        else:
+            logger.error("Model %s could not be warmed up; serving without it", self.ai.model)
+        self.ready = True
+
+    async def warm_up(self) -> None:
+        """Run one full warm-up pass; raises if Ollama is unavailable."""
+        cart = _sample_cart()
+        self.carts.render_cart_response(cart)
+        await self.ai.load_model(self.load_timeout)
+        await self.ai.summarize_order(cart)
+        results = await asyncio.gather(*(
+            self.ai.analyze_instructions(instructions)
+            for instructions in WARMUP_INSTRUCTIONS
+        ))
+        for instructions, result in zip(WARMUP_INSTRUCTIONS, results):
+            key = self.ai._instructions_cache_key(normalize_instructions(instructions))
+            self.ai.instructions_cache.set(key, copy.deepcopy(result))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "warm": self.warm,
+            "tries": self.tries,
+            "seconds": self.seconds
+        }
+
+model_warmup = ModelWarmup(ai_service, cart_service)
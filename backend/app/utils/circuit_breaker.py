@@ -0,0 +1,70 @@
+import time
+from typing import Any, Callable, Dict
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """Stop calling a dependency after repeated consecutive failures.
+
+    After failure_threshold failures in a row the breaker opens and
+    rejects calls for reset_timeout seconds. It then lets a single probe
+    through: success closes it, failure reopens it. A probe that never
+    reports back is replaced after another reset_timeout.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Return whether a call may proceed, counting it as rejected if not."""
+        if self.state == CLOSED:
+            return True
+
+        now = self._clock()
+        if self.state == OPEN and now - self._opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self._probe_started = now
+            return True
+        if self.state == HALF_OPEN and now - self._probe_started >= self.reset_timeout:
+            self._probe_started = now
+            return True
+
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opened += 1
+            self.state = OPEN
+            self._opened_at = self._clock()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opened": self.opened,
+            "rejected": self.rejected
+        }
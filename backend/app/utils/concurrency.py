@@ -0,0 +1,52 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+class ConcurrencyLimiter:
+    """Cap concurrent calls, rejecting those that cannot get a slot in time.
+
+    The semaphore is bound to the loop it was created on, so it is rebuilt
+    if the limiter is used from a new loop (as with the shared HTTP
+    session).
+    """
+
+    def __init__(self, limit: int, max_wait: float):
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        self.limit = limit
+        self.max_wait = max_wait
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.active = 0
+        self.rejected = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.limit)
+            self._loop = loop
+            self.active = 0
+        return self._semaphore
+
+    async def acquire(self) -> bool:
+        """Wait up to max_wait for a slot; return False if none freed up."""
+        semaphore = self._get_semaphore()
+        if semaphore.locked():
+            if self.max_wait <= 0:
+                self.rejected += 1
+                return False
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.max_wait)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+        else:
+            await semaphore.acquire()
+        self.active += 1
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"limit": self.limit, "active": self.active, "rejected": self.rejected}
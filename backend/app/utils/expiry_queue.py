@@ -0,0 +1,54 @@
+import heapq
+from datetime import datetime
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+class ExpiryQueue:
+    """Min-heap of key deadlines supporting cheap rescheduling.
+
+    Rescheduling pushes a new heap entry instead of searching for the old
+    one; superseded entries are skipped when they reach the top. The heap
+    is rebuilt once stale entries outnumber live ones.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, Hashable]] = []
+        self._deadlines: Dict[Hashable, datetime] = {}
+        self.stale_skipped = 0
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def schedule(self, key: Hashable, deadline: datetime) -> None:
+        """Set or move the deadline for key."""
+        if self._deadlines.get(key) == deadline:
+            return
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, key))
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._compact()
+
+    def schedule_many(self, deadlines: Iterable[Tuple[Hashable, datetime]]) -> None:
+        """Set deadlines for many keys, rebuilding the heap once."""
+        self._deadlines.update(deadlines)
+        self._compact()
+
+    def discard(self, key: Hashable) -> None:
+        """Stop tracking key; its heap entries become stale."""
+        self._deadlines.pop(key, None)
+
+    def pop_due(self, now: datetime, limit: int) -> List[Hashable]:
+        """Remove and return up to limit keys whose deadline is at or before now."""
+        due = []
+        heap = self._heap
+        while heap and len(due) < limit and heap[0][0] <= now:
+            deadline, key = heapq.heappop(heap)
+            if self._deadlines.get(key) != deadline:
+                self.stale_skipped += 1
+                continue
+            del self._deadlines[key]
+            due.append(key)
+        return due
+
+    def _compact(self) -> None:
+        self._heap = [(deadline, key) for key, deadline in self._deadlines.items()]
+        heapq.heapify(self._heap)
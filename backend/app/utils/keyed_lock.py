@@ -0,0 +1,42 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Hashable, List
+
+class _Entry:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+class KeyedLock:
+    """One asyncio lock per key, created on demand and dropped when unused.
+
+    Holders of different keys never wait on each other; holders of the
+    same key are serialized in arrival order.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, _Entry] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @asynccontextmanager
+    async def acquire(self, key: Hashable) -> AsyncIterator[None]:
+        """Hold the lock for key for the duration of the block."""
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                del self._entries[key]
+
+    def locked_keys(self) -> List[Hashable]:
+        """Return the keys whose lock is currently held."""
+        return [key for key, entry in self._entries.items() if entry.lock.locked()]
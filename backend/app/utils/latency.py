@@ -0,0 +1,71 @@
+import math
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+class LatencyTracker:
+    """Rolling window of call durations with a percentile-based timeout.
+
+    Until min_samples durations have been seen the timeout is
+    max_timeout; after that it is the chosen percentile times multiplier,
+    clamped to [min_timeout, max_timeout].
+
+    Calls cut off by the timeout are recorded at the timeout, the least
+    they would have taken, so a slower model pulls the timeout up rather
+    than starving the window of samples. After fallback_after timeouts in
+    a row the timeout is max_timeout until a call completes again.
+    """
+
+    def __init__(
+        self,
+        window: int,
+        percentile: float,
+        multiplier: float,
+        min_timeout: float,
+        max_timeout: float,
+        min_samples: int,
+        fallback_after: int = 3
+    ):
+        if not 0 < percentile <= 1:
+            raise ValueError("percentile must be in (0, 1]")
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.min_samples = min_samples
+        self.fallback_after = fallback_after
+        self.consecutive_timeouts = 0
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self.consecutive_timeouts = 0
+
+    def record_timeout(self, timeout: float) -> None:
+        """Record a call abandoned after timeout seconds."""
+        self._samples.append(timeout)
+        self.consecutive_timeouts += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Return the q-quantile (nearest rank) of the window, or None if empty."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(max(math.ceil(q * len(ordered)) - 1, 0), len(ordered) - 1)]
+
+    def timeout(self) -> float:
+        if len(self._samples) < self.min_samples or self.consecutive_timeouts >= self.fallback_after:
+            return self.max_timeout
+        derived = self.quantile(self.percentile) * self.multiplier
+        return min(max(derived, self.min_timeout), self.max_timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "samples": len(self._samples),
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "timeout": self.timeout(),
+            "consecutive_timeouts": self.consecutive_timeouts
+        }
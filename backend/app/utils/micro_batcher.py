@@ -0,0 +1,87 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+class MicroBatcher:
+    """Group concurrent submissions into batches for a batch handler.
+
+    A batch is flushed when it reaches max_batch_size items or when
+    max_wait seconds have passed since its first item arrived. The handler
+    receives the items in submission order and must return one result per
+    item; a result that is an exception is raised to that item's caller
+    only. An exception raised by the handler itself fails the whole batch.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int,
+        max_wait: float
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending: List[Tuple[Any, "asyncio.Future[Any]"]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set["asyncio.Task[None]"] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: Any) -> Any:
+        """Add item to the current batch and wait for its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[Any, "asyncio.Future[Any]"]]) -> None:
+        # Callers that gave up before the flush are left out of the batch.
+        live = [(item, future) for item, future in batch if not future.done()]
+        if not live:
+            return
+        self.batches += 1
+        self.items += len(live)
+
+        try:
+            results = await self.handler([item for item, _ in live])
+            if len(results) != len(live):
+                raise ValueError(
+                    f"Batch handler returned {len(results)} results for {len(live)} items"
+                )
+        except Exception as e:
+            for _, future in live:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(live, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return batching counters."""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "average_batch_size": self.items / self.batches if self.batches else 0.0
+        }
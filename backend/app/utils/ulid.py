@@ -0,0 +1,84 @@
+import secrets
+import threading
+import time
+from typing import Callable, Optional
+
+# Crockford's base32: no I, L, O or U, so IDs are unambiguous and URL-safe.
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_DECODE = {char: index for index, char in enumerate(ALPHABET)}
+_CANONICAL = frozenset(ALPHABET)
+_DECODE.update({char.lower(): index for char, index in _DECODE.items()})
+
+ULID_LENGTH = 26
+_TIME_LENGTH = 10
+_RANDOM_BITS = 80
+_MAX_TIME = (1 << 48) - 1
+
+def encode_base32(value: int, length: int) -> str:
+    """Encode the low 5 * length bits of value, most significant first."""
+    chars = []
+    for _ in range(length):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+def decode_base32(text: str) -> Optional[int]:
+    """Decode Crockford base32 text, or return None if it is not valid."""
+    value = 0
+    for char in text:
+        digit = _DECODE.get(char)
+        if digit is None:
+            return None
+        value = (value << 5) | digit
+    return value
+
+def ulid_timestamp_ms(value: str) -> Optional[int]:
+    """Return the creation time embedded in a ULID, in epoch milliseconds.
+
+    Only exactly 26 characters in canonical upper case count as a ULID,
+    as generated; anything else, such as a lower-case hex UUID that
+    happens to decode, returns None.
+    """
+    if len(value) != ULID_LENGTH or not _CANONICAL.issuperset(value):
+        return None
+    timestamp = decode_base32(value[:_TIME_LENGTH])
+    if timestamp > _MAX_TIME:
+        return None
+    return timestamp
+
+class ULIDGenerator:
+    """Generate ULIDs: 26 characters, 48-bit millisecond time, 80 random bits.
+
+    IDs sort lexicographically by creation time. IDs from one generator
+    within the same millisecond increment the random part instead of
+    redrawing it, so they also sort in the order they were issued.
+    """
+
+    def __init__(
+        self,
+        clock: Callable[[], int] = time.time_ns,
+        randbits: Callable[[int], int] = secrets.randbits
+    ):
+        self._clock = clock
+        self._randbits = randbits
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+
+    def new(self) -> str:
+        with self._lock:
+            timestamp = self._clock() // 1_000_000
+            if timestamp <= self._last_ms:
+                # Same millisecond, or the clock stepped back: stay ordered.
+                timestamp = self._last_ms
+                random_part = self._last_random + 1
+                if random_part >> _RANDOM_BITS:
+                    timestamp += 1
+                    random_part = self._randbits(_RANDOM_BITS)
+            else:
+                random_part = self._randbits(_RANDOM_BITS)
+            self._last_ms = timestamp
+            self._last_random = random_part
+        return encode_base32((timestamp << _RANDOM_BITS) | random_part, ULID_LENGTH)
+
+new_ulid = ULIDGenerator().new
@@ -0,0 +1,106 @@
+"""Measure what authentication adds to a cart request, and bcrypt's loop stall.
+
+Run from the backend directory (the app settings need JWT_SECRET and
+PASSWORD_SALT in the environment):
+
+    python -m benchmarks.bench_auth
+"""
+import argparse
+import asyncio
+import time
+import timeit
+from datetime import timedelta
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.core.security import (
+    create_access_token,
+    get_password_hash,
+    token_verifier,
+    verify_password,
+    verify_password_async,
+    verify_token
+)
+from app.models.cart_models import CartItem
+from app.services.cart_service import cart_service
+from run import app
+
+def bench_requests(number: int) -> None:
+    client = TestClient(app)
+    cart_service.add_item("bench", CartItem(item_id="item1", quantity=1))
+    token = create_access_token({"sub": "bench"}, expires_delta=timedelta(hours=1))
+    headers = {"Authorization": f"Bearer {token}"}
+    url = f"{settings.API_PREFIX}/{settings.API_VERSION}/cart/bench"
+
+    def no_auth():
+        client.get(url)
+
+    def cached():
+        client.get(url, headers=headers)
+
+    def uncached():
+        token_verifier.clear()
+        client.get(url, headers=headers)
+
+    print(f"GET cart through the ASGI stack, {number} requests each")
+    baseline = None
+    for name, enabled, fn in (
+        ("auth off", False, no_auth),
+        ("auth on, cached", True, cached),
+        ("auth on, uncached", True, uncached)
+    ):
+        settings.AUTH_ENABLED = enabled
+        per_call = min(timeit.repeat(fn, number=number, repeat=3)) / number
+        baseline = baseline or per_call
+        print(f"{name:<20} {per_call * 1e6:9.1f} us/request  {(per_call - baseline) * 1e6:+8.1f} us")
+    settings.AUTH_ENABLED = False
+
+    print(f"\nToken check alone, {number * 10} calls each")
+    for name, fn in (
+        ("jwt decode", lambda: verify_token(token)),
+        ("cached claims", lambda: token_verifier.verify(token))
+    ):
+        per_call = min(timeit.repeat(fn, number=number * 10, repeat=3)) / (number * 10)
+        print(f"{name:<20} {per_call * 1e6:9.2f} us/call")
+
+async def max_loop_lag(checks: int, off_loop: bool) -> float:
+    """Worst event-loop delay seen while checks password checks run."""
+    hashed = get_password_hash("secret")
+    lag = 0.0
+    done = False
+
+    async def probe():
+        nonlocal lag
+        while not done:
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lag = max(lag, time.perf_counter() - started - 0.001)
+
+    async def check():
+        if off_loop:
+            await verify_password_async("secret", hashed)
+        else:
+            verify_password("secret", hashed)
+            await asyncio.sleep(0)
+
+    prober = asyncio.create_task(probe())
+    await asyncio.sleep(0.01)
+    await asyncio.gather(*(check() for _ in range(checks)))
+    done = True
+    await prober
+    return lag
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=1000)
+    parser.add_argument("--password-checks", type=int, default=8)
+    args = parser.parse_args()
+
+    bench_requests(args.number)
+
+    print(f"\nWorst event-loop stall during {args.password_checks} concurrent bcrypt checks")
+    for name, off_loop in (("on the loop", False), ("bcrypt pool", True)):
+        lag = asyncio.run(max_loop_lag(args.password_checks, off_loop))
+        print(f"{name:<20} {lag * 1000:9.1f} ms")
+
+if __name__ == "__main__":
+    main()
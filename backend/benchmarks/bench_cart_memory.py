@@ -0,0 +1,79 @@
+"""Report memory per stored cart at 1, 10 and 50 items.
+
+Compares carts kept as pydantic Cart models (the previous in-memory
+store) with MemoryCartStore's compact records. Items are parsed from
+JSON, as requests are, so ids are distinct string objects until the
+store interns them. Run from the backend directory (the app settings
+need JWT_SECRET and PASSWORD_SALT in the environment):
+
+    python -m benchmarks.bench_cart_memory
+"""
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+from typing import Callable, List
+from app.models.cart_models import Cart, CartItem
+from app.services.cart_store import MemoryCartStore
+
+MENU = [f"menu-item-{index}" for index in range(200)]
+MODIFIERS = [f"modifier-{index}" for index in range(30)]
+INSTRUCTIONS = [None, None, "Extra spicy", "No onions", "Nut allergy", "Well done"]
+
+def make_carts(count: int, items: int, rng: random.Random) -> List[Cart]:
+    carts = []
+    for index in range(count):
+        cart = Cart(conversation_id=f"conversation-{index:08d}")
+        for item_id in rng.sample(MENU, items):
+            payload = json.dumps({
+                "item_id": item_id,
+                "quantity": rng.randint(1, 3),
+                "special_instructions": rng.choice(INSTRUCTIONS),
+                "modifiers": [
+                    {"id": modifier, "quantity": 1}
+                    for modifier in rng.sample(MODIFIERS, rng.randint(0, 3))
+                ]
+            })
+            cart.add_item(CartItem.model_validate_json(payload))
+        carts.append(cart)
+    return carts
+
+def bytes_per_cart(count: int, items: int, keep: Callable[[List[Cart]], object]) -> float:
+    carts = make_carts(count, items, random.Random(items))
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = keep(carts)
+    del carts
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del held
+    return used / count
+
+def keep_models(carts: List[Cart]) -> object:
+    # Models were allocated before tracing started, so copy them into a
+    # fresh dict of deep copies to measure what the old store held.
+    return {cart.conversation_id: cart.model_copy(deep=True) for cart in carts}
+
+def keep_records(carts: List[Cart]) -> object:
+    # No hot set, so every cart is held as it would be once idle.
+    store = MemoryCartStore(shards=16, max_age=86400, hot_carts=0)
+    for cart in carts:
+        store.save(cart)
+    return store
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--carts", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'items':>5} {'pydantic':>12} {'compact':>12} {'ratio':>7}")
+    for items in (1, 10, 50):
+        models = bytes_per_cart(args.carts, items, keep_models)
+        records = bytes_per_cart(args.carts, items, keep_records)
+        print(f"{items:>5} {models:>10.0f} B {records:>10.0f} B {models / records:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
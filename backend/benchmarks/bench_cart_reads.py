@@ -0,0 +1,84 @@
+"""Measure the cart read and update path on the in-memory store.
+
+Times CartService.get_cart and update_item on carts of 1, 10 and 50
+items for three stores:
+- a dict of live Cart models, as the store was before compact records;
+- MemoryCartStore with its hot set, which is the default;
+- MemoryCartStore with hot_carts=0, which rebuilds every cart from its
+  record.
+
+Run from the backend directory (the app settings need JWT_SECRET and
+PASSWORD_SALT in the environment):
+
+    python -m benchmarks.bench_cart_reads
+"""
+import argparse
+import timeit
+from typing import Dict, Iterable, Optional
+from app.models.cart_models import Cart, CartItem
+from app.services.cart_service import CartService
+from app.services.cart_store import CartStore, MemoryCartStore
+
+class ModelCartStore(CartStore):
+    """The pre-record store: live models in a dict."""
+
+    def __init__(self):
+        super().__init__()
+        self._carts: Dict[str, Cart] = {}
+
+    def get(self, conversation_id: str) -> Optional[Cart]:
+        return self._carts.get(conversation_id)
+
+    def save(self, cart: Cart, expected_version: Optional[int] = None) -> None:
+        self._carts[cart.conversation_id] = cart
+
+    def save_many(self, carts: Iterable[Cart]) -> None:
+        for cart in carts:
+            self.save(cart)
+
+    def delete(self, conversation_id: str) -> bool:
+        return self._carts.pop(conversation_id, None) is not None
+
+    def evict_expired(self, now, limit: int) -> int:
+        return 0
+
+    def count(self) -> int:
+        return len(self._carts)
+
+    def clear(self) -> None:
+        self._carts.clear()
+
+def fill(service: CartService, items: int) -> None:
+    for index in range(items):
+        service.add_item("bench", CartItem(
+            item_id=f"item{index}",
+            quantity=1,
+            special_instructions="Extra spicy, no onions",
+            modifiers=[{"id": "cheese", "quantity": 1}, {"id": "olives", "quantity": 2}]
+        ))
+
+def per_call_us(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    stores = {
+        "live models": ModelCartStore,
+        "records + hot set": MemoryCartStore,
+        "records only": lambda: MemoryCartStore(hot_carts=0)
+    }
+    update = CartItem(item_id="item0", quantity=2)
+    print(f"{'items':>5} {'store':<18} {'get_cart':>12} {'update_item':>14}")
+    for items in (1, 10, 50):
+        for name, make_store in stores.items():
+            service = CartService(make_store())
+            fill(service, items)
+            get = per_call_us(lambda: service.get_cart("bench"), args.number)
+            put = per_call_us(lambda: service.update_item("bench", "item0", update), args.number)
+            print(f"{items:>5} {name:<18} {get:>9.1f} us {put:>11.1f} us")
+
+if __name__ == "__main__":
+    main()
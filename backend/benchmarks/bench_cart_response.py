@@ -0,0 +1,63 @@
+"""Compare per-request CPU for cart responses on a 50-item cart.
+
+Run from the backend directory (the app settings need JWT_SECRET and
+PASSWORD_SALT in the environment):
+
+    python -m benchmarks.bench_cart_response
+"""
+import argparse
+import json
+import timeit
+from pydantic import TypeAdapter
+from app.core.config import settings
+from app.models.cart_models import CartItem, CartResponse
+from app.services.cart_service import CartService
+
+def build_cart(service: CartService, items: int):
+    cart = None
+    for index in range(items):
+        cart = service.add_item("bench", CartItem(
+            item_id=f"item{index}",
+            quantity=2,
+            special_instructions="Extra spicy, no onions",
+            modifiers=[{"id": "cheese", "quantity": 1}, {"id": "olives", "quantity": 2}]
+        ))
+    return cart
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=settings.MAX_CART_ITEMS)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    service = CartService()
+    cart = build_cart(service, args.items)
+    adapter = TypeAdapter(CartResponse)
+
+    def pydantic_path() -> bytes:
+        # What the routes did before: build a CartResponse, let FastAPI
+        # validate it against response_model, then encode with json.
+        response = service.get_cart_response(cart)
+        validated = adapter.validate_python(response, from_attributes=True)
+        return json.dumps(adapter.dump_python(validated, mode="json")).encode()
+
+    def orjson_uncached() -> bytes:
+        service._responses.clear()
+        return service.render_cart_response(cart)
+
+    def orjson_cached() -> bytes:
+        return service.render_cart_response(cart)
+
+    baseline = None
+    print(f"{args.items}-item cart, {args.number} renders each")
+    for name, fn in (
+        ("pydantic + json", pydantic_path),
+        ("orjson, uncached", orjson_uncached),
+        ("orjson, cached", orjson_cached)
+    ):
+        per_call = min(timeit.repeat(fn, number=args.number, repeat=3)) / args.number
+        baseline = baseline or per_call
+        print(f"{name:<18} {per_call * 1e6:9.1f} us/request  {baseline / per_call:6.1f}x")
+
+if __name__ == "__main__":
+    main()
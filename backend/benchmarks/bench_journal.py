@@ -0,0 +1,129 @@
+"""Measure cart journal fsync latency, snapshot cost and recovery time.
+
+Writes a snapshot of --carts carts plus a journal tail of
+--journal-entries saves, stops the writer without the closing snapshot
+(as a crash would) and times recovery into a fresh MemoryCartStore. Run
+from the backend directory (the app settings need JWT_SECRET and
+PASSWORD_SALT in the environment):
+
+    python -m benchmarks.bench_journal --carts 1000000
+"""
+import argparse
+import gc
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+from app.models.cart_models import Cart, CartItem
+from app.services.cart_journal import CartJournal
+from app.services.cart_records import CartRecord, to_record
+from app.services.cart_store import MemoryCartStore
+from app.utils.ulid import new_ulid
+
+MENU = [f"menu-item-{index}" for index in range(200)]
+INSTRUCTIONS = [None, None, "Extra spicy", "No onions", "Nut allergy", "Well done"]
+
+def make_cart(conversation_id: str, items: int, rng: random.Random) -> Cart:
+    return Cart(
+        conversation_id=conversation_id,
+        items=[
+            CartItem(
+                item_id=item_id,
+                quantity=rng.randint(1, 3),
+                special_instructions=rng.choice(INSTRUCTIONS),
+                modifiers=[{"id": "cheese", "quantity": 1}]
+            )
+            for item_id in rng.sample(MENU, items)
+        ]
+    )
+
+def make_records(count: int, items: int, rng: random.Random) -> List[CartRecord]:
+    """Build records from a few templates; every record gets its own item tuples."""
+    templates = [to_record(make_cart("template", items, rng)) for _ in range(50)]
+    records = []
+    for _ in range(count):
+        template = rng.choice(templates)
+        records.append(template._replace(
+            conversation_id=new_ulid(),
+            items=tuple(item._replace(quantity=rng.randint(1, 3)) for item in template.items)
+        ))
+    return records
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--carts", type=int, default=1_000_000)
+    parser.add_argument("--items", type=int, default=3)
+    parser.add_argument("--journal-entries", type=int, default=100_000)
+    parser.add_argument("--no-fsync", action="store_true")
+    parser.add_argument("--directory", help="journal directory (default: a temporary one)")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as temporary:
+        directory = Path(args.directory or temporary)
+        journal = CartJournal(str(directory), fsync=not args.no_fsync, snapshot_every=10**12)
+        store = MemoryCartStore(journal=journal)
+        store.recover()
+
+        started = time.perf_counter()
+        records = make_records(args.carts, args.items, rng)
+        print(f"built {args.carts} records in {time.perf_counter() - started:.1f}s")
+
+        shard = {record.conversation_id: record for record in records}
+        del records
+        started = time.perf_counter()
+        journal.snapshot([shard])
+        queued = time.perf_counter() - started
+        del shard
+        gc.collect()
+
+        carts = [make_cart(new_ulid(), args.items, rng) for _ in range(1000)]
+        save_seconds = []
+        for index in range(args.journal_entries):
+            cart = carts[index % len(carts)]
+            started = time.perf_counter()
+            store.save(cart)
+            save_seconds.append(time.perf_counter() - started)
+            if index % 100 == 0:
+                # Space saves out a little, as requests would be.
+                time.sleep(0.0005)
+        journal.close()
+        stats = journal.stats()
+
+        snapshot_size = (directory / "snapshot.pkl").stat().st_size
+        journal_size = sum(path.stat().st_size for path in directory.glob("journal-*.log"))
+        print(f"snapshot: {snapshot_size / 1e6:.1f} MB written in {stats['last_snapshot_seconds']:.2f}s "
+              f"on the snapshot thread ({queued * 1000:.1f} ms on the caller)")
+        print(f"journal tail: {stats['entries_written']} entries, {journal_size / 1e6:.1f} MB, "
+              f"{stats['batches']} batches ({stats['entries_written'] / max(stats['batches'], 1):.1f} entries per fsync)")
+        print(f"save(): p50 {percentile(save_seconds, 0.5) * 1e6:.1f} us, p99 {percentile(save_seconds, 0.99) * 1e6:.1f} us")
+        latencies = list(journal.fsync_latencies)
+        if latencies:
+            print(f"fsync (last {len(latencies)}): p50 {percentile(latencies, 0.5) * 1000:.2f} ms, "
+                  f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms, max {max(latencies) * 1000:.2f} ms")
+        del store, carts
+        gc.collect()
+
+        recovered = MemoryCartStore(journal=CartJournal(str(directory), fsync=not args.no_fsync))
+        started = time.perf_counter()
+        count = recovered.recover()
+        elapsed = time.perf_counter() - started
+        print(f"recovery: {count} carts ({recovered.journal.replayed} journal entries replayed) "
+              f"in {elapsed:.2f}s, of which reading {recovered.journal.recovery_seconds:.2f}s")
+
+        # Recovery queued a snapshot to fold the replayed tail in; queue
+        # another to time the hand-off at full size.
+        started = time.perf_counter()
+        recovered.snapshot()
+        handoff = time.perf_counter() - started
+        recovered.journal.close()
+        print(f"snapshot at {count} carts: {handoff * 1000:.3f} ms on the caller, "
+              f"{recovered.journal.last_snapshot_seconds:.2f}s on the snapshot thread")
+
+if __name__ == "__main__":
+    main()
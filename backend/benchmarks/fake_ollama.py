@@ -0,0 +1,133 @@
+"""Local stand-in for Ollama's /api/generate with configurable behaviour.
+
+Replies are shaped like the real server's: JSON-mode requests get a
+JSON document matching the prompt (single or batched instruction
+analysis, suggestions), other requests get plain text, and streaming
+requests get NDJSON chunks. Latency, jitter, error rate and token
+pacing are set on the command line:
+
+    python -m benchmarks.fake_ollama --port 11435 --latency-ms 200 --jitter-ms 50 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+from aiohttp import web
+
+_BATCH_LINE = re.compile(r"^(\d+): ", re.MULTILINE)
+
+class FakeOllamaConfig:
+    def __init__(
+        self,
+        latency_ms: float = 100.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        stream_tokens: int = 20,
+        token_delay_ms: float = 10.0,
+        seed: int = None
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.stream_tokens = stream_tokens
+        self.token_delay_ms = token_delay_ms
+        self.random = random.Random(seed)
+
+    def latency(self) -> float:
+        """Seconds to wait before replying, uniformly jittered."""
+        jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(self.latency_ms + jitter, 0.0) / 1000
+
+    def should_fail(self) -> bool:
+        return self.random.random() < self.error_rate
+
+def _analysis(index: int = None) -> dict:
+    result = {
+        "spice_level": None,
+        "allergies": [],
+        "preferences": [],
+        "special_requests": ["handled by fake ollama"]
+    }
+    if index is not None:
+        result["index"] = index
+    return result
+
+def reply_for(body: dict) -> str:
+    """Build a plausible model reply for the request's prompt."""
+    prompt = body.get("prompt", "")
+    if body.get("format") != "json":
+        return "The order has several items. No dietary concerns were mentioned."
+    if '"results"' in prompt:
+        indices = [int(index) for index in _BATCH_LINE.findall(prompt)]
+        return json.dumps({"results": [_analysis(index) for index in indices]})
+    if '"items"' in prompt and "Suggest" in prompt:
+        return json.dumps({"items": ["fake-suggestion-1", "fake-suggestion-2"]})
+    return json.dumps(_analysis())
+
+def create_app(config: FakeOllamaConfig) -> web.Application:
+    stats = {"requests": 0, "errors": 0, "streams": 0}
+
+    async def generate(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        stats["requests"] += 1
+        await asyncio.sleep(config.latency())
+        if config.should_fail():
+            stats["errors"] += 1
+            return web.json_response({"error": "injected failure"}, status=500)
+        if body.get("stream"):
+            stats["streams"] += 1
+            return await stream(request, body)
+        return web.json_response({
+            "model": body.get("model"),
+            "response": reply_for(body),
+            "done": True
+        })
+
+    async def stream(request: web.Request, body: dict) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        words = reply_for(body).split(" ")
+        for index in range(config.stream_tokens):
+            chunk = {"response": words[index % len(words)] + " ", "done": False}
+            await response.write(json.dumps(chunk).encode() + b"\n")
+            await asyncio.sleep(config.token_delay_ms / 1000)
+        await response.write(json.dumps({"response": "", "done": True}).encode() + b"\n")
+        return response
+
+    async def root(request: web.Request) -> web.Response:
+        return web.Response(text="Ollama is running")
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_post("/api/generate", generate)
+    app.router.add_get("/", root)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--stream-tokens", type=int, default=20)
+    parser.add_argument("--token-delay-ms", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeOllamaConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        stream_tokens=args.stream_tokens,
+        token_delay_ms=args.token_delay_ms,
+        seed=args.seed
+    )
+    web.run_app(create_app(config), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
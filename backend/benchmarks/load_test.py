@@ -0,0 +1,334 @@
+"""Drive every cart endpoint at a fixed concurrency and report latency as JSON.
+
+Unless --app-url is given, a fake Ollama (benchmarks/fake_ollama.py)
+and the app (uvicorn run:app) are started as subprocesses on free
+ports, with the app pointed at the fake. Each endpoint is exercised in
+its own phase; the report has throughput, error counts and p50/p95/p99
+latency per endpoint, plus the app's /stats at the end. Run from the
+backend directory:
+
+    python -m benchmarks.load_test --concurrency 32 --requests 2000 --output results.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+import aiohttp
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+API = "/api/v1/cart"
+# Half of the instructions are common phrases the rule matcher handles;
+# the rest are unique so they reach (fake) Ollama.
+COMMON_INSTRUCTIONS = ["Extra spicy", "No onions", "Nut allergy", None]
+
+def percentile(ordered: Sequence[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values."""
+    if not ordered:
+        return None
+    return ordered[min(max(math.ceil(q * len(ordered)) - 1, 0), len(ordered) - 1)]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def instructions_for(n: int) -> Optional[str]:
+    if n % 2:
+        return f"Please write note number {n} on the box"
+    return COMMON_INSTRUCTIONS[(n // 2) % len(COMMON_INSTRUCTIONS)]
+
+class Phase:
+    """Latency and status counts for one endpoint."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.statuses: Dict[int, int] = {}
+        self.errors = 0
+        self.elapsed = 0.0
+
+    def record(self, seconds: float, status: int, ok: bool) -> None:
+        self.latencies.append(seconds)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if not ok:
+            self.errors += 1
+
+    def report(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+
+        def ms(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value * 1000, 3)
+
+        return {
+            "requests": len(ordered),
+            "errors": self.errors,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "throughput_rps": round(len(ordered) / self.elapsed, 1) if self.elapsed else None,
+            "p50_ms": ms(percentile(ordered, 0.50)),
+            "p95_ms": ms(percentile(ordered, 0.95)),
+            "p99_ms": ms(percentile(ordered, 0.99)),
+            "max_ms": ms(ordered[-1] if ordered else None)
+        }
+
+class LoadTest:
+    def __init__(self, session: aiohttp.ClientSession, base_url: str, args: argparse.Namespace):
+        self.session = session
+        self.base_url = base_url
+        self.args = args
+        self.run_id = uuid.uuid4().hex[:8]
+        self.etags: Dict[int, str] = {}
+
+    def cart_url(self, conversation_id: str, suffix: str = "") -> str:
+        return f"{self.base_url}{API}/{conversation_id}{suffix}"
+
+    def main_cart(self, worker: int) -> str:
+        return f"load-{self.run_id}-{worker}"
+
+    def scratch_cart(self, worker: int, n: int) -> str:
+        # Forty items per cart keeps add_item under MAX_CART_ITEMS.
+        return f"scratch-{self.run_id}-{worker}-{n // 40}"
+
+    async def request(
+        self,
+        phase: Phase,
+        method: str,
+        url: str,
+        expected: Sequence[int] = (200,),
+        **kwargs
+    ) -> aiohttp.ClientResponse:
+        started = time.perf_counter()
+        async with self.session.request(method, url, **kwargs) as response:
+            await response.read()
+        phase.record(time.perf_counter() - started, response.status, response.status in expected)
+        return response
+
+    async def setup(self) -> None:
+        """Give every worker a main cart with --cart-items items."""
+        async def seed(worker: int) -> None:
+            operations = [
+                {"op": "add", "item": {
+                    "item_id": f"item-{index}",
+                    "quantity": 1,
+                    "special_instructions": instructions_for(index),
+                    "modifiers": [{"id": "cheese", "quantity": 1}]
+                }}
+                for index in range(self.args.cart_items)
+            ]
+            async with self.session.post(
+                self.cart_url(self.main_cart(worker), "/batch"),
+                json={"operations": operations}
+            ) as response:
+                response.raise_for_status()
+                self.etags[worker] = response.headers.get("ETag", "")
+
+        await asyncio.gather(*(seed(worker) for worker in range(self.args.concurrency)))
+
+    async def create_cart(self, phase: Phase, worker: int, n: int) -> None:
+        # Every request starts a new conversation with a server-issued ID.
+        await self.request(phase, "POST", f"{self.base_url}{API}", expected=(201,))
+
+    async def add_item(self, phase: Phase, worker: int, n: int) -> None:
+        await self.request(phase, "POST", self.cart_url(self.scratch_cart(worker, n), "/items"), json={
+            "item_id": f"item-{n % 40}",
+            "quantity": 1,
+            "special_instructions": instructions_for(n)
+        })
+
+    async def get_cart(self, phase: Phase, worker: int, n: int) -> None:
+        await self.request(phase, "GET", self.cart_url(self.main_cart(worker)))
+
+    async def get_cart_conditional(self, phase: Phase, worker: int, n: int) -> None:
+        # Background analysis may still bump the version, so 200 is fine too.
+        response = await self.request(
+            phase, "GET", self.cart_url(self.main_cart(worker)), expected=(200, 304),
+            headers={"If-None-Match": self.etags[worker]}
+        )
+        self.etags[worker] = response.headers.get("ETag", self.etags[worker])
+
+    async def get_item(self, phase: Phase, worker: int, n: int) -> None:
+        item_id = f"item-{n % self.args.cart_items}"
+        await self.request(phase, "GET", self.cart_url(self.main_cart(worker), f"/items/{item_id}"))
+
+    async def update_item(self, phase: Phase, worker: int, n: int) -> None:
+        item_id = f"item-{n % self.args.cart_items}"
+        await self.request(phase, "PUT", self.cart_url(self.main_cart(worker), f"/items/{item_id}"), json={
+            "item_id": item_id,
+            "quantity": n % 3 + 1,
+            "special_instructions": instructions_for(n)
+        })
+
+    async def batch(self, phase: Phase, worker: int, n: int) -> None:
+        # Add then remove a temporary item so the cart size stays constant.
+        await self.request(phase, "POST", self.cart_url(self.main_cart(worker), "/batch"), json={
+            "operations": [
+                {"op": "add", "item": {"item_id": "batch-temp", "quantity": 1}},
+                {"op": "update", "item_id": "item-0", "item": {"item_id": "item-0", "quantity": n % 3 + 1}},
+                {"op": "remove", "item_id": "batch-temp"}
+            ]
+        })
+
+    async def place_order(self, phase: Phase, worker: int, n: int) -> None:
+        await self.request(phase, "POST", self.cart_url(self.main_cart(worker), "/order"))
+
+    async def order_summary(self, phase: Phase, worker: int, n: int) -> None:
+        await self.request(phase, "GET", self.cart_url(self.main_cart(worker), "/order/summary"))
+
+    async def delete_item(self, phase: Phase, worker: int, n: int) -> None:
+        # Removes what add_item created, one request per added item.
+        await self.request(
+            phase, "DELETE", self.cart_url(self.scratch_cart(worker, n), f"/items/item-{n % 40}")
+        )
+
+    def phases(self) -> List[Callable[[Phase, int, int], Awaitable[None]]]:
+        return [
+            self.create_cart,
+            self.add_item,
+            self.get_cart,
+            self.get_cart_conditional,
+            self.get_item,
+            self.update_item,
+            self.batch,
+            self.place_order,
+            self.order_summary,
+            self.delete_item
+        ]
+
+    async def run_phase(self, action: Callable[[Phase, int, int], Awaitable[None]]) -> Phase:
+        phase = Phase(action.__name__)
+        per_worker = math.ceil(self.args.requests / self.args.concurrency)
+
+        async def worker(index: int) -> None:
+            for n in range(per_worker):
+                try:
+                    await action(phase, index, n)
+                except aiohttp.ClientError:
+                    phase.record(0.0, 0, False)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(index) for index in range(self.args.concurrency)))
+        phase.elapsed = time.perf_counter() - started
+        return phase
+
+    async def run(self) -> Dict[str, Any]:
+        await self.setup()
+        results = {}
+        for action in self.phases():
+            if self.args.only and action.__name__ not in self.args.only:
+                continue
+            phase = await self.run_phase(action)
+            results[phase.name] = phase.report()
+            print(f"{phase.name:<22} {json.dumps(results[phase.name])}", file=sys.stderr)
+        return results
+
+async def wait_until_up(url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(url) as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not come up within {timeout}s")
+            await asyncio.sleep(0.1)
+
+async def fetch_json(session: aiohttp.ClientSession, url: str) -> Any:
+    try:
+        async with session.get(url) as response:
+            return await response.json()
+    except aiohttp.ClientError:
+        return None
+
+def start_servers(args: argparse.Namespace) -> List[subprocess.Popen]:
+    """Start the fake Ollama and the app; returns the processes."""
+    ollama_port, app_port = free_port(), free_port()
+    args.ollama_url = f"http://127.0.0.1:{ollama_port}"
+    args.app_url = f"http://127.0.0.1:{app_port}"
+
+    fake = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_ollama",
+        "--port", str(ollama_port),
+        "--latency-ms", str(args.ollama_latency_ms),
+        "--jitter-ms", str(args.ollama_jitter_ms),
+        "--error-rate", str(args.ollama_error_rate),
+        "--stream-tokens", str(args.ollama_stream_tokens),
+        "--token-delay-ms", str(args.ollama_token_delay_ms)
+    ], cwd=BACKEND_DIR)
+
+    env = dict(os.environ, OLLAMA_BASE_URL=args.ollama_url)
+    env.setdefault("JWT_SECRET", "load-test")
+    env.setdefault("PASSWORD_SALT", "load-test")
+    app = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "run:app",
+        "--host", "127.0.0.1", "--port", str(app_port),
+        "--log-level", "warning", "--no-access-log"
+    ], cwd=BACKEND_DIR, env=env)
+    return [fake, app]
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    processes = [] if args.app_url else start_servers(args)
+    try:
+        if args.ollama_url:
+            await wait_until_up(f"{args.ollama_url}/", args.startup_timeout)
+        await wait_until_up(f"{args.app_url}/ready", args.startup_timeout)
+
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            endpoints = await LoadTest(session, args.app_url, args).run()
+            return {
+                "config": {
+                    "concurrency": args.concurrency,
+                    "requests_per_endpoint": args.requests,
+                    "cart_items": args.cart_items,
+                    "ollama_latency_ms": args.ollama_latency_ms,
+                    "ollama_jitter_ms": args.ollama_jitter_ms,
+                    "ollama_error_rate": args.ollama_error_rate
+                },
+                "endpoints": endpoints,
+                "app_stats": await fetch_json(session, f"{args.app_url}/stats"),
+                "ollama_stats": (
+                    await fetch_json(session, f"{args.ollama_url}/stats") if args.ollama_url else None
+                )
+            }
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per endpoint")
+    parser.add_argument("--cart-items", type=int, default=10, help="items in each worker's cart")
+    parser.add_argument("--only", nargs="*", help="endpoint phases to run (default: all)")
+    parser.add_argument("--app-url", help="benchmark an already running app instead")
+    parser.add_argument("--ollama-url", help="fake Ollama to read /stats from with --app-url")
+    parser.add_argument("--ollama-latency-ms", type=float, default=100.0)
+    parser.add_argument("--ollama-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--ollama-error-rate", type=float, default=0.0)
+    parser.add_argument("--ollama-stream-tokens", type=int, default=20)
+    parser.add_argument("--ollama-token-delay-ms", type=float, default=5.0)
+    parser.add_argument("--startup-timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,58 @@
+import gc
 import uvicorn
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from app.core.config import settings
-from app.api.routes import cart_routes
-import logging
-from logging.handlers import RotatingFileHandler
-import os
+from app.core.log_config import AccessLogMiddleware, log_pipeline
+from app.core.metrics import MetricsMiddleware, StatsCollector, registry
+from app.core.profiler import ProfilerMiddleware, profiler
+from app.core.security import token_verifier
+from app.api.routes import admin_routes, cart_routes
+from app.services.ai_service import ai_service
+from app.services.cart_cleanup import cart_cleanup
+from app.services.cart_service import cart_service
+from app.services.instruction_worker import instruction_workers
+from app.services.warmup import model_warmup
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared resources on startup and release them on shutdown."""
+    # Registered per running app: a second app in the process (tests,
+    # reloads) would otherwise export the same time series twice.
+    stats_collector = getattr(app.state, "stats_collector", None)
+    if stats_collector is not None:
+        registry.register(stats_collector)
+    # Before anything can serve or evict carts. A large recovery
+    # allocates millions of tuples and no cycles; the cyclic GC would
+    # rescan them throughout, so it is paused, and the loaded carts are
+    # then frozen out of its reach. Refcounting still frees them.
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        recovered = cart_service.recover()
+    finally:
+        if gc_enabled:
+            gc.enable()
+    if recovered:
+        gc.freeze()
+    await ai_service.start()
+    await instruction_workers.start()
+    await cart_cleanup.start()
+    await model_warmup.start()
+    try:
+        yield
+    finally:
+        await model_warmup.stop()
+        await cart_cleanup.stop()
+        await instruction_workers.stop()
+        await ai_service.close()
+        cart_service.close()
+        profiler.close()
+        if stats_collector is not None:
+            registry.unregister(stats_collector)
 
 def create_app() -> FastAPI:
     """Create and configure the FastAPI application."""
@@ -14,7 +61,8 @@ def create_app() -> FastAPI:
         description="API for managing food order carts with AI capabilities",
         version=settings.API_VERSION,
         docs_url="/docs",
-        redoc_url="/redoc"
+        redoc_url="/redoc",
+        lifespan=lifespan
     )
 
     # Configure CORS
@@ -26,22 +74,9 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
-    # Setup logging
-    if not os.path.exists("logs"):
-        os.makedirs("logs")
-    
-    handler = RotatingFileHandler(
-        settings.LOG_FILE,
-        maxBytes=10000000,  # 10MB
-        backupCount=5
-    )
-    handler.setFormatter(logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    ))
-    
-    logger = logging.getLogger("app")
-    logger.setLevel(settings.LOG_LEVEL)
-    logger.addHandler(handler)
+    # Log through a queue so file I/O happens on a writer thread
+    log_pipeline.start()
+    app.add_middleware(AccessLogMiddleware)
 
     # Include routers
     app.include_router(
@@ -49,12 +84,48 @@ def create_app() -> FastAPI:
         prefix=f"{settings.API_PREFIX}/{settings.API_VERSION}",
         tags=["cart"]
     )
+    app.include_router(admin_routes.router, tags=["admin"])
+
+    # Inside the metrics middleware, so profiling cost shows up in latency.
+    app.add_middleware(ProfilerMiddleware, profiler=profiler)
 
     @app.get("/health")
     async def health_check():
         """Health check endpoint."""
         return {"status": "healthy"}
 
+    @app.get("/ready")
+    async def readiness_check():
+        """Readiness check: 503 until the model has been warmed up."""
+        if not model_warmup.ready:
+            return JSONResponse({"status": "warming_up"}, status_code=503)
+        return {"status": "ready", "model_warm": model_warmup.warm}
+
+    stats_sources = {
+        "ai": ai_service.stats,
+        "instruction_workers": instruction_workers.stats,
+        "carts": cart_service.stats,
+        "cart_cleanup": cart_cleanup.stats,
+        "auth": token_verifier.stats,
+        "profiler": profiler.stats,
+        "warmup": model_warmup.stats,
+        "logging": log_pipeline.stats
+    }
+
+    @app.get("/stats")
+    async def stats():
+        """In-process counters for caches and background work."""
+        return {name: source() for name, source in stats_sources.items()}
+
+    if settings.METRICS_ENABLED:
+        app.add_middleware(MetricsMiddleware)
+        app.state.stats_collector = StatsCollector(stats_sources)
+
+        @app.get("/metrics", include_in_schema=False)
+        async def metrics():
+            """Prometheus metrics in the text exposition format."""
+            return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
     return app
 
 app = create_app()
@@ -1,5 +1,9 @@
+import asyncio
+import json
 import pytest
+import pytest_asyncio
 import os
+from aiohttp import web
 from datetime import datetime, timedelta
 from app.core.config import Settings
 from app.services.cart_service import CartService
@@ -33,7 +37,7 @@ def cart_service():
     service = CartService()
     yield service
     # Cleanup after each test
-    service._carts.clear()
+    service._store.clear()
 
 @pytest.fixture
 def sample_cart():
@@ -85,4 +89,59 @@ def setup_test_environment():
     if "FLASK_ENV" in os.environ:
         del os.environ["FLASK_ENV"]
     if "FLASK_DEBUG" in os.environ:
-        del os.environ["FLASK_DEBUG"] 
\ No newline at end of file
+        del os.environ["FLASK_DEBUG"] 
+
+class FakeOllama:
+    """Minimal stand-in for Ollama's /api/generate endpoint."""
+
+    def __init__(self):
+        self.url = None
+        self.requests = []
+        self.connections = set()
+        self.response = {"response": "{}"}
+        self.status = 200
+        self.delay = 0.0
+        self.stream_tokens = ["Two ", "items ", "ordered."]
+        self.disconnected = asyncio.Event()
+
+    async def generate(self, request):
+        body = await request.json()
+        self.requests.append(body)
+        self.connections.add(request.transport.get_extra_info("peername"))
+        if body.get("stream"):
+            return await self.stream(request)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return web.json_response({"error": "unavailable"}, status=self.status)
+        return web.json_response(self.response)
+
+    async def stream(self, request):
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        try:
+            for token in self.stream_tokens:
+                chunk = {"response": token, "done": False}
+                await response.write(json.dumps(chunk).encode() + b"\n")
+                await asyncio.sleep(self.delay)
+            await response.write(json.dumps({"response": "", "done": True}).encode() + b"\n")
+        except (ConnectionResetError, asyncio.CancelledError):
+            self.disconnected.set()
+            raise
+        return response
+
+
+@pytest_asyncio.fixture
+async def fake_ollama():
+    """Run a fake Ollama server on a free local port."""
+    fake = FakeOllama()
+    app = web.Application()
+    app.router.add_post("/api/generate", fake.generate)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    fake.url = f"http://{host}:{port}"
+    yield fake
+    await runner.cleanup()
@@ -1,8 +1,19 @@
+import gc
 import pytest
 from fastapi.testclient import TestClient
 from app.models.cart_models import CartItem, Modifier
+from app.services.cart_service import cart_service
 from run import app
 
+@pytest.fixture(autouse=True)
+def reset_carts():
+    """Start every test with no stored carts, since the app's service is shared."""
+    cart_service._store.clear()
+    cart_service._responses.clear()
+    yield
+    cart_service._store.clear()
+    cart_service._responses.clear()
+
 @pytest.fixture
 def client():
     return TestClient(app)
@@ -126,4 +137,351 @@ def test_health_check(client):
     response = client.get("/health")
     assert response.status_code == 200
     data = response.json()
-    assert data["status"] == "healthy" 
\ No newline at end of file
+    assert data["status"] == "healthy" 
+
+
+@pytest.fixture
+def live_client():
+    with TestClient(app) as client:
+        yield client
+
+def test_add_item_returns_before_instruction_analysis(live_client, monkeypatch):
+    from app.services.ai_service import ai_service
+
+    async def analyze(instructions):
+        return {"spice_level": "hot"}
+
+    monkeypatch.setattr(ai_service, "process_cart_instructions", analyze)
+    conversation_id = "analysis123"
+    item = {"item_id": "item1", "quantity": 1, "special_instructions": "Extra spicy"}
+
+    response = live_client.post(f"/api/v1/cart/{conversation_id}/items", json=item)
+    assert response.status_code == 200
+    assert response.json()["items"][0]["instructions_status"] == "pending"
+
+    for _ in range(50):
+        data = live_client.get(f"/api/v1/cart/{conversation_id}").json()
+        if data["items"][0]["instructions_status"] != "pending":
+            break
+    assert data["items"][0]["instructions_status"] == "done"
+    assert data["items"][0]["instructions_analysis"]["spice_level"] == "hot"
+
+def test_merged_item_is_not_analyzed_again(client, sample_cart_item, monkeypatch):
+    from app.services.instruction_worker import instruction_workers
+
+    submitted = []
+
+    async def submit(conversation_id, item_id, instructions):
+        submitted.append((item_id, instructions))
+        return True
+
+    monkeypatch.setattr(instruction_workers, "submit", submit)
+    for _ in range(2):
+        response = client.post("/api/v1/cart/merge123/items", json=sample_cart_item)
+        assert response.status_code == 200
+
+    assert response.json()["items"][0]["quantity"] == 4
+    assert submitted == [("item1", "Extra spicy")]
+
+def test_stream_order_summary(client, sample_cart_item, monkeypatch):
+    from app.services.ai_service import ai_service
+
+    async def stream(cart):
+        for token in ["Two ", "items."]:
+            yield token
+
+    monkeypatch.setattr(ai_service, "stream_order_summary", stream)
+    conversation_id = "summary123"
+    client.post(f"/api/v1/cart/{conversation_id}/items", json=sample_cart_item)
+
+    response = client.get(f"/api/v1/cart/{conversation_id}/order/summary")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == (
+        'data: {"token": "Two "}\n\n'
+        'data: {"token": "items."}\n\n'
+        'event: done\ndata: {}\n\n'
+    )
+
+def test_stream_order_summary_reports_errors(client, sample_cart_item, monkeypatch):
+    from app.services.ai_service import ai_service
+
+    async def stream(cart):
+        raise Exception("Ollama API error: 500")
+        yield
+
+    monkeypatch.setattr(ai_service, "stream_order_summary", stream)
+    conversation_id = "summary456"
+    client.post(f"/api/v1/cart/{conversation_id}/items", json=sample_cart_item)
+
+    response = client.get(f"/api/v1/cart/{conversation_id}/order/summary")
+
+    assert response.text == 'event: error\ndata: {"error": "Ollama API error: 500"}\n\n'
+
+def test_place_order_without_ai_summary(client, sample_cart_item, monkeypatch):
+    from app.services.ai_service import AIServiceUnavailable, ai_service
+
+    async def summarize(cart):
+        raise AIServiceUnavailable("Ollama circuit breaker is open")
+
+    monkeypatch.setattr(ai_service, "summarize_order", summarize)
+    conversation_id = "degraded123"
+    client.post(f"/api/v1/cart/{conversation_id}/items", json=sample_cart_item)
+
+    response = client.post(f"/api/v1/cart/{conversation_id}/order")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["summary"] is None
+    assert len(data["items"]) == 1
+
+def test_stream_order_summary_missing_cart(client):
+    response = client.get("/api/v1/cart/missing123/order/summary")
+    assert response.status_code == 404
+
+def test_batch_operations(client):
+    conversation_id = "batch123"
+    response = client.post(f"/api/v1/cart/{conversation_id}/batch", json={"operations": [
+        {"op": "add", "item": {"item_id": "item1", "quantity": 1}},
+        {"op": "add", "item": {"item_id": "item2", "quantity": 2}},
+        {"op": "update", "item_id": "item1", "item": {"item_id": "item1", "quantity": 3}},
+        {"op": "remove", "item_id": "item2"},
+        {"op": "add", "item": {"item_id": "item3", "quantity": 1}}
+    ]})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["item_id"] for item in data["items"]] == ["item1", "item3"]
+    assert data["items"][0]["quantity"] == 3
+    assert data["total_items"] == 2
+
+def test_batch_operations_all_or_nothing(client):
+    conversation_id = "batch456"
+    client.post(f"/api/v1/cart/{conversation_id}/items", json={"item_id": "item1", "quantity": 1})
+
+    response = client.post(f"/api/v1/cart/{conversation_id}/batch", json={"operations": [
+        {"op": "clear"},
+        {"op": "remove", "item_id": "missing"}
+    ]})
+
+    assert response.status_code == 400
+    data = client.get(f"/api/v1/cart/{conversation_id}").json()
+    assert [item["item_id"] for item in data["items"]] == ["item1"]
+
+def test_batch_rejects_unknown_operation(client):
+    response = client.post("/api/v1/cart/batch789/batch", json={"operations": [
+        {"op": "explode"}
+    ]})
+
+    assert response.status_code == 422
+
+def test_get_cart_returns_etag_and_304(client, sample_cart_item):
+    conversation_id = "etag123"
+    added = client.post(f"/api/v1/cart/{conversation_id}/items", json=sample_cart_item)
+    etag = added.headers["ETag"]
+
+    response = client.get(f"/api/v1/cart/{conversation_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    response = client.get(f"/api/v1/cart/{conversation_id}", headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == etag
+
+def test_write_with_stale_if_match_is_rejected(client, sample_cart_item):
+    conversation_id = "etag456"
+    etag = client.post(f"/api/v1/cart/{conversation_id}/items", json=sample_cart_item).headers["ETag"]
+    client.delete(f"/api/v1/cart/{conversation_id}/items/{sample_cart_item['item_id']}")
+
+    response = client.post(
+        f"/api/v1/cart/{conversation_id}/items",
+        json=sample_cart_item,
+        headers={"If-Match": etag}
+    )
+    assert response.status_code == 412
+
+    current = client.get(f"/api/v1/cart/{conversation_id}").headers["ETag"]
+    response = client.post(
+        f"/api/v1/cart/{conversation_id}/items",
+        json=sample_cart_item,
+        headers={"If-Match": current}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != current
+
+
+def test_metrics_labelled_by_route_template(live_client, sample_cart_item):
+    live_client.post("/api/v1/cart/metrics123/items", json=sample_cart_item)
+    live_client.get("/api/v1/cart/metrics123")
+
+    response = live_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'route="/api/v1/cart/{conversation_id}"' in response.text
+    assert "metrics123" not in response.text
+    assert "process_resident_memory_bytes" in response.text
+    assert "app_carts_carts" in response.text
+
+def test_app_can_be_created_twice():
+    from run import create_app
+
+    for _ in range(2):
+        with TestClient(create_app()) as client:
+            response = client.get("/metrics")
+            assert response.status_code == 200
+            assert "app_carts_carts" in response.text
+
+def test_conflicting_write_returns_409(client, sample_cart_item, monkeypatch):
+    from app.services.cart_store import CartVersionConflict
+
+    def save(cart, expected_version=None):
+        raise CartVersionConflict("Cart conv409 was changed by another request")
+
+    monkeypatch.setattr(cart_service._store, "save", save)
+
+    response = client.post("/api/v1/cart/conv409/items", json=sample_cart_item)
+
+    assert response.status_code == 409
+    assert "changed by another request" in response.json()["detail"]
+
+def test_adding_item_with_other_instructions_returns_409(client, sample_cart_item):
+    conversation_id = "conv-dup"
+    client.post(f"/api/v1/cart/{conversation_id}/items", json=sample_cart_item)
+
+    response = client.post(
+        f"/api/v1/cart/{conversation_id}/items",
+        json={**sample_cart_item, "special_instructions": "No onions"}
+    )
+
+    assert response.status_code == 409
+    cart = client.get(f"/api/v1/cart/{conversation_id}").json()
+    assert [(item["item_id"], item["quantity"]) for item in cart["items"]] == [("item1", 2)]
+
+def test_journaled_carts_recovered_on_startup(tmp_path, monkeypatch):
+    from app.services.cart_journal import CartJournal
+    from app.services.cart_service import CartService
+    from app.services.cart_store import MemoryCartStore
+
+    previous = MemoryCartStore(journal=CartJournal(str(tmp_path), fsync=False))
+    previous.recover()
+    CartService(previous).add_item("journaled", CartItem(item_id="item1", quantity=1))
+    previous.close()
+    store = MemoryCartStore(journal=CartJournal(str(tmp_path), fsync=False))
+    monkeypatch.setattr(cart_service, "_store", store)
+    assert store.count() == 0
+    frozen = []
+    monkeypatch.setattr(gc, "freeze", lambda: frozen.append(True))
+
+    with TestClient(app) as client:
+        response = client.get("/api/v1/cart/journaled")
+
+    assert response.status_code == 200
+    assert response.json()["items"][0]["item_id"] == "item1"
+    assert not store.journal.running
+    assert frozen
+
+def test_startup_without_recovered_carts_leaves_gc_alone(monkeypatch):
+    frozen = []
+    monkeypatch.setattr(gc, "freeze", lambda: frozen.append(True))
+
+    with TestClient(app) as client:
+        assert client.get("/health").status_code == 200
+
+    assert not frozen
+
+def test_profiler_toggled_at_runtime(client, monkeypatch):
+    from app.core.config import settings
+    from app.core.profiler import profiler
+
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "admin-secret")
+    headers = {"Authorization": "Bearer admin-secret"}
+    response = client.put("/admin/profiler", json={"enabled": True, "sample_rate": 0.5}, headers=headers)
+    try:
+        assert response.status_code == 200
+        assert response.json()["enabled"] is True
+        assert profiler.sample_rate == 0.5
+    finally:
+        client.put("/admin/profiler", json={"enabled": False, "sample_rate": 0.01}, headers=headers)
+
+    assert client.get("/admin/profiler", headers=headers).json()["enabled"] is False
+    assert client.put("/admin/profiler", json={"sample_rate": 3}, headers=headers).status_code == 422
+
+def test_admin_api_refused_when_auth_disabled(client, monkeypatch):
+    from app.core.config import settings
+    from app.core.profiler import profiler
+
+    monkeypatch.setattr(settings, "AUTH_ENABLED", False)
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "")
+    response = client.put("/admin/profiler", json={"sample_rate": 1, "threshold_ms": 0})
+    assert response.status_code == 403
+    assert profiler.sample_rate != 1
+
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "admin-secret")
+    response = client.get("/admin/profiler", headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 401
+    response = client.get("/admin/profiler", headers={"Authorization": "Bearer admin-secret"})
+    assert response.status_code == 200
+
+def test_ready_reports_warm_up_state(client, monkeypatch):
+    from app.services.warmup import model_warmup
+
+    monkeypatch.setattr(model_warmup, "ready", False)
+    assert client.get("/ready").status_code == 503
+    assert client.get("/health").status_code == 200
+
+    monkeypatch.setattr(model_warmup, "ready", True)
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+def test_cart_api_requires_token_when_auth_enabled(client, monkeypatch):
+    from datetime import timedelta
+    from app.core.config import settings
+    from app.core.security import create_access_token
+
+    monkeypatch.setattr(settings, "AUTH_ENABLED", True)
+    assert client.get("/api/v1/cart/auth123").status_code == 401
+    response = client.get("/api/v1/cart/auth123", headers={"Authorization": "Bearer nonsense"})
+    assert response.status_code == 401
+
+    token = create_access_token({"sub": "user1"}, expires_delta=timedelta(minutes=5))
+    response = client.get("/api/v1/cart/auth123", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code != 401
+    assert client.get("/health").status_code == 200
+
+def test_admin_api_requires_token_when_auth_enabled(client, monkeypatch):
+    from datetime import timedelta
+    from app.core.config import settings
+    from app.core.security import create_access_token
+
+    monkeypatch.setattr(settings, "AUTH_ENABLED", True)
+    assert client.get("/admin/profiler").status_code == 401
+    assert client.put("/admin/profiler", json={"enabled": True}).status_code == 401
+
+    token = create_access_token({"sub": "user1"}, expires_delta=timedelta(minutes=5))
+    response = client.get("/admin/profiler", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+
+def test_create_cart_issues_conversation_id(client):
+    response = client.post("/api/v1/cart")
+    assert response.status_code == 201
+    conversation_id = response.json()["conversation_id"]
+    assert len(conversation_id) == 26
+
+    response = client.get(f"/api/v1/cart/{conversation_id}")
+    assert response.status_code == 200
+    assert response.json()["items"] == []
+
+def test_forged_conversation_id_rejected_when_signed(client, monkeypatch, sample_cart_item):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "CONVERSATION_ID_MAC_LENGTH", 8)
+    conversation_id = client.post("/api/v1/cart").json()["conversation_id"]
+    forged = conversation_id[:-1] + ("0" if conversation_id[-1] != "0" else "1")
+
+    assert client.post(f"/api/v1/cart/{conversation_id}/items", json=sample_cart_item).status_code == 200
+    assert client.post(f"/api/v1/cart/{forged}/items", json=sample_cart_item).status_code == 404
+    assert client.get(f"/api/v1/cart/{conversation_id.lower()}").status_code == 404
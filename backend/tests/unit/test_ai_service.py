@@ -0,0 +1,286 @@
+import asyncio
+import json
+import pytest
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.cart_models import Cart
+from app.services.ai_service import AIService, AIServiceUnavailable
+from app.services.instruction_rules import load_instruction_rules
+from app.utils.concurrency import ConcurrencyLimiter
+
+@pytest.fixture
+def ai_service(fake_ollama):
+    service = AIService()
+    service.base_url = fake_ollama.url
+    # Exercise the model path; the rule fast path is tested separately.
+    service.rules = None
+    return service
+
+@pytest.mark.asyncio
+async def test_start_configures_connection_pool(ai_service):
+    await ai_service.start()
+    connector = ai_service._session.connector
+
+    assert connector.limit == settings.OLLAMA_POOL_SIZE
+    assert connector.limit_per_host == settings.OLLAMA_POOL_SIZE_PER_HOST
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_requests_share_one_session(ai_service, fake_ollama):
+    fake_ollama.response = {"response": '{"spice_level": "hot"}'}
+    await ai_service.start()
+    session = ai_service._session
+
+    for instructions in ("Extra spicy", "Very spicy", "Spicy please"):
+        result = await ai_service.process_cart_instructions(instructions)
+        assert result["spice_level"] == "hot"
+
+    assert ai_service._session is session
+    assert len(fake_ollama.requests) == 3
+    assert len(fake_ollama.connections) == 1
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_close_releases_session(ai_service):
+    await ai_service.start()
+    session = ai_service._session
+
+    await ai_service.close()
+
+    assert session.closed
+    assert ai_service._session is None
+
+@pytest.mark.asyncio
+async def test_session_opened_lazily_without_lifespan(ai_service, fake_ollama):
+    await ai_service.process_cart_instructions("No onions")
+
+    assert ai_service._session is not None
+    assert len(fake_ollama.requests) == 1
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_repeated_instructions_served_from_cache(ai_service, fake_ollama):
+    fake_ollama.response = {"response": '{"allergies": ["nuts"]}'}
+
+    first = await ai_service.process_cart_instructions("Nut allergy")
+    second = await ai_service.process_cart_instructions("  nut   ALLERGY. ")
+
+    assert first == second == {"allergies": ["nuts"]}
+    assert len(fake_ollama.requests) == 1
+    assert ai_service.stats()["instructions_cache"]["hits"] == 1
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_cached_result_is_not_shared_with_callers(ai_service, fake_ollama):
+    fake_ollama.response = {"response": '{"allergies": ["nuts"]}'}
+
+    first = await ai_service.process_cart_instructions("Nut allergy")
+    first["allergies"].append("dairy")
+    second = await ai_service.process_cart_instructions("Nut allergy")
+
+    assert second == {"allergies": ["nuts"]}
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_identical_in_flight_prompts_share_one_request(ai_service, fake_ollama):
+    fake_ollama.response = {"response": '{"spice_level": "hot"}'}
+    fake_ollama.delay = 0.05
+
+    results = await asyncio.gather(
+        *(ai_service.process_cart_instructions("Extra spicy") for _ in range(20))
+    )
+
+    assert all(r == {"spice_level": "hot"} for r in results)
+    assert len(fake_ollama.requests) == 1
+    assert ai_service.stats()["in_flight"]["shared"] == 19
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_non_streaming_requests_disable_stream(ai_service, fake_ollama):
+    await ai_service.process_cart_instructions("Extra spicy")
+
+    assert fake_ollama.requests[0]["stream"] is False
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_stream_order_summary_yields_tokens(ai_service, fake_ollama):
+    cart = Cart(conversation_id="conv1")
+
+    tokens = [token async for token in ai_service.stream_order_summary(cart)]
+
+    assert tokens == ["Two ", "items ", "ordered."]
+    assert fake_ollama.requests[0]["stream"] is True
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_closing_stream_early_drops_upstream(ai_service, fake_ollama):
+    fake_ollama.stream_tokens = ["token "] * 50
+    fake_ollama.delay = 0.01
+    stream = ai_service.stream_order_summary(Cart(conversation_id="conv1"))
+
+    assert await stream.__anext__() == "token "
+    await stream.aclose()
+
+    await asyncio.wait_for(fake_ollama.disconnected.wait(), timeout=2)
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_concurrent_instructions_batched_into_one_prompt(ai_service, fake_ollama):
+    fake_ollama.response = {"response": json.dumps({"results": [
+        {"index": 1, "allergies": ["nuts"]},
+        {"index": 0, "spice_level": "hot"},
+        {"index": 2, "preferences": ["no onions"]}
+    ]})}
+
+    results = await asyncio.gather(
+        ai_service.process_cart_instructions("Extra spicy"),
+        ai_service.process_cart_instructions("Nut allergy"),
+        ai_service.process_cart_instructions("No onions")
+    )
+
+    assert results == [
+        {"spice_level": "hot"},
+        {"allergies": ["nuts"]},
+        {"preferences": ["no onions"]}
+    ]
+    assert len(fake_ollama.requests) == 1
+    assert "2: no onions" in fake_ollama.requests[0]["prompt"]
+    assert ai_service.stats()["instruction_batches"]["items"] == 3
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_missing_batch_entry_fails_only_that_instruction(ai_service, fake_ollama):
+    fake_ollama.response = {"response": json.dumps({"results": [
+        {"index": 0, "spice_level": "hot"}
+    ]})}
+
+    hot, missing = await asyncio.gather(
+        ai_service.process_cart_instructions("Extra spicy"),
+        ai_service.process_cart_instructions("Nut allergy"),
+        return_exceptions=True
+    )
+
+    assert hot == {"spice_level": "hot"}
+    assert isinstance(missing, Exception)
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_rule_matched_instructions_skip_ollama(ai_service, fake_ollama):
+    ai_service.rules = load_instruction_rules()
+
+    result = await ai_service.process_cart_instructions("Extra spicy, no onions")
+
+    assert result == {
+        "spice_level": "hot",
+        "allergies": [],
+        "preferences": ["no onions"],
+        "special_requests": []
+    }
+    assert fake_ollama.requests == []
+    assert ai_service.stats()["instruction_rules"]["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_free_form_instructions_fall_back_to_ollama(ai_service, fake_ollama):
+    ai_service.rules = load_instruction_rules()
+    fake_ollama.response = {"response": '{"special_requests": ["birthday candle"]}'}
+
+    result = await ai_service.process_cart_instructions("Put a birthday candle on top")
+
+    assert result == {"special_requests": ["birthday candle"]}
+    assert len(fake_ollama.requests) == 1
+    assert ai_service.stats()["instruction_rules"]["misses"] == 1
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_generation_limits_sent_as_options(ai_service, fake_ollama):
+    await ai_service.process_cart_instructions("Extra spicy")
+
+    body = fake_ollama.requests[0]
+    assert body["format"] == "json"
+    assert body["options"]["num_ctx"] == settings.OLLAMA_NUM_CTX
+    assert body["options"]["num_predict"] > 0
+    assert "max_tokens" not in body
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_summarize_order_returns_plain_text(ai_service, fake_ollama):
+    fake_ollama.response = {"response": "Two pizzas, one with extra cheese."}
+
+    summary = await ai_service.summarize_order(Cart(conversation_id="conv1"))
+
+    assert summary == "Two pizzas, one with extra cheese."
+    assert "format" not in fake_ollama.requests[0]
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_breaker_opens_and_fails_fast(ai_service, fake_ollama):
+    fake_ollama.status = 503
+    threshold = ai_service.breaker.failure_threshold
+
+    for attempt in range(threshold):
+        with pytest.raises(AIServiceUnavailable):
+            await ai_service.process_cart_instructions(f"Request {attempt}")
+    with pytest.raises(AIServiceUnavailable, match="circuit breaker"):
+        await ai_service.process_cart_instructions("One more")
+
+    assert len(fake_ollama.requests) == threshold
+    assert ai_service.stats()["breaker"]["state"] == "open"
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_concurrency_gate_rejects_excess_calls(ai_service, fake_ollama):
+    ai_service.limiter = ConcurrencyLimiter(limit=1, max_wait=0)
+    ai_service._instruction_batcher.max_batch_size = 1
+    fake_ollama.delay = 0.05
+
+    results = await asyncio.gather(
+        ai_service.process_cart_instructions("Extra spicy"),
+        ai_service.process_cart_instructions("Nut allergy"),
+        return_exceptions=True
+    )
+
+    assert sum(isinstance(r, AIServiceUnavailable) for r in results) == 1
+    assert ai_service.stats()["concurrency"]["rejected"] == 1
+    assert ai_service.breaker.state == "closed"
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_slow_calls_time_out_at_adapted_timeout(ai_service, fake_ollama):
+    tracker = ai_service._latency_for("instructions")
+    for _ in range(tracker.min_samples):
+        tracker.record(0.01)
+    tracker.min_timeout = 0.05
+    fake_ollama.delay = 0.5
+
+    with pytest.raises(AIServiceUnavailable, match="timed out"):
+        await ai_service.process_cart_instructions("Extra spicy")
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_timeout_recovers_when_model_slows_down(ai_service, fake_ollama):
+    tracker = ai_service._latency_for("instructions")
+    for _ in range(tracker.min_samples):
+        tracker.record(0.01)
+    tracker.min_timeout = 0.05
+    fake_ollama.delay = 0.3
+
+    for index in range(tracker.fallback_after):
+        with pytest.raises(AIServiceUnavailable, match="timed out"):
+            await ai_service.process_cart_instructions(f"Slow instructions {index}")
+
+    # The next call gets the full timeout and its latency is learned.
+    await ai_service.process_cart_instructions("Slow instructions, again")
+    assert tracker.timeout() >= fake_ollama.delay
+    await ai_service.process_cart_instructions("Slow instructions, once more")
+    assert ai_service.breaker.state == "closed"
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_ollama_calls_recorded_in_metrics(ai_service, fake_ollama):
+    labels = {"task": "instructions", "outcome": "success"}
+    before = registry.get_sample_value("ai_request_duration_seconds_count", labels) or 0
+
+    await ai_service.process_cart_instructions("Extra spicy")
+
+    assert registry.get_sample_value("ai_request_duration_seconds_count", labels) == before + 1
+    await ai_service.close()
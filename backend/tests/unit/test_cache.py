@@ -0,0 +1,47 @@
+import pytest
+from app.utils.cache import TTLCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+def test_get_returns_stored_value(clock):
+    cache = TTLCache(max_entries=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(max_entries=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    clock.now = 10
+
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+    assert len(cache) == 0
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache(max_entries=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+def test_invalid_size_rejected():
+    with pytest.raises(ValueError):
+        TTLCache(max_entries=0, ttl=10)
@@ -0,0 +1,71 @@
+import pytest
+from datetime import datetime, timedelta
+from app.models.cart_models import CartItem
+from app.services.cart_cleanup import CartCleanupTask
+from app.services.cart_service import CartService
+from app.services.cart_store import MemoryCartStore
+from app.utils.expiry_queue import ExpiryQueue
+
+NOW = datetime(2024, 1, 1)
+
+def test_expiry_queue_pops_only_due_keys():
+    queue = ExpiryQueue()
+    queue.schedule("a", NOW)
+    queue.schedule("b", NOW + timedelta(seconds=10))
+
+    assert queue.pop_due(NOW, limit=10) == ["a"]
+    assert len(queue) == 1
+
+def test_expiry_queue_respects_limit():
+    queue = ExpiryQueue()
+    for i in range(5):
+        queue.schedule(f"k{i}", NOW - timedelta(seconds=i))
+
+    assert queue.pop_due(NOW, limit=2) == ["k4", "k3"]
+    assert len(queue) == 3
+
+def test_expiry_queue_rescheduled_key_not_popped_early():
+    queue = ExpiryQueue()
+    queue.schedule("a", NOW)
+    queue.schedule("a", NOW + timedelta(hours=1))
+
+    assert queue.pop_due(NOW, limit=10) == []
+    assert queue.stale_skipped == 1
+    assert queue.pop_due(NOW + timedelta(hours=1), limit=10) == ["a"]
+
+def test_expiry_queue_compacts_stale_entries():
+    queue = ExpiryQueue()
+    for i in range(1000):
+        queue.schedule("a", NOW + timedelta(seconds=i))
+
+    assert len(queue._heap) < 100
+
+def expired_service():
+    return CartService(MemoryCartStore(max_age=-1))
+
+def test_cleanup_evicts_carts_past_deadline():
+    service = expired_service()
+    service.add_item("old", CartItem(item_id="item1", quantity=1))
+
+    assert service.cleanup_old_carts() == 1
+    assert service.get_cart("old") is None
+    assert service.stats()["evicted"] == 1
+
+def test_cleanup_keeps_recently_updated_carts():
+    service = CartService()
+    service.add_item("fresh", CartItem(item_id="item1", quantity=1))
+
+    assert service.cleanup_old_carts() == 0
+    assert service.get_cart("fresh") is not None
+
+@pytest.mark.asyncio
+async def test_cleanup_task_evicts_in_slices():
+    service = expired_service()
+    for i in range(25):
+        service.create_cart(f"conv{i}")
+    task = CartCleanupTask(service, interval=3600, batch_size=10)
+
+    assert await task.run_once() == 25
+    assert service.stats()["carts"] == 0
+    assert task.stats()["last_run_evicted"] == 25
+    assert task.stats()["runs"] == 1
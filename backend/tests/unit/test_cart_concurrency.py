@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from app.models.cart_models import CartItem
+from app.services.cart_service import CartService
+from app.services.cart_store import MemoryCartStore
+from app.utils.keyed_lock import KeyedLock
+
+CONVERSATIONS = 50
+MUTATIONS_PER_CONVERSATION = 40
+
+async def append_next_item(service, conversation_id):
+    """Read the cart, yield to other tasks, then write based on what was read."""
+    cart = service.get_cart(conversation_id)
+    position = cart.item_count if cart else 0
+    await asyncio.sleep(0)
+    service.add_item(conversation_id, CartItem(item_id=f"item{position}", quantity=1))
+
+@pytest.mark.asyncio
+async def test_no_lost_updates_under_parallel_mutations():
+    service = CartService(MemoryCartStore(shards=8))
+
+    async def mutate(conversation_id):
+        async with service.lock(conversation_id):
+            await append_next_item(service, conversation_id)
+
+    await asyncio.gather(*(
+        mutate(f"conv{c}")
+        for _ in range(MUTATIONS_PER_CONVERSATION)
+        for c in range(CONVERSATIONS)
+    ))
+
+    for c in range(CONVERSATIONS):
+        cart = service.get_cart(f"conv{c}")
+        assert cart.item_count == MUTATIONS_PER_CONVERSATION
+        assert all(item.quantity == 1 for item in cart.items)
+    assert service.stats()["carts"] == CONVERSATIONS
+    assert len(service._locks) == 0
+
+@pytest.mark.asyncio
+async def test_unlocked_mutations_lose_updates():
+    service = CartService(MemoryCartStore(shards=8))
+
+    await asyncio.gather(
+        *(append_next_item(service, "conv") for _ in range(10)),
+        return_exceptions=True
+    )
+
+    assert service.get_cart("conv").item_count < 10
+
+@pytest.mark.asyncio
+async def test_locks_on_different_keys_do_not_contend():
+    locks = KeyedLock()
+
+    async with locks.acquire("a"):
+        async with locks.acquire("b"):
+            assert sorted(locks.locked_keys()) == ["a", "b"]
+
+@pytest.mark.asyncio
+async def test_same_key_is_serialized():
+    locks = KeyedLock()
+    order = []
+
+    async def hold(name):
+        async with locks.acquire("a"):
+            order.append(f"{name}-in")
+            await asyncio.sleep(0.01)
+            order.append(f"{name}-out")
+
+    await asyncio.gather(hold("first"), hold("second"))
+
+    assert order == ["first-in", "first-out", "second-in", "second-out"]
+
+def test_carts_spread_across_shards():
+    store = MemoryCartStore(shards=4)
+    service = CartService(store)
+    for i in range(100):
+        service.create_cart(f"conv{i}")
+
+    assert all(store._shards)
+    assert store.count() == 100
@@ -0,0 +1,191 @@
+import time
+import pytest
+from datetime import datetime, timedelta
+from app.models.cart_models import Cart, CartItem
+from app.services.cart_journal import CartJournal
+from app.services.cart_store import MemoryCartStore
+
+def make_cart(conversation_id, *item_ids):
+    return Cart(
+        conversation_id=conversation_id,
+        items=[CartItem(item_id=item_id, quantity=1, special_instructions="no onions") for item_id in item_ids]
+    )
+
+def open_store(directory, snapshot_every=1000):
+    store = MemoryCartStore(shards=4, journal=CartJournal(str(directory), fsync=True, snapshot_every=snapshot_every))
+    store.recover()
+    return store
+
+def test_carts_survive_restart(tmp_path):
+    store = open_store(tmp_path)
+    store.save(make_cart("conv1", "a", "b"))
+    store.save(make_cart("conv2", "c"))
+    store.save(make_cart("conv1", "a"))
+    store.delete("conv2")
+    # Simulate a crash: stop the writer without the closing snapshot.
+    store.journal.close()
+
+    recovered = open_store(tmp_path)
+
+    assert recovered.journal.replayed == 4
+    assert recovered.count() == 1
+    assert [item.item_id for item in recovered.get("conv1").items] == ["a"]
+    assert recovered.get("conv1").items[0].special_instructions == "no onions"
+    recovered.close()
+
+def test_clean_shutdown_leaves_only_a_snapshot(tmp_path):
+    store = open_store(tmp_path)
+    for index in range(10):
+        store.save(make_cart(f"conv{index}", "a"))
+    store.close()
+
+    recovered = open_store(tmp_path)
+
+    assert recovered.count() == 10
+    assert recovered.journal.replayed == 0
+    recovered.close()
+
+def test_snapshot_truncates_journal(tmp_path):
+    store = open_store(tmp_path, snapshot_every=5)
+    for index in range(12):
+        store.save(make_cart(f"conv{index}", "a"))
+    store.journal.close()
+
+    assert store.journal.snapshots == 2
+    segments = sorted(path.name for path in tmp_path.glob("journal-*.log"))
+    assert len(segments) == 1
+    recovered = open_store(tmp_path)
+    assert recovered.count() == 12
+    assert recovered.journal.replayed == 2
+    recovered.close()
+
+def test_changes_after_a_queued_snapshot_are_recovered(tmp_path):
+    store = open_store(tmp_path)
+    for index in range(3):
+        store.save(make_cart(f"conv{index}", "a"))
+    store.snapshot()
+    # The snapshot thread may copy the carts before or after these.
+    store.delete("conv0")
+    store.save(make_cart("conv1", "b"))
+    store.save(make_cart("conv3", "c"))
+    store.journal.close()
+
+    recovered = open_store(tmp_path)
+
+    assert recovered.get("conv0") is None
+    assert [item.item_id for item in recovered.get("conv1").items] == ["b"]
+    assert recovered.count() == 3
+    recovered.close()
+
+def test_torn_tail_is_ignored(tmp_path):
+    store = open_store(tmp_path)
+    store.save(make_cart("conv1", "a"))
+    store.journal.close()
+    segment = next(tmp_path.glob("journal-*.log"))
+    with open(segment, "ab") as f:
+        f.write(b"\x40\x00\x00\x00garbage")
+
+    recovered = open_store(tmp_path)
+
+    assert recovered.count() == 1
+    recovered.close()
+
+def test_recovered_carts_still_expire(tmp_path):
+    store = open_store(tmp_path)
+    cart = make_cart("old", "a")
+    cart.updated_at = datetime.utcnow() - timedelta(days=2)
+    store.save(cart)
+    store.save(make_cart("new", "a"))
+    store.close()
+
+    recovered = open_store(tmp_path)
+
+    assert recovered.evict_expired(datetime.utcnow(), limit=10) == 1
+    assert recovered.get("new") is not None
+    recovered.close()
+    reopened = open_store(tmp_path)
+    assert reopened.count() == 1
+    reopened.close()
+
+def test_journal_directory_is_locked(tmp_path):
+    store = open_store(tmp_path)
+
+    with pytest.raises(RuntimeError):
+        CartJournal(str(tmp_path)).recover()
+    store.close()
+
+def test_full_queue_drops_entries_until_a_snapshot(tmp_path):
+    journal = CartJournal(str(tmp_path), fsync=False, max_queued=2)
+    store = MemoryCartStore(shards=4, journal=journal)
+    # The writer is not running yet, so the queue fills up.
+    for index in range(4):
+        store.save(make_cart(f"conv{index}", "a"))
+    assert journal.dropped == 2
+    assert not journal.snapshot_due
+
+    journal.start()
+    for _ in range(200):
+        if journal.stats()["queued"] == 0:
+            break
+        time.sleep(0.01)
+    assert journal.snapshot_due
+    store.save(make_cart("conv4", "a"))
+    journal.close()
+
+    recovered = open_store(tmp_path)
+    assert recovered.count() == 5
+    recovered.close()
+
+def test_snapshot_skipped_when_next_segment_cannot_be_opened(tmp_path, monkeypatch):
+    store = open_store(tmp_path)
+    journal = store.journal
+    segment_path = journal._segment_path
+    monkeypatch.setattr(journal, "_segment_path", lambda number: tmp_path / "missing" / "journal.log")
+
+    store.save(make_cart("conv1", "a"))
+    store.snapshot(wait=True)
+    store.save(make_cart("conv2", "b"))
+    for _ in range(200):
+        if journal.stats()["entries_written"] == 2:
+            break
+        time.sleep(0.01)
+
+    assert journal.stats()["errors"] == 1
+    assert journal.stats()["entries_written"] == 2
+    assert not journal.failed
+    monkeypatch.setattr(journal, "_segment_path", segment_path)
+    journal.close()
+
+    recovered = open_store(tmp_path)
+    assert recovered.count() == 2
+    recovered.close()
+
+def test_failed_write_makes_a_snapshot_due(tmp_path, monkeypatch):
+    from app.services import cart_journal
+
+    store = open_store(tmp_path)
+    journal = store.journal
+    frame = cart_journal._frame
+
+    def failing_frame(payload):
+        monkeypatch.setattr(cart_journal, "_frame", frame)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(cart_journal, "_frame", failing_frame)
+    store.save(make_cart("conv1", "a"))
+    for _ in range(200):
+        if journal.stats()["errors"]:
+            break
+        time.sleep(0.01)
+
+    assert journal.stats()["errors"] == 1
+    assert journal.snapshot_due
+    store.delete("conv1")
+    store.save(make_cart("conv2", "b"))
+    # Simulate a crash after the snapshot the delete queued.
+    journal.close()
+
+    recovered = open_store(tmp_path)
+    assert recovered.get("conv1") is None
+    assert recovered.count() == 1
+    recovered.close()
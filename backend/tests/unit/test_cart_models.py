@@ -0,0 +1,85 @@
+import pytest
+from app.core.config import settings
+from app.models.cart_models import Cart, CartItem, ItemConflict, Modifier
+
+def make_item(item_id, quantity=1):
+    return CartItem(item_id=item_id, quantity=quantity)
+
+def test_items_keep_insertion_order():
+    cart = Cart(conversation_id="conv1")
+    for item_id in ["c", "a", "b"]:
+        cart.add_item(make_item(item_id))
+
+    assert [item.item_id for item in cart.items] == ["c", "a", "b"]
+    assert cart.item_count == 3
+
+def test_adding_existing_item_merges_quantity():
+    cart = Cart(conversation_id="conv1")
+    cart.add_item(make_item("a", 2))
+    cart.add_item(make_item("b"))
+    stored = cart.add_item(make_item("a", 3))
+
+    assert stored.quantity == 5
+    assert [item.item_id for item in cart.items] == ["a", "b"]
+
+def test_item_with_other_modifiers_or_instructions_conflicts():
+    cart = Cart(conversation_id="conv1")
+    cart.add_item(CartItem(item_id="a", quantity=1, modifiers=[Modifier(id="cheese", quantity=1)]))
+
+    with pytest.raises(ItemConflict, match="other modifiers or instructions"):
+        cart.add_item(CartItem(item_id="a", quantity=2, special_instructions="No onions"))
+    with pytest.raises(ItemConflict):
+        cart.add_item(make_item("a"))
+    stored = cart.add_item(CartItem(item_id="a", quantity=2, modifiers=[Modifier(id="cheese", quantity=1)]))
+
+    assert stored.quantity == 3
+    assert cart.item_count == 1
+    assert cart.get_item("a").special_instructions is None
+
+def test_merged_quantity_is_bounded():
+    cart = Cart(conversation_id="conv1")
+    cart.add_item(make_item("a", 10))
+
+    with pytest.raises(ValueError, match="Maximum quantity"):
+        cart.add_item(make_item("a", 3))
+    assert cart.get_item("a").quantity == 10
+
+def test_cart_item_limit():
+    cart = Cart(conversation_id="conv1")
+    for i in range(settings.MAX_CART_ITEMS):
+        cart.add_item(make_item(f"item{i}"))
+
+    with pytest.raises(ValueError, match="Maximum 50 items"):
+        cart.add_item(make_item("one-too-many"))
+
+def test_replace_item_keeps_position():
+    cart = Cart(conversation_id="conv1", items=[make_item("a"), make_item("b"), make_item("c")])
+
+    cart.replace_item("b", make_item("b", 4))
+    cart.replace_item("a", make_item("z"))
+
+    assert [item.item_id for item in cart.items] == ["z", "b", "c"]
+    assert cart.get_item("b").quantity == 4
+    assert cart.get_item("a") is None
+
+def test_replace_item_rejects_id_collision():
+    cart = Cart(conversation_id="conv1", items=[make_item("a"), make_item("b")])
+
+    with pytest.raises(ItemConflict, match="already in cart"):
+        cart.replace_item("a", make_item("b"))
+
+def test_remove_item():
+    cart = Cart(conversation_id="conv1", items=[make_item("a"), make_item("b")])
+
+    cart.remove_item("a")
+
+    assert [item.item_id for item in cart.items] == ["b"]
+    with pytest.raises(ValueError, match="Item not found"):
+        cart.remove_item("a")
+
+def test_items_serialized_in_order():
+    cart = Cart(conversation_id="conv1", items=[make_item("b"), make_item("a")])
+
+    data = cart.model_dump()
+
+    assert [item["item_id"] for item in data["items"]] == ["b", "a"]
@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+from app.models.cart_models import Cart, CartItem, InstructionStatus
+from app.services.cart_records import from_record, to_record
+
+def make_cart():
+    return Cart(
+        conversation_id="conv1",
+        created_at=datetime(2024, 5, 1, 12, 30, 15, 123456),
+        version=3,
+        items=[
+            CartItem(
+                item_id="pizza1",
+                quantity=2,
+                special_instructions="Extra spicy",
+                modifiers=[{"id": "cheese", "quantity": 1}, {"id": "olives", "quantity": 2}],
+                instructions_status=InstructionStatus.DONE,
+                instructions_analysis={"spice_level": "hot", "allergies": ["nuts"]}
+            ),
+            CartItem(item_id="soda", quantity=1)
+        ]
+    )
+
+def test_round_trip_preserves_cart():
+    cart = make_cart()
+
+    restored = from_record(to_record(cart))
+
+    assert restored.model_dump() == cart.model_dump()
+    assert restored.etag == cart.etag
+    assert [item.item_id for item in restored.items] == ["pizza1", "soda"]
+
+def test_ids_are_shared_between_carts():
+    first = to_record(make_cart())
+    second = to_record(Cart(
+        conversation_id="conv2",
+        items=[CartItem(item_id="".join(["pizz", "a1"]), quantity=1)]
+    ))
+
+    assert first.items[0].item_id is second.items[0].item_id
+
+def test_empty_modifiers_stored_as_empty_tuple():
+    record = to_record(make_cart())
+
+    assert record.items[1].modifiers == ()
+
+def test_aware_timestamps_are_stored_as_utc():
+    cart = Cart(conversation_id="conv1", updated_at=datetime(2024, 5, 1, 12, tzinfo=timezone.utc))
+
+    assert from_record(to_record(cart)).updated_at == datetime(2024, 5, 1, 12)
+
+def test_restored_cart_is_independent():
+    record = to_record(make_cart())
+    cart = from_record(record)
+
+    cart.remove_item("soda")
+
+    assert len(from_record(record).items) == 2
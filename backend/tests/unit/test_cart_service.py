@@ -1,7 +1,17 @@
+import json
 import pytest
 from datetime import datetime, timedelta
 from app.services.cart_service import CartService
-from app.models.cart_models import Cart, CartItem, Modifier
+from app.models.cart_models import (
+    AddItemOperation,
+    Cart,
+    CartItem,
+    ClearCartOperation,
+    InstructionStatus,
+    Modifier,
+    RemoveItemOperation,
+    UpdateItemOperation
+)
 
 @pytest.fixture
 def cart_service():
@@ -105,10 +115,90 @@ def test_clear_cart(cart_service, sample_cart_item):
 
 def test_cleanup_old_carts(cart_service, sample_cart_item):
     conversation_id = "test123"
+    cart_service.add_item("fresh", CartItem(item_id="item1", quantity=1))
     cart = cart_service.add_item(conversation_id, sample_cart_item)
     
-    # Set cart's created_at to be older than MAX_CONVERSATION_AGE
-    cart.created_at = datetime.utcnow() - timedelta(days=2)
+    # Expiry follows the last update; store the backdated cart so its
+    # deadline is rescheduled
+    cart.updated_at = datetime.utcnow() - timedelta(days=2)
+    cart_service._store.save(cart)
     
-    cart_service.cleanup_old_carts()
-    assert cart_service.get_cart(conversation_id) is None 
\ No newline at end of file
+    assert cart_service.cleanup_old_carts() == 1
+    assert cart_service.get_cart(conversation_id) is None
+    assert cart_service.get_cart("fresh") is not None
+
+
+def test_apply_operations_in_order(cart_service, sample_cart_item):
+    conversation_id = "test123"
+    cart_service.add_item(conversation_id, sample_cart_item)
+
+    cart = cart_service.apply_operations(conversation_id, [
+        AddItemOperation(op="add", item=CartItem(item_id="item2", quantity=1)),
+        UpdateItemOperation(op="update", item_id="item1", item=CartItem(item_id="item1", quantity=5)),
+        AddItemOperation(op="add", item=CartItem(item_id="item3", quantity=1)),
+        RemoveItemOperation(op="remove", item_id="item2")
+    ])
+
+    assert [item.item_id for item in cart.items] == ["item1", "item3"]
+    assert cart.get_item("item1").quantity == 5
+    assert cart_service.get_cart(conversation_id).item_count == 2
+
+def test_apply_operations_is_atomic(cart_service, sample_cart_item):
+    conversation_id = "test123"
+    cart_service.add_item(conversation_id, sample_cart_item)
+
+    with pytest.raises(ValueError, match="Operation 2 \\(remove\\) failed"):
+        cart_service.apply_operations(conversation_id, [
+            ClearCartOperation(op="clear"),
+            AddItemOperation(op="add", item=CartItem(item_id="item2", quantity=1)),
+            RemoveItemOperation(op="remove", item_id="nonexistent")
+        ])
+
+    cart = cart_service.get_cart(conversation_id)
+    assert [item.item_id for item in cart.items] == ["item1"]
+
+def test_apply_operations_creates_cart(cart_service):
+    cart = cart_service.apply_operations("new123", [
+        AddItemOperation(op="add", item=CartItem(item_id="item1", quantity=1))
+    ])
+
+    assert cart.version == 1
+    assert cart_service.get_cart("new123").item_count == 1
+
+def test_mutations_bump_version(cart_service, sample_cart_item):
+    cart = cart_service.add_item("test123", sample_cart_item)
+    assert cart.version == 1
+    first_etag = cart.etag
+
+    cart = cart_service.remove_item("test123", sample_cart_item.item_id)
+
+    assert cart.version == 2
+    assert cart.etag != first_etag
+    assert cart_service.get_cart_response(cart).version == 2
+
+def test_instruction_analysis_bumps_version(cart_service, sample_cart_item):
+    cart_service.add_item("test123", sample_cart_item)
+
+    cart_service.apply_instruction_analysis(
+        "test123", "item1", "Extra spicy", InstructionStatus.FAILED
+    )
+
+    assert cart_service.get_cart("test123").version == 2
+
+def test_render_cart_response_matches_model(cart_service, sample_cart_item):
+    cart = cart_service.add_item("test123", sample_cart_item)
+
+    body = cart_service.render_cart_response(cart)
+
+    expected = json.loads(cart_service.get_cart_response(cart).model_dump_json())
+    assert json.loads(body) == expected
+
+def test_render_cart_response_cached_per_version(cart_service, sample_cart_item):
+    cart = cart_service.add_item("test123", sample_cart_item)
+    first = cart_service.render_cart_response(cart)
+
+    assert cart_service.render_cart_response(cart) is first
+
+    cart = cart_service.remove_item("test123", sample_cart_item.item_id)
+    assert json.loads(cart_service.render_cart_response(cart))["items"] == []
+    assert cart_service.stats()["response_cache"]["hits"] == 1
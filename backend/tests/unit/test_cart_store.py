@@ -0,0 +1,204 @@
+import sqlite3
+import threading
+import pytest
+from datetime import datetime, timedelta
+from app.models.cart_models import Cart, CartItem, InstructionStatus
+from app.services.cart_service import CartService
+from app.services.cart_store import CartVersionConflict, MemoryCartStore, create_cart_store
+from app.services.sqlite_cart_store import SQLiteCartStore
+from app.utils.ulid import ULIDGenerator
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        store = MemoryCartStore()
+    else:
+        store = SQLiteCartStore(str(tmp_path / "carts.db"), pool_size=2)
+    yield store
+    store.close()
+
+def make_cart(conversation_id, *item_ids):
+    return Cart(
+        conversation_id=conversation_id,
+        items=[CartItem(item_id=item_id, quantity=1) for item_id in item_ids]
+    )
+
+def test_save_and_get_round_trip(store):
+    store.save(make_cart("conv1", "a", "b"))
+
+    cart = store.get("conv1")
+
+    assert [item.item_id for item in cart.items] == ["a", "b"]
+    assert store.get("missing") is None
+    assert store.count() == 1
+
+def test_save_many(store):
+    store.save_many([make_cart(f"conv{i}", "a") for i in range(10)])
+
+    assert store.count() == 10
+
+def test_delete(store):
+    store.save(make_cart("conv1"))
+
+    assert store.delete("conv1")
+    assert not store.delete("conv1")
+    assert store.get("conv1") is None
+
+def test_evict_expired_honors_limit(store):
+    store.save_many([make_cart(f"conv{i}") for i in range(5)])
+    later = datetime.utcnow() + store.max_age + timedelta(seconds=1)
+
+    assert store.evict_expired(later, limit=3) == 3
+    assert store.evict_expired(later, limit=3) == 2
+    assert store.count() == 0
+
+def test_evict_expired_keeps_live_carts(store):
+    store.save(make_cart("conv1"))
+
+    assert store.evict_expired(datetime.utcnow(), limit=10) == 0
+    assert store.count() == 1
+
+def test_cart_service_persists_mutations(store):
+    service = CartService(store)
+    service.add_item("conv1", CartItem(item_id="a", quantity=1, special_instructions="Spicy",
+                                       instructions_status=InstructionStatus.PENDING))
+    service.add_item("conv1", CartItem(item_id="a", quantity=2, special_instructions="Spicy"))
+    service.apply_instruction_analysis("conv1", "a", "Spicy", InstructionStatus.DONE)
+
+    item = service.get_cart("conv1").get_item("a")
+    assert item.quantity == 3
+    assert item.instructions_status == InstructionStatus.DONE
+
+def test_sqlite_store_shared_between_processes(tmp_path):
+    path = str(tmp_path / "carts.db")
+    first = CartService(SQLiteCartStore(path, pool_size=1))
+    second = CartService(SQLiteCartStore(path, pool_size=1))
+
+    first.add_item("conv1", CartItem(item_id="a", quantity=1))
+    second.add_item("conv1", CartItem(item_id="b", quantity=1))
+
+    assert [item.item_id for item in first.get_cart("conv1").items] == ["a", "b"]
+
+def test_sqlite_store_rejects_stale_writes(tmp_path):
+    path = str(tmp_path / "carts.db")
+    first = CartService(SQLiteCartStore(path, pool_size=1))
+    second = CartService(SQLiteCartStore(path, pool_size=1))
+    first.add_item("conv1", CartItem(item_id="a", quantity=1))
+    stale = first.get_cart("conv1")
+
+    second.add_item("conv1", CartItem(item_id="b", quantity=1))
+    stale.add_item(CartItem(item_id="c", quantity=1))
+
+    with pytest.raises(CartVersionConflict):
+        first._touch(stale)
+    cart = first.get_cart("conv1")
+    assert [item.item_id for item in cart.items] == ["a", "b"]
+    assert cart.version == 2
+    assert first.stats()["version_conflicts"] == 1
+    first.close()
+    second.close()
+
+def test_sqlite_store_conflicting_new_carts(tmp_path):
+    store = SQLiteCartStore(str(tmp_path / "carts.db"), pool_size=1)
+    store.save(make_cart("conv1", "a").model_copy(update={"version": 1}), expected_version=0)
+
+    with pytest.raises(CartVersionConflict):
+        store.save(make_cart("conv1", "b").model_copy(update={"version": 1}), expected_version=0)
+    with pytest.raises(CartVersionConflict):
+        store.save(make_cart("missing", "a").model_copy(update={"version": 3}), expected_version=2)
+    assert [item.item_id for item in store.get("conv1").items] == ["a"]
+    store.close()
+
+def test_sqlite_store_groups_concurrent_writes(tmp_path):
+    store = SQLiteCartStore(str(tmp_path / "carts.db"), pool_size=1)
+    threads = [
+        threading.Thread(target=store.save, args=(make_cart(f"conv{index}", "a"),))
+        for index in range(50)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert store.count() == 50
+    assert store.stats()["writes"] == 50
+    assert store.stats()["write_batches"] <= 50
+    store.close()
+
+def test_sqlite_store_adds_version_column(tmp_path):
+    path = str(tmp_path / "carts.db")
+    cart = make_cart("conv1", "a").model_copy(update={"version": 4})
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE carts (conversation_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)")
+    conn.execute("INSERT INTO carts VALUES (?, ?, ?)", ("conv1", cart.model_dump_json(), 0.0))
+    conn.commit()
+    conn.close()
+
+    store = SQLiteCartStore(path, pool_size=1)
+
+    cart.version = 5
+    store.save(cart, expected_version=4)
+    assert store.get("conv1").version == 5
+    store.close()
+
+@pytest.mark.asyncio
+async def test_blocking_stores_run_off_the_event_loop(tmp_path):
+    memory = CartService(MemoryCartStore())
+    sqlite = CartService(SQLiteCartStore(str(tmp_path / "carts.db"), pool_size=2))
+
+    assert await memory.run(threading.current_thread) is threading.current_thread()
+    assert (await sqlite.run(threading.current_thread)).name.startswith("cart-store")
+    await sqlite.run(sqlite.add_item, "conv1", CartItem(item_id="a", quantity=1))
+    assert (await sqlite.run(sqlite.get_cart, "conv1")).version == 1
+    sqlite.close()
+
+def test_unknown_storage_type():
+    with pytest.raises(ValueError, match="Unknown storage type"):
+        create_cart_store("redis")
+
+def test_memory_store_evicts_whole_buckets_past_lifetime():
+    now = datetime(2024, 1, 1)
+    store = MemoryCartStore(shards=4, max_age=86400, max_lifetime=3600, lifetime_bucket=600)
+    generator = ULIDGenerator(clock=lambda: int((now - datetime(1970, 1, 1)).total_seconds()) * 10**9)
+    old_ids = [generator.new() for _ in range(3)]
+    client_ids = ["client-chosen", "0123456789abcdef0123456789abcdef", old_ids[0].lower()]
+    for conversation_id in old_ids + client_ids:
+        store.save(Cart(conversation_id=conversation_id, updated_at=now + timedelta(hours=2)))
+
+    # Still inside the lifetime bucket, although past the lifetime itself.
+    assert store.evict_expired(now + timedelta(seconds=3601), limit=10) == 0
+    assert store.evict_expired(now + timedelta(seconds=4200), limit=2) == 2
+    assert store.evict_expired(now + timedelta(seconds=4200), limit=10) == 1
+    assert store.count() == 3
+    assert all(store.get(conversation_id) is not None for conversation_id in client_ids)
+    assert store.stats()["lifetime_evicted"] == 3
+
+def test_memory_store_keeps_recent_carts_live():
+    store = MemoryCartStore(hot_carts=2)
+    for conversation_id in ("conv1", "conv2", "conv3"):
+        store.save(make_cart(conversation_id, "a"))
+
+    assert store.get("conv3") is store.get("conv3")
+    # Pushed out of the hot set, so rebuilt from its record.
+    cold = store.get("conv1")
+    assert [item.item_id for item in cold.items] == ["a"]
+    assert store.stats()["hot_carts"] == 2
+    assert store.stats()["hot_misses"] == 1
+
+    store.delete("conv1")
+    assert store.get("conv1") is None
+    store.clear()
+    assert store.get("conv3") is None
+
+def test_sqlite_writer_survives_a_failing_write(tmp_path):
+    store = SQLiteCartStore(str(tmp_path / "carts.db"), pool_size=1)
+
+    def broken(conn):
+        raise TypeError("bad row")
+
+    with pytest.raises(TypeError):
+        store._write(broken)
+    store.save(make_cart("conv1", "a"))
+
+    assert store.get("conv1") is not None
+    store.close()
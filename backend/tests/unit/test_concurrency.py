@@ -0,0 +1,23 @@
+import asyncio
+import pytest
+from app.utils.concurrency import ConcurrencyLimiter
+
+@pytest.mark.asyncio
+async def test_rejects_when_no_slot_frees_in_time():
+    limiter = ConcurrencyLimiter(limit=1, max_wait=0.01)
+
+    assert await limiter.acquire()
+    assert not await limiter.acquire()
+    assert limiter.stats() == {"limit": 1, "active": 1, "rejected": 1}
+
+@pytest.mark.asyncio
+async def test_waiter_gets_released_slot():
+    limiter = ConcurrencyLimiter(limit=1, max_wait=1)
+    await limiter.acquire()
+
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    limiter.release()
+
+    assert await waiter
+    assert limiter.active == 1
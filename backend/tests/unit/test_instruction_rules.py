@@ -0,0 +1,81 @@
+import pytest
+from app.services.instruction_rules import InstructionRuleMatcher, load_instruction_rules
+
+@pytest.fixture(scope="module")
+def matcher():
+    return load_instruction_rules()
+
+@pytest.mark.parametrize("text, spice_level", [
+    ("extra spicy", "hot"),
+    ("not spicy", "mild"),
+    ("medium spicy please", "medium"),
+])
+def test_spice_levels(matcher, text, spice_level):
+    assert matcher.match(text)["spice_level"] == spice_level
+
+@pytest.mark.parametrize("text", ["nut allergy", "allergic to tree nuts", "nut-free"])
+def test_allergies_use_canonical_names(matcher, text):
+    assert matcher.match(text)["allergies"] == ["nuts"]
+
+def test_preferences_in_text_order(matcher):
+    result = matcher.match("extra cheese, without onions and hold the mayo")
+
+    assert result["preferences"] == ["extra cheese", "no onions", "no mayo"]
+
+def test_special_requests(matcher):
+    result = matcher.match("sauce on the side and well done")
+
+    assert result["special_requests"] == ["sauce on the side", "well done"]
+
+def test_combined_instructions(matcher):
+    result = matcher.match("i'm allergic to peanuts, very spicy, no cilantro")
+
+    assert result == {
+        "spice_level": "hot",
+        "allergies": ["peanuts"],
+        "preferences": ["no cilantro"],
+        "special_requests": []
+    }
+
+def test_free_form_text_is_not_confident(matcher):
+    result, confidence = matcher.parse("extra spicy but deliver to the back door")
+
+    assert confidence < matcher.min_confidence
+    assert matcher.match("make it taste like grandma used to") is None
+
+@pytest.mark.parametrize("text", [
+    "i am not allergic to nuts, extra cheese and extra spicy",
+    "no nut allergy",
+    "i don't have a peanut allergy",
+    "i'm not sure it should be spicy",
+    "never spicy",
+])
+def test_negated_allergy_or_spice_falls_through(matcher, text):
+    assert matcher.parse(text)[1] == 0.0
+    assert matcher.match(text) is None
+
+@pytest.mark.parametrize("text", ["hot sauce on the side", "extra hot sauce", "hot dog, well done"])
+def test_spice_word_in_compound_falls_through(matcher, text):
+    assert matcher.match(text) is None
+
+@pytest.mark.parametrize("text", ["spicy but not too spicy", "mild, actually make it hot"])
+def test_conflicting_spice_levels_fall_through(matcher, text):
+    assert matcher.parse(text)[1] == 0.0
+    assert matcher.match(text) is None
+
+def test_repeated_spice_level_is_confident(matcher):
+    assert matcher.match("spicy, very spicy")["spice_level"] == "hot"
+
+def test_negation_in_other_clause_is_ignored(matcher):
+    result = matcher.match("no onions, nut allergy, not spicy")
+
+    assert result["allergies"] == ["nuts"]
+    assert result["spice_level"] == "mild"
+    assert result["preferences"] == ["no onions"]
+
+def test_hit_rate_counters():
+    matcher = InstructionRuleMatcher({"spice_levels": {"hot": ["spicy"]}})
+    matcher.match("spicy")
+    matcher.match("something else entirely")
+
+    assert matcher.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
@@ -0,0 +1,215 @@
+import asyncio
+import sqlite3
+import pytest
+from app.models.cart_models import CartItem, InstructionStatus
+from app.services.cart_service import CartService
+from app.services.cart_store import MemoryCartStore
+from app.services.instruction_worker import InstructionWorkerPool
+
+class StubAI:
+    def __init__(self, result=None, error=None, gate=None):
+        self.result = result or {"spice_level": "hot", "allergies": ["nuts"]}
+        self.error = error
+        self.gate = gate
+        self.calls = []
+
+    async def process_cart_instructions(self, instructions):
+        self.calls.append(instructions)
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class FailingStore(MemoryCartStore):
+    """Memory store whose next `failures` saves raise a database error."""
+
+    def __init__(self):
+        super().__init__()
+        self.failures = 0
+
+    def save(self, cart, expected_version=None):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        super().save(cart, expected_version)
+
+@pytest.fixture
+def cart_service():
+    return CartService()
+
+def add_pending_item(cart_service, item_id="item1", instructions="Extra spicy"):
+    item = CartItem(
+        item_id=item_id,
+        quantity=1,
+        special_instructions=instructions,
+        instructions_status=InstructionStatus.PENDING
+    )
+    cart_service.add_item("conv1", item)
+    return item
+
+def stored_item(cart_service, item_id="item1"):
+    """Re-read an item; stores may hand out copies rather than live carts."""
+    return cart_service.get_cart("conv1").get_item(item_id)
+
+async def drain(pool):
+    await asyncio.wait_for(pool._queue.join(), timeout=1)
+
+@pytest.mark.asyncio
+async def test_analysis_attached_to_stored_item(cart_service):
+    pool = InstructionWorkerPool(StubAI(), cart_service, workers=2, max_queue=10)
+    await pool.start()
+    add_pending_item(cart_service)
+
+    assert await pool.submit("conv1", "item1", "Extra spicy")
+    await drain(pool)
+
+    item = stored_item(cart_service)
+    assert item.instructions_status == InstructionStatus.DONE
+    assert item.instructions_analysis.spice_level == "hot"
+    assert item.instructions_analysis.allergies == ["nuts"]
+    await pool.stop()
+
+@pytest.mark.asyncio
+async def test_failed_analysis_marks_item_failed(cart_service):
+    pool = InstructionWorkerPool(
+        StubAI(error=RuntimeError("boom")), cart_service, workers=1, max_queue=10
+    )
+    await pool.start()
+    add_pending_item(cart_service)
+
+    await pool.submit("conv1", "item1", "Extra spicy")
+    await drain(pool)
+
+    item = stored_item(cart_service)
+    assert item.instructions_status == InstructionStatus.FAILED
+    assert item.instructions_analysis is None
+    assert pool.stats()["failed"] == 1
+    await pool.stop()
+
+@pytest.mark.asyncio
+async def test_result_for_edited_instructions_is_discarded(cart_service):
+    gate = asyncio.Event()
+    pool = InstructionWorkerPool(StubAI(gate=gate), cart_service, workers=1, max_queue=10)
+    await pool.start()
+    add_pending_item(cart_service)
+    await pool.submit("conv1", "item1", "Extra spicy")
+    await asyncio.sleep(0)
+
+    edited = CartItem(
+        item_id="item1",
+        quantity=1,
+        special_instructions="Mild",
+        instructions_status=InstructionStatus.PENDING
+    )
+    cart_service.update_item("conv1", "item1", edited)
+    gate.set()
+    await drain(pool)
+
+    assert stored_item(cart_service).instructions_status == InstructionStatus.PENDING
+    await pool.stop()
+
+@pytest.mark.asyncio
+async def test_reject_policy_fails_new_job_when_full(cart_service):
+    gate = asyncio.Event()
+    pool = InstructionWorkerPool(
+        StubAI(gate=gate), cart_service, workers=1, max_queue=1, policy="reject"
+    )
+    await pool.start()
+    for i in range(3):
+        add_pending_item(cart_service, item_id=f"item{i}")
+
+    assert await pool.submit("conv1", "item0", "Extra spicy")
+    await asyncio.sleep(0)
+    assert await pool.submit("conv1", "item1", "Extra spicy")
+    assert not await pool.submit("conv1", "item2", "Extra spicy")
+
+    cart = cart_service.get_cart("conv1")
+    assert cart.items[2].instructions_status == InstructionStatus.FAILED
+    assert pool.stats()["rejected"] == 1
+    gate.set()
+    await pool.stop()
+
+@pytest.mark.asyncio
+async def test_drop_oldest_policy_makes_room(cart_service):
+    gate = asyncio.Event()
+    pool = InstructionWorkerPool(
+        StubAI(gate=gate), cart_service, workers=1, max_queue=1, policy="drop_oldest"
+    )
+    await pool.start()
+    for i in range(3):
+        add_pending_item(cart_service, item_id=f"item{i}")
+
+    await pool.submit("conv1", "item0", "Extra spicy")
+    await asyncio.sleep(0)
+    await pool.submit("conv1", "item1", "Extra spicy")
+    assert await pool.submit("conv1", "item2", "Extra spicy")
+    gate.set()
+    await drain(pool)
+
+    cart = cart_service.get_cart("conv1")
+    assert cart.items[1].instructions_status == InstructionStatus.FAILED
+    assert cart.items[2].instructions_status == InstructionStatus.DONE
+    assert pool.stats()["dropped"] == 1
+    await pool.stop()
+
+@pytest.mark.asyncio
+async def test_submit_without_workers_fails_item(cart_service):
+    pool = InstructionWorkerPool(StubAI(), cart_service)
+    add_pending_item(cart_service)
+
+    assert not await pool.submit("conv1", "item1", "Extra spicy")
+    assert stored_item(cart_service).instructions_status == InstructionStatus.FAILED
+
+def test_unknown_policy_rejected(cart_service):
+    with pytest.raises(ValueError, match="Unknown queue policy"):
+        InstructionWorkerPool(StubAI(), cart_service, policy="spill")
+
+@pytest.mark.asyncio
+async def test_submit_many_analyzes_items_as_one_job(cart_service):
+    ai = StubAI()
+    pool = InstructionWorkerPool(ai, cart_service, workers=1, max_queue=1)
+    await pool.start()
+    add_pending_item(cart_service, item_id="item1", instructions="Extra spicy")
+    add_pending_item(cart_service, item_id="item2", instructions="No onions")
+
+    assert await pool.submit_many("conv1", [("item1", "Extra spicy"), ("item2", "No onions")])
+    await drain(pool)
+
+    assert sorted(ai.calls) == ["Extra spicy", "No onions"]
+    assert stored_item(cart_service, "item1").instructions_status == InstructionStatus.DONE
+    assert stored_item(cart_service, "item2").instructions_status == InstructionStatus.DONE
+    assert pool.stats()["submitted"] == 2
+    await pool.stop()
+
+@pytest.mark.asyncio
+async def test_store_error_does_not_stop_worker():
+    store = FailingStore()
+    cart_service = CartService(store)
+    pool = InstructionWorkerPool(StubAI(), cart_service, workers=1, max_queue=10)
+    await pool.start()
+    add_pending_item(cart_service, item_id="item1")
+    add_pending_item(cart_service, item_id="item2")
+
+    store.failures = 1
+    await pool.submit("conv1", "item1", "Extra spicy")
+    await drain(pool)
+    await pool.submit("conv1", "item2", "Extra spicy")
+    await drain(pool)
+
+    assert pool.running
+    assert stored_item(cart_service, "item2").instructions_status == InstructionStatus.DONE
+    assert pool.stats()["failed"] == 1
+    assert pool.stats()["completed"] == 1
+    await pool.stop()
+
+@pytest.mark.asyncio
+async def test_store_error_while_failing_item_is_not_raised():
+    store = FailingStore()
+    cart_service = CartService(store)
+    pool = InstructionWorkerPool(StubAI(), cart_service)
+    add_pending_item(cart_service)
+
+    store.failures = 1
+    assert not await pool.submit("conv1", "item1", "Extra spicy")
+    assert pool.stats()["failed"] == 1
@@ -0,0 +1,66 @@
+from app.utils.latency import LatencyTracker
+
+def make_tracker(**overrides):
+    options = dict(
+        window=100, percentile=0.99, multiplier=2.0,
+        min_timeout=0.5, max_timeout=30.0, min_samples=10
+    )
+    options.update(overrides)
+    return LatencyTracker(**options)
+
+def test_uses_max_timeout_until_enough_samples():
+    tracker = make_tracker()
+    for _ in range(9):
+        tracker.record(1.0)
+
+    assert tracker.timeout() == 30.0
+
+def test_timeout_follows_observed_percentile():
+    tracker = make_tracker()
+    for _ in range(99):
+        tracker.record(1.0)
+    tracker.record(2.0)
+
+    assert tracker.quantile(0.5) == 1.0
+    assert tracker.timeout() == 2.0
+
+def test_timeout_is_clamped():
+    fast = make_tracker()
+    slow = make_tracker()
+    for _ in range(10):
+        fast.record(0.01)
+        slow.record(100.0)
+
+    assert fast.timeout() == 0.5
+    assert slow.timeout() == 30.0
+
+def test_window_drops_old_samples():
+    tracker = make_tracker(window=10)
+    for _ in range(10):
+        tracker.record(10.0)
+    for _ in range(10):
+        tracker.record(1.0)
+
+    assert len(tracker) == 10
+    assert tracker.timeout() == 2.0
+
+def test_timeouts_raise_the_timeout():
+    tracker = make_tracker(window=10, fallback_after=100)
+    for _ in range(10):
+        tracker.record(1.0)
+    assert tracker.timeout() == 2.0
+
+    tracker.record_timeout(2.0)
+
+    assert tracker.timeout() == 4.0
+
+def test_falls_back_to_max_timeout_after_consecutive_timeouts():
+    tracker = make_tracker(fallback_after=3)
+    for _ in range(20):
+        tracker.record(1.0)
+    for _ in range(3):
+        tracker.record_timeout(tracker.timeout())
+
+    assert tracker.timeout() == 30.0
+    tracker.record(1.0)
+    assert tracker.timeout() < 30.0
@@ -0,0 +1,103 @@
+import json
+import logging
+import queue
+import yaml
+from app.core.config import CONFIG_PATH, Settings, load_config
+from app.core.log_config import DroppingQueueHandler, JsonFormatter, LevelSampler, LogPipeline
+
+def make_record(level=logging.INFO, msg="hello %s", args=("world",), **extra):
+    record = logging.makeLogRecord({
+        "name": "app.test", "levelno": level, "levelname": logging.getLevelName(level),
+        "msg": msg, "args": args
+    })
+    record.__dict__.update(extra)
+    return record
+
+def test_json_formatter_includes_extra_fields():
+    entry = json.loads(JsonFormatter().format(make_record(status=200, path="/cart")))
+
+    assert entry["message"] == "hello world"
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "app.test"
+    assert entry["status"] == 200
+    assert entry["path"] == "/cart"
+    assert entry["ts"].endswith("Z")
+
+def test_full_queue_drops_and_counts():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+
+    handler.handle(make_record())
+    handler.handle(make_record())
+
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 1
+
+def test_queued_records_carry_resolved_message():
+    handler = DroppingQueueHandler(queue.Queue())
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = make_record(exc_info=True)
+        record.exc_info = __import__("sys").exc_info()
+        handler.handle(record)
+
+    queued = handler.queue.get_nowait()
+    assert queued.getMessage() == "hello world"
+    assert queued.args is None
+    assert "ValueError: boom" in queued.exc_text
+    # Handlers on parent loggers still see the record as it was logged.
+    assert record.args == ("world",)
+    assert record.exc_info is not None
+
+def test_level_sampler_applies_rate_per_level():
+    sampler = LevelSampler({logging.INFO: 0.0})
+
+    assert not sampler.filter(make_record(logging.INFO))
+    assert sampler.filter(make_record(logging.WARNING))
+    assert sampler.sampled_out == 1
+
+def test_pipeline_writes_json_lines_on_writer_thread(tmp_path):
+    path = tmp_path / "logs" / "app.log"
+    pipeline = LogPipeline(path=str(path), level="INFO", max_queue=100, json=True)
+    pipeline.start()
+    try:
+        logging.getLogger("app.test").info("order %s placed", "abc", extra={"items": 3})
+    finally:
+        pipeline.stop()
+
+    entries = [json.loads(line) for line in path.read_text().splitlines()]
+    assert entries[-1]["message"] == "order abc placed"
+    assert entries[-1]["items"] == 3
+    assert pipeline.handler not in logging.getLogger("app").handlers
+
+def test_log_section_of_config_yaml_maps_to_settings():
+    section = yaml.safe_load(CONFIG_PATH.read_text())["log"]
+
+    for key in section:
+        assert f"LOG_{key.upper()}" in Settings.model_fields
+
+def test_yaml_log_values_reach_settings(tmp_path, monkeypatch):
+    config = tmp_path / "config.yaml"
+    config.write_text("log:\n  queue_size: 123\n  json: false\n  access_sample_info: 0.5\n")
+    for key in ("LOG_QUEUE_SIZE", "LOG_JSON", "LOG_ACCESS_SAMPLE_INFO"):
+        # Set then delete, so the value load_config exports is undone too.
+        monkeypatch.setenv(key, "")
+        monkeypatch.delenv(key)
+
+    loaded = load_config(config)
+
+    assert loaded.LOG_QUEUE_SIZE == 123
+    assert loaded.LOG_JSON is False
+    assert loaded.LOG_ACCESS_SAMPLE_INFO == 0.5
+
+def test_pipeline_registers_exit_hook_once(tmp_path, monkeypatch):
+    from app.core import log_config
+
+    registered = []
+    monkeypatch.setattr(log_config.atexit, "register", registered.append)
+    pipeline = LogPipeline(path=str(tmp_path / "app.log"), level="INFO", max_queue=100, json=True)
+    for _ in range(2):
+        pipeline.start()
+        pipeline.stop()
+
+    assert registered == [pipeline.stop]
@@ -0,0 +1,41 @@
+from prometheus_client import CollectorRegistry
+from app.core.metrics import StatsCollector
+from app.models.cart_models import CartItem
+from app.services import sqlite_cart_store
+from app.services.cart_service import CartService
+from app.services.sqlite_cart_store import SQLiteCartStore
+
+def test_stats_collector_exports_numeric_leaves():
+    registry = CollectorRegistry()
+    registry.register(StatsCollector({
+        "ai": lambda: {
+            "breaker": {"state": "open", "rejected": 3},
+            "latency": {"summary": {"p50": None, "timeout": 2.5}},
+            "enabled": True
+        }
+    }))
+
+    assert registry.get_sample_value("app_ai_breaker_rejected") == 3
+    assert registry.get_sample_value("app_ai_latency_summary_timeout") == 2.5
+    assert registry.get_sample_value("app_ai_breaker_state") is None
+    assert registry.get_sample_value("app_ai_latency_summary_p50") is None
+    assert registry.get_sample_value("app_ai_enabled") is None
+
+def test_cart_stats_scrape_does_not_count_sqlite_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite_cart_store, "_COUNT_INTERVAL", 0)
+    store = SQLiteCartStore(str(tmp_path / "carts.db"), pool_size=1)
+    service = CartService(store)
+    service.add_item("conv1", CartItem(item_id="a", quantity=1))
+    # The writer recounts after each batch, so by the time a later write
+    # returns the count covers the earlier one.
+    service.add_item("conv1", CartItem(item_id="b", quantity=1))
+
+    def count():
+        raise AssertionError("COUNT(*) on the scraping thread")
+
+    monkeypatch.setattr(store, "count", count)
+    registry = CollectorRegistry()
+    registry.register(StatsCollector({"carts": service.stats}))
+
+    assert registry.get_sample_value("app_carts_carts") == 1
+    service.close()
@@ -0,0 +1,87 @@
+import asyncio
+import pytest
+from app.utils.micro_batcher import MicroBatcher
+
+class RecordingHandler:
+    def __init__(self):
+        self.batches = []
+
+    async def __call__(self, items):
+        self.batches.append(list(items))
+        return [item * 2 for item in items]
+
+@pytest.mark.asyncio
+async def test_items_within_window_share_a_batch():
+    handler = RecordingHandler()
+    batcher = MicroBatcher(handler, max_batch_size=10, max_wait=0.01)
+
+    results = await asyncio.gather(*(batcher.submit(i) for i in range(4)))
+
+    assert results == [0, 2, 4, 6]
+    assert handler.batches == [[0, 1, 2, 3]]
+
+@pytest.mark.asyncio
+async def test_full_batch_flushes_immediately():
+    handler = RecordingHandler()
+    batcher = MicroBatcher(handler, max_batch_size=2, max_wait=10)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(*(batcher.submit(i) for i in range(4))), timeout=1
+    )
+
+    assert results == [0, 2, 4, 6]
+    assert handler.batches == [[0, 1], [2, 3]]
+    assert batcher.stats()["average_batch_size"] == 2
+
+@pytest.mark.asyncio
+async def test_per_item_errors_reach_only_their_caller():
+    async def handler(items):
+        return [ValueError("bad") if item == "bad" else item for item in items]
+
+    batcher = MicroBatcher(handler, max_batch_size=10, max_wait=0.01)
+
+    good, bad = await asyncio.gather(
+        batcher.submit("good"), batcher.submit("bad"), return_exceptions=True
+    )
+
+    assert good == "good"
+    assert isinstance(bad, ValueError)
+
+@pytest.mark.asyncio
+async def test_handler_failure_fails_whole_batch():
+    async def handler(items):
+        raise RuntimeError("upstream down")
+
+    batcher = MicroBatcher(handler, max_batch_size=10, max_wait=0.01)
+
+    results = await asyncio.gather(
+        batcher.submit(1), batcher.submit(2), return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+@pytest.mark.asyncio
+async def test_result_count_mismatch_is_an_error():
+    async def handler(items):
+        return items[:1]
+
+    batcher = MicroBatcher(handler, max_batch_size=10, max_wait=0.01)
+
+    results = await asyncio.gather(
+        batcher.submit(1), batcher.submit(2), return_exceptions=True
+    )
+
+    assert all(isinstance(r, ValueError) for r in results)
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_left_out_of_batch():
+    handler = RecordingHandler()
+    batcher = MicroBatcher(handler, max_batch_size=10, max_wait=0.01)
+
+    cancelled = asyncio.ensure_future(batcher.submit(1))
+    kept = asyncio.ensure_future(batcher.submit(2))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+
+    assert await kept == 4
+    assert handler.batches == [[2]]
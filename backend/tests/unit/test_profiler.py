@@ -0,0 +1,76 @@
+import sys
+import time
+import pytest
+from app.core.profiler import RequestProfiler, collapse_stack
+
+@pytest.fixture
+def profiler(tmp_path):
+    profiler = RequestProfiler(
+        enabled=True, sample_rate=1.0, threshold_ms=0,
+        interval_ms=1, directory=str(tmp_path), max_files=2
+    )
+    yield profiler
+    profiler.close()
+
+def busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+def test_collapse_stack_is_root_first():
+    stack = collapse_stack(sys._getframe())
+
+    assert stack.split(";")[-1].startswith("test_collapse_stack_is_root_first (test_profiler.py:")
+
+@pytest.mark.asyncio
+async def test_slow_sampled_request_written_as_collapsed_stacks(profiler, tmp_path):
+    recording = profiler.maybe_begin()
+    busy_wait(0.05)
+
+    path = await profiler.finish(recording, "GET /api/v1/cart/abc")
+
+    assert path.parent == tmp_path
+    assert "GET_api_v1_cart_abc" in path.name
+    lines = path.read_text().splitlines()
+    assert any("busy_wait" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+@pytest.mark.asyncio
+async def test_fast_requests_are_not_written(profiler, tmp_path):
+    profiler.configure(threshold_ms=10_000)
+    recording = profiler.maybe_begin()
+    busy_wait(0.01)
+
+    assert await profiler.finish(recording, "GET /health") is None
+    assert list(tmp_path.iterdir()) == []
+
+@pytest.mark.asyncio
+async def test_ring_keeps_newest_profiles(profiler, tmp_path):
+    for index in range(3):
+        recording = profiler.maybe_begin()
+        busy_wait(0.02)
+        await profiler.finish(recording, f"GET /request{index}")
+        time.sleep(0.002)
+
+    names = sorted(path.name for path in tmp_path.iterdir())
+    assert len(names) == 2
+    assert "request0" not in "".join(names)
+
+def test_disabled_profiler_samples_nothing(profiler):
+    profiler.configure(enabled=False)
+
+    assert profiler.maybe_begin() is None
+
+def test_configure_rejects_bad_sample_rate(profiler):
+    with pytest.raises(ValueError):
+        profiler.configure(sample_rate=2)
+
+def test_end_returns_stacks_detached_from_the_recording(profiler):
+    recording = profiler.maybe_begin()
+    busy_wait(0.02)
+
+    stacks = profiler.sampler.end(recording)
+    recording.stacks["late sample"] += 1
+
+    assert stacks
+    assert "late sample" not in stacks
@@ -0,0 +1,84 @@
+from app.core.config import settings
+from app.models.cart_models import Cart, CartItem
+from app.services.prompts import (
+    compact_item,
+    estimate_tokens,
+    fit_items,
+    instruction_batch_prompt,
+    instructions_prompt,
+    suggest_prompt,
+    summary_prompt,
+    truncate_text
+)
+
+def test_compact_item_drops_irrelevant_fields():
+    item = CartItem(
+        item_id="pizza1",
+        quantity=2,
+        special_instructions="Extra cheese",
+        modifiers=[{"id": "olives", "quantity": 1}],
+        instructions_status="done",
+        instructions_analysis={"spice_level": "hot"}
+    )
+
+    assert compact_item(item) == {
+        "id": "pizza1",
+        "qty": 2,
+        "note": "Extra cheese",
+        "mods": {"olives": 1}
+    }
+
+def test_compact_item_omits_empty_fields():
+    assert compact_item({"item_id": "soda", "quantity": 1, "modifiers": []}) == {"id": "soda", "qty": 1}
+
+def test_estimate_tokens_rounds_up():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcde") == 2
+
+def test_truncate_text_respects_budget():
+    assert truncate_text("short", 10) == "short"
+    truncated = truncate_text("x" * 100, 5)
+    assert len(truncated) == 20
+    assert truncated.endswith("…")
+
+def test_fit_items_reports_omitted():
+    items = [{"id": f"item{i}", "qty": 1} for i in range(10)]
+
+    kept, omitted = fit_items(items, 20)
+
+    assert kept == items[:len(kept)]
+    assert 0 < len(kept) < 10
+    assert omitted == 10 - len(kept)
+
+def test_summary_prompt_is_compact_and_text_mode():
+    cart = Cart(conversation_id="conv1", items=[CartItem(item_id="pizza1", quantity=2)])
+
+    prompt = summary_prompt(cart)
+
+    assert '{"items":[{"id":"pizza1","qty":2}]}' in prompt.text
+    assert "created_at" not in prompt.text
+    assert prompt.json_mode is False
+    assert prompt.num_predict == min(settings.AI_PROMPT_SUMMARY_OUTPUT_TOKENS, settings.OLLAMA_MAX_TOKENS)
+
+def test_summary_prompt_truncates_large_carts(monkeypatch):
+    monkeypatch.setattr(settings, "AI_PROMPT_CART_TOKENS", 50)
+    cart = Cart(
+        conversation_id="conv1",
+        items=[CartItem(item_id=f"item{i}", quantity=1, special_instructions="x" * 100) for i in range(50)]
+    )
+
+    prompt = summary_prompt(cart)
+
+    assert '"more_items":' in prompt.text
+    assert estimate_tokens(prompt.text) < 50 + settings.AI_PROMPT_TEMPLATE_TOKENS
+
+def test_json_prompts_request_json_mode():
+    assert instructions_prompt("No onions").json_mode
+    assert suggest_prompt([{"item_id": "pizza1", "quantity": 1}], ["vegetarian"]).json_mode
+
+def test_batch_prompt_scales_output_limit():
+    single = instructions_prompt("No onions")
+    batch = instruction_batch_prompt(["No onions", "Extra spicy"])
+
+    assert "1: Extra spicy" in batch.text
+    assert batch.num_predict == min(2 * single.num_predict, settings.OLLAMA_MAX_TOKENS)
@@ -0,0 +1,115 @@
+import asyncio
+import time
+import pytest
+from datetime import timedelta
+from app.core.config import settings
+from app.core.security import (
+    TokenVerifier,
+    conversation_created_ms,
+    create_access_token,
+    generate_conversation_id,
+    get_password_hash_async,
+    verify_conversation_id,
+    verify_password_async
+)
+from app.utils.ulid import ulid_timestamp_ms
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+class CountingVerify:
+    def __init__(self, claims):
+        self.claims = claims
+        self.calls = 0
+
+    def __call__(self, token):
+        self.calls += 1
+        return self.claims
+
+def test_verified_claims_are_cached():
+    verify = CountingVerify({"sub": "user1"})
+    verifier = TokenVerifier(max_entries=10, cache_ttl=60, verify=verify, clock=Clock())
+
+    assert verifier.verify("token") == {"sub": "user1"}
+    assert verifier.verify("token") == {"sub": "user1"}
+    assert verify.calls == 1
+
+def test_cached_claims_expire_with_token():
+    clock = Clock()
+    verify = CountingVerify({"sub": "user1", "exp": clock.now + 5})
+    verifier = TokenVerifier(max_entries=10, cache_ttl=60, verify=verify, clock=clock)
+    verifier.verify("token")
+
+    clock.now += 6
+    verify.claims = None
+
+    assert verifier.verify("token") is None
+    assert verify.calls == 2
+
+def test_rejected_tokens_not_cached():
+    verify = CountingVerify(None)
+    verifier = TokenVerifier(max_entries=10, cache_ttl=60, verify=verify, clock=Clock())
+
+    assert verifier.verify("bad") is None
+    assert verifier.verify("bad") is None
+    assert verify.calls == 2
+    assert verifier.stats()["rejected"] == 2
+
+def test_real_token_round_trip():
+    verifier = TokenVerifier(max_entries=10, cache_ttl=60)
+    token = create_access_token({"sub": "user1"}, expires_delta=timedelta(minutes=5))
+
+    assert verifier.verify(token)["sub"] == "user1"
+    assert verifier.verify(token + "x") is None
+
+@pytest.mark.asyncio
+async def test_bcrypt_runs_off_the_event_loop():
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.001)
+
+    ticker = asyncio.create_task(tick())
+    started = time.perf_counter()
+    hashed = await get_password_hash_async("secret")
+    assert await verify_password_async("secret", hashed)
+    assert not await verify_password_async("wrong", hashed)
+    elapsed = time.perf_counter() - started
+    ticker.cancel()
+
+    # The loop kept running while bcrypt worked.
+    assert ticks > elapsed / 0.001 / 4
+
+def test_conversation_ids_are_compact_and_ordered():
+    ids = [generate_conversation_id() for _ in range(50)]
+
+    assert all(len(conversation_id) == 26 for conversation_id in ids)
+    assert ids == sorted(ids)
+    assert abs(ulid_timestamp_ms(ids[0]) / 1000 - time.time()) < 5
+
+def test_conversation_id_mac(monkeypatch):
+    monkeypatch.setattr(settings, "CONVERSATION_ID_MAC_LENGTH", 8)
+    conversation_id = generate_conversation_id()
+
+    assert len(conversation_id) == 34
+    assert verify_conversation_id(conversation_id)
+    assert not verify_conversation_id(conversation_id.lower())
+    tampered = conversation_id[:25] + ("0" if conversation_id[25] != "0" else "1") + conversation_id[26:]
+    assert not verify_conversation_id(tampered)
+    assert not verify_conversation_id("test123")
+
+def test_only_issued_conversation_ids_have_a_creation_time(monkeypatch):
+    monkeypatch.setattr(settings, "CONVERSATION_ID_MAC_LENGTH", 8)
+    conversation_id = generate_conversation_id()
+
+    assert abs(conversation_created_ms(conversation_id) / 1000 - time.time()) < 5
+    assert conversation_created_ms(conversation_id[:26]) is None
+    assert conversation_created_ms(conversation_id[:26] + "00000000") is None
+    assert conversation_created_ms("0123456789abcdef0123456789abcdef") is None
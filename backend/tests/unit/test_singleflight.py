@@ -0,0 +1,104 @@
+import asyncio
+import pytest
+from app.utils.singleflight import SingleFlight
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    started = 0
+
+    async def work():
+        nonlocal started
+        started += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    results = await asyncio.gather(*(flight.do("key", work) for _ in range(10)))
+
+    assert results == ["result"] * 10
+    assert started == 1
+    assert flight.stats() == {"in_flight": 0, "calls": 1, "shared": 9}
+
+@pytest.mark.asyncio
+async def test_error_propagates_to_every_waiter():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream failed")
+
+    results = await asyncio.gather(
+        *(flight.do("key", work) for _ in range(3)),
+        return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert len(flight) == 0
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_shared_call():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return "result"
+
+    first = asyncio.ensure_future(flight.do("key", work))
+    second = asyncio.ensure_future(flight.do("key", work))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "result"
+    assert first.cancelled()
+
+@pytest.mark.asyncio
+async def test_call_cancelled_when_all_waiters_leave():
+    flight = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def work():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    waiter = asyncio.ensure_future(flight.do("key", work))
+    await asyncio.sleep(0)
+    waiter.cancel()
+
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    await asyncio.sleep(0)
+    assert len(flight) == 0
+
+@pytest.mark.asyncio
+async def test_new_call_starts_after_previous_completes():
+    flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    assert await flight.do("key", work) == 1
+    assert await flight.do("key", work) == 2
+
+@pytest.mark.asyncio
+async def test_call_after_last_waiter_left_starts_afresh():
+    flight = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def fast():
+        return "fresh"
+
+    waiter = asyncio.ensure_future(flight.do("key", slow))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    # The waiter leaves and cancels the call, which has not finished yet.
+    await asyncio.sleep(0)
+    assert waiter.cancelled()
+
+    assert await flight.do("key", fast) == "fresh"
@@ -0,0 +1,45 @@
+from app.utils.ulid import (
+    ALPHABET,
+    ULID_LENGTH,
+    ULIDGenerator,
+    decode_base32,
+    encode_base32,
+    ulid_timestamp_ms
+)
+
+def test_base32_round_trip():
+    assert decode_base32(encode_base32(123456789, 8)) == 123456789
+    assert decode_base32("01ARZ3NDEK") == decode_base32("01arz3ndek")
+    assert decode_base32("01IL") is None
+
+def test_ulid_embeds_creation_time():
+    generator = ULIDGenerator(clock=lambda: 1_700_000_000_123 * 1_000_000)
+    value = generator.new()
+
+    assert len(value) == ULID_LENGTH
+    assert set(value) <= set(ALPHABET)
+    assert ulid_timestamp_ms(value) == 1_700_000_000_123
+    assert ulid_timestamp_ms(value + "MAC") is None
+    assert ulid_timestamp_ms(value.lower()) is None
+
+def test_ulids_sort_in_issue_order():
+    now = [1_700_000_000_000 * 1_000_000]
+    generator = ULIDGenerator(clock=lambda: now[0])
+    values = [generator.new() for _ in range(100)]
+    now[0] += 1_000_000
+    values.append(generator.new())
+    # A clock stepping back must not reorder IDs.
+    now[0] -= 5_000_000
+    values.append(generator.new())
+
+    assert values == sorted(values)
+    assert len(set(values)) == len(values)
+
+def test_non_ulids_have_no_timestamp():
+    assert ulid_timestamp_ms("test123") is None
+    assert ulid_timestamp_ms("U" * ULID_LENGTH) is None
+    # 48 bits of time cannot start above 7.
+    assert ulid_timestamp_ms("8" + "0" * (ULID_LENGTH - 1)) is None
+    # Hex UUIDs are in the alphabet but are not ULIDs.
+    assert ulid_timestamp_ms("0123456789abcdef0123456789abcdef") is None
+    assert ulid_timestamp_ms("0123456789ABCDEF0123456789ABCDEF") is None
@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from app.services.ai_service import AIService
+from app.services.cart_service import CartService
+from app.services.warmup import WARMUP_INSTRUCTIONS, ModelWarmup
+
+@pytest.fixture
+def ai_service(fake_ollama):
+    service = AIService()
+    service.base_url = fake_ollama.url
+    return service
+
+async def wait_until_ready(warmup: ModelWarmup) -> None:
+    for _ in range(200):
+        if warmup.ready:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("warm-up did not finish")
+
+@pytest.mark.asyncio
+async def test_warm_up_loads_model_and_calls_it(ai_service, fake_ollama):
+    warmup = ModelWarmup(ai_service, CartService(), retry_delay=0)
+
+    await warmup.start()
+    assert not warmup.ready
+    await wait_until_ready(warmup)
+
+    assert warmup.warm
+    load = fake_ollama.requests[0]
+    assert "prompt" not in load
+    assert load["keep_alive"] == ai_service.keep_alive
+    assert all(body["keep_alive"] == ai_service.keep_alive for body in fake_ollama.requests)
+    prompts = [body.get("prompt", "") for body in fake_ollama.requests]
+    for instructions in WARMUP_INSTRUCTIONS:
+        # The rule matcher knows these phrasings, yet the model was asked.
+        assert ai_service.rules.match(instructions) is not None
+        assert any(instructions in prompt for prompt in prompts)
+    assert ai_service.instructions_cache.stats()["size"] == len(WARMUP_INSTRUCTIONS)
+    ai_service.rules = None
+    served = len(fake_ollama.requests)
+    for instructions in WARMUP_INSTRUCTIONS:
+        await ai_service.process_cart_instructions(instructions.upper())
+    assert len(fake_ollama.requests) == served
+    await warmup.stop()
+    assert not warmup.ready
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_ready_after_attempts_exhausted(ai_service, fake_ollama):
+    fake_ollama.status = 503
+    warmup = ModelWarmup(ai_service, CartService(), attempts=2, retry_delay=0)
+
+    await warmup.start()
+    await wait_until_ready(warmup)
+
+    assert not warmup.warm
+    assert warmup.tries == 2
+    await warmup.stop()
+    await ai_service.close()
+
+@pytest.mark.asyncio
+async def test_disabled_warm_up_is_ready_at_once(ai_service, fake_ollama):
+    warmup = ModelWarmup(ai_service, CartService(), enabled=False)
+
+    await warmup.start()
+
+    assert warmup.ready
+    assert fake_ollama.requests == []